@@ -0,0 +1,68 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.api import (BUDGET_PATH, check_budget, load_budget,
+                            run_benchmark, throwaway_database)
+
+
+class Command(BaseCommand):
+    help = (
+        'Бенчмарк эндпоинтов API: количество запросов, задержка p50/p95 и '
+        'пиковая память для каждого маршрута при разных объёмах данных. '
+        'Данные создаются во временной базе, настроенная база не '
+        'затрагивается. '
+        'Завершается ошибкой, если превышен бюджет.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', type=int, nargs='+', dest='scales',
+            default=[1000, 10000, 100000],
+            help='Количество пользователей и курсов.'
+        )
+        parser.add_argument(
+            '--courses-ratio', type=int, default=1,
+            help='Во сколько раз курсов меньше, чем пользователей.'
+        )
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument(
+            '--budget', default=str(BUDGET_PATH),
+            help='Файл бюджетов (JSON).'
+        )
+        parser.add_argument(
+            '--no-latency', action='store_true',
+            help='Не проверять бюджет задержки.'
+        )
+        parser.add_argument(
+            '--json', dest='output',
+            help='Сохранить результаты в JSON-файл.'
+        )
+
+    def handle(self, *args, scales, iterations, courses_ratio, budget,
+               no_latency, output=None, **options):
+        with throwaway_database():
+            results = run_benchmark(scales, iterations, courses_ratio,
+                                    stdout=self.stdout)
+
+        self.stdout.write(
+            f'{"scale":>7} {"route":<24} {"queries":>7} {"p50 ms":>8} '
+            f'{"p95 ms":>8} {"peak KB":>9}'
+        )
+        for result in results:
+            self.stdout.write(
+                f'{result.scale:>7} {result.key:<24} {result.queries:>7} '
+                f'{result.p50_ms:>8} {result.p95_ms:>8} {result.peak_kb:>9}'
+            )
+        if output:
+            with open(output, 'w', encoding='utf-8') as file:
+                json.dump([result._asdict() for result in results], file,
+                          ensure_ascii=False, indent=2)
+
+        violations = check_budget(results, load_budget(budget),
+                                  latency=not no_latency)
+        if violations:
+            raise CommandError(
+                'Превышен бюджет:\n' + '\n'.join(violations)
+            )
+        self.stdout.write(self.style.SUCCESS('Бюджет не превышен.'))
@@ -0,0 +1,59 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.concurrency import ROUTES, run_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Пропускная способность чтения курсов и уроков при параллельных '
+        'соединениях: WSGI (пул потоков) против ASGI (асинхронные '
+        'представления). Данные берутся из настроенной базы - сначала '
+        'выполните seed_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Запросов на маршрут.')
+        parser.add_argument('--concurrency', type=int, default=50,
+                            help='Одновременных соединений ASGI.')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Потоков WSGI.')
+        parser.add_argument(
+            '--db-latency', type=float, default=5, dest='db_latency_ms',
+            help='Задержка каждого запроса к базе, мс (база по сети).'
+        )
+        parser.add_argument(
+            '--route', dest='routes', action='append',
+            choices=[name for name, _ in ROUTES],
+            help='Только этот маршрут (можно несколько раз).'
+        )
+        parser.add_argument(
+            '--json', dest='output',
+            help='Сохранить результаты в JSON-файл.'
+        )
+
+    def handle(self, *args, requests, concurrency, workers, db_latency_ms,
+               routes=None, output=None, **options):
+        try:
+            results = run_benchmark(requests, concurrency, workers,
+                                    db_latency_ms, routes,
+                                    stdout=self.stdout)
+        except LookupError as error:
+            raise CommandError(f'{error} Выполните seed_data.')
+
+        self.stdout.write(
+            f'{"server":<6} {"route":<16} {"conns":>5} {"req/s":>8} '
+            f'{"p50 ms":>8} {"p95 ms":>8} {"errors":>6}'
+        )
+        for result in results:
+            self.stdout.write(
+                f'{result.server:<6} {result.route:<16} '
+                f'{result.concurrency:>5} {result.rps:>8} '
+                f'{result.p50_ms:>8} {result.p95_ms:>8} {result.errors:>6}'
+            )
+        if output:
+            with open(output, 'w', encoding='utf-8') as file:
+                json.dump([result._asdict() for result in results], file,
+                          ensure_ascii=False, indent=2)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from benchmarks.api import throwaway_database
+from benchmarks.ordering import STRATEGIES, run_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Нумерация групп при параллельных вставках: счётчик OrderField '
+        'против MAX(number) + 1 - вставок в секунду и отклонённых из-за '
+        'совпадения номера. Данные создаются во временной базе, '
+        'настроенная база не затрагивается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8,
+                            help='Потоков (соединений с базой).')
+        parser.add_argument('--per-thread', type=int, default=20,
+                            help='Вставок на поток.')
+        parser.add_argument(
+            '--strategy', dest='strategies', action='append',
+            choices=STRATEGIES,
+            help='Только этот способ нумерации (можно несколько раз).'
+        )
+
+    def handle(self, *args, threads, per_thread, strategies=None,
+               **options):
+        with throwaway_database():
+            results = run_benchmark(threads, per_thread,
+                                    strategies or STRATEGIES)
+
+        for result in results:
+            self.stdout.write(
+                f'OrderField, {result.strategy}, {result.threads} threads: '
+                f'{result.rate} inserts/s, {result.conflicts} conflicts'
+            )
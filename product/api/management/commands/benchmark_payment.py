@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from benchmarks.api import throwaway_database
+from benchmarks.payment import PROFILES, run_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Пропускная способность оплаты курсов: параллельные покупки из '
+        'нескольких потоков, покупок в секунду и исходы (оплачено, ошибки) '
+        'с настройками SQLite по умолчанию и с профилем из settings. '
+        'Данные создаются во временной базе, настроенная база не '
+        'затрагивается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--purchases', type=int, default=200,
+                            help='Количество покупок.')
+        parser.add_argument('--courses', type=int, default=20,
+                            help='Курсов, между которыми делятся покупки.')
+        parser.add_argument('--threads', type=int, default=8,
+                            help='Потоков (соединений с базой).')
+        parser.add_argument(
+            '--profile', dest='profiles', action='append', choices=PROFILES,
+            help='Только этот профиль SQLite (можно несколько раз).'
+        )
+
+    def handle(self, *args, purchases, courses, threads, profiles=None,
+               **options):
+        with throwaway_database():
+            results = run_benchmark(purchases, courses, threads,
+                                    profiles or PROFILES)
+
+        for result in results:
+            self.stdout.write(
+                f'pay, {result.profile}, {result.threads} threads: '
+                f'{result.rate} purchases/s {result.outcomes}'
+            )
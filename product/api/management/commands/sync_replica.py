@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from product.db import sync_replica
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирование основной базы SQLite в локальную реплику для чтения '
+        '(по умолчанию DATABASE_READ_ALIAS).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', dest='alias')
+
+    def handle(self, *args, alias=None, **options):
+        alias = alias or settings.DATABASE_READ_ALIAS
+        if alias == DEFAULT_DB_ALIAS:
+            raise CommandError('Реплика не настроена: DATABASE_READ_ALIAS '
+                               '- основная база.')
+        if alias not in settings.DATABASES:
+            raise CommandError(f'База {alias} не объявлена в DATABASES.')
+        sync_replica(alias)
+        self.stdout.write(self.style.SUCCESS(
+            f'База {alias} синхронизирована с основной.'
+        ))
@@ -0,0 +1,196 @@
+"""
+Замеры времени обработки запросов: общее время, время и количество
+запросов к базе, время сериализаторов и рендеринга ответа.
+
+Включается настройкой API_TIMING_SAMPLE_RATE - доля замеряемых запросов
+(1 - все, 0.01 - каждый сотый, 0 - middleware отключён). Для
+незамеряемых запросов накладные расходы - один вызов random(), для
+замеряемых - обёртка каждого запроса к базе (connection.execute_wrapper).
+
+Сериализаторы замеряются в представлениях с TimedSerializersMixin,
+без изменения классов DRF.
+
+Результат замера уходит в заголовок Server-Timing и в строку лога
+api.middleware с именем представления и действия, например
+CourseViewSet.pay.
+"""
+
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_timing', default=None)
+
+
+class Timing:
+    """Замеры одного запроса. Длительности - в секундах."""
+
+    METRICS = ('total', 'db', 'serializer', 'render')
+
+    def __init__(self):
+        self.view = None
+        self.queries = 0
+        self.durations = dict.fromkeys(self.METRICS, 0.0)
+        # Замеры, которые идут сейчас - вложенные не учитываются дважды.
+        self.active = set()
+
+    def add(self, metric, seconds):
+        self.durations[metric] = self.durations.get(metric, 0.0) + seconds
+
+    def header(self):
+        """Значение заголовка Server-Timing."""
+        metrics = []
+        for metric, seconds in self.durations.items():
+            value = f'{metric};dur={seconds * 1000:.2f}'
+            if metric == 'db':
+                value += f';desc="{self.queries} queries"'
+            metrics.append(value)
+        return ', '.join(metrics)
+
+    def as_dict(self):
+        return {
+            'view': self.view,
+            'queries': self.queries,
+            **{f'{metric}_ms': round(seconds * 1000, 2)
+               for metric, seconds in self.durations.items()},
+        }
+
+
+@contextmanager
+def measure(metric):
+    """Замер участка кода в текущем замеряемом запросе, если он есть."""
+    timing = _current.get()
+    if timing is None or metric in timing.active:
+        yield
+        return
+    timing.active.add(metric)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.active.discard(metric)
+        timing.add(metric, time.perf_counter() - started)
+
+
+def _timed(method):
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        with measure('serializer'):
+            return method(*args, **kwargs)
+    return wrapper
+
+
+def timed_serializer(serializer):
+    """
+    Замер валидации (is_valid) и представления (to_representation, через
+    которое data получает результат) одного сериализатора DRF в текущем
+    замеряемом запросе. Методы оборачиваются у экземпляра - классы DRF
+    не меняются. Для many=True это ListSerializer, его представление
+    включает все объекты.
+    """
+    if _current.get() is not None:
+        for name in ('is_valid', 'to_representation'):
+            setattr(serializer, name, _timed(getattr(serializer, name)))
+    return serializer
+
+
+# Сериализаторы представления (get_serializer) замеряются в замеряемом
+# запросе. Метод подменяется у экземпляра в initial, а не в классе:
+# drf-spectacular для схемы берёт get_serializer_class, только пока
+# get_serializer не переопределён. Докстринга нет - иначе он попал бы
+# в описание представлений схемы.
+class TimedSerializersMixin:
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if _current.get() is not None:
+            get_serializer = self.get_serializer
+            self.get_serializer = lambda *args, **kwargs: timed_serializer(
+                get_serializer(*args, **kwargs)
+            )
+
+
+def view_name(view_func, method):
+    """
+    Имя представления с действием: CourseViewSet.pay, LessonViewSet.list.
+    """
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{cls.__name__}.{actions.get(method.lower(), method.lower())}'
+
+
+class ServerTimingMiddleware:
+    """
+    Должен быть первым в MIDDLEWARE, чтобы общее время включало
+    остальные middleware.
+    """
+
+    def __init__(self, get_response):
+        self.sample_rate = getattr(settings, 'API_TIMING_SAMPLE_RATE', 0)
+        if not self.sample_rate:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        timing = Timing()
+
+        def count_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                timing.add('db', time.perf_counter() - started)
+                timing.queries += 1
+
+        token = _current.set(timing)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(count_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        timing.add('total', time.perf_counter() - started)
+
+        response['Server-Timing'] = timing.header()
+        data = timing.as_dict()
+        data.update(method=request.method, path=request.path,
+                    status=response.status_code)
+        logger.info(
+            ' '.join(f'{key}={value}' for key, value in data.items()),
+            extra={'timing': data}
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timing = _current.get()
+        if timing is not None:
+            timing.view = view_name(view_func, request.method)
+
+    def process_template_response(self, request, response):
+        # Вызывается непосредственно перед response.render() - у этого
+        # middleware последним, так как он первый в MIDDLEWARE.
+        timing = _current.get()
+        if timing is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(lambda response: timing.add(
+                'render', time.perf_counter() - started
+            ))
+        return response
@@ -0,0 +1,29 @@
+"""
+Strong ETag для ответов API по версиям из courses.cache.
+
+ETag строится из версии ресурса, а не из хэша тела ответа, поэтому
+проверку If-None-Match можно сделать до выборки данных и сериализации.
+"""
+
+from django.utils.http import parse_etags, quote_etag
+
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    return quote_etag('-'.join(str(part) for part in parts))
+
+
+def etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    # Для If-None-Match используется слабое сравнение (RFC 9110).
+    etags = {tag.removeprefix('W/') for tag in parse_etags(header)}
+    return '*' in etags or etag in etags
+
+
+def not_modified(etag):
+    return Response(status=status.HTTP_304_NOT_MODIFIED,
+                    headers={'ETag': etag})
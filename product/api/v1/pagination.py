@@ -0,0 +1,153 @@
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Keyset (cursor) пагинация: следующая страница выбирается условием
+    WHERE по полю сортировки, а не OFFSET, поэтому время ответа не
+    зависит от того, насколько далеко листает клиент.
+
+    Сортировка берётся из атрибута ordering представления ('-id' по
+    умолчанию), поле сортировки должно быть уникальным.
+
+    ?page_size=N - размер страницы (не больше max_page_size).
+    ?with_total=1 - добавить в ответ общее количество объектов. Подсчёт
+    ограничен total_limit строками; если объектов больше, возвращается
+    total_limit и total_is_approximate=true.
+    """
+
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-id'
+
+    total_query_param = 'with_total'
+    total_limit = 10000
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'ordering', None) or self.ordering
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.total = None
+        if request.query_params.get(self.total_query_param) in ('1', 'true'):
+            self.total = self.get_total_queryset(queryset).count()
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        paginate_queryset для асинхронных представлений. Страницу
+        выбирает сам CursorPagination в потоке (sync_to_async) - так же
+        асинхронный ORM Django 4.2 выполняет любой запрос к базе.
+        """
+        return await sync_to_async(self.paginate_queryset)(queryset, request,
+                                                           view)
+
+    def get_total_queryset(self, queryset):
+        """
+        Количество объектов, но не больше total_limit + 1: COUNT(*) по
+        подзапросу с LIMIT, чтобы не сканировать всю таблицу.
+        """
+        return queryset.order_by()[:self.total_limit + 1]
+
+    def get_paginated_response(self, data):
+        content = [
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ]
+        if self.total is not None:
+            content += [
+                ('total', min(self.total, self.total_limit)),
+                ('total_is_approximate', self.total > self.total_limit),
+            ]
+        content.append(('results', data))
+        return Response(OrderedDict(content))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties'].update({
+            'total': {
+                'type': 'integer',
+                'nullable': True,
+            },
+            'total_is_approximate': {
+                'type': 'boolean',
+                'nullable': True,
+            },
+        })
+        return response_schema
+
+
+class AfterIdPagination(BasePagination):
+    """
+    Пагинация журнала событий для потребителей: ?after=<id> - события с
+    id больше after по возрастанию id, ?limit=N - не больше N (по
+    умолчанию OUTBOX_BATCH_SIZE, не больше max_limit). Потребитель
+    запоминает last_id ответа и продолжает с него; has_more - есть ли
+    события дальше (запрашивается на одно событие больше).
+    """
+
+    after_query_param = 'after'
+    limit_query_param = 'limit'
+    max_limit = 1000
+
+    def get_int_param(self, request, name, default, minimum):
+        value = request.query_params.get(name)
+        if value is None:
+            return default
+        if not value.isdecimal() or int(value) < minimum:
+            raise ValidationError(
+                {name: f'Ожидается целое число не меньше {minimum}.'}
+            )
+        return int(value)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.after = self.get_int_param(request, self.after_query_param,
+                                        0, 0)
+        self.limit = min(
+            self.get_int_param(request, self.limit_query_param,
+                               settings.OUTBOX_BATCH_SIZE, 1),
+            self.max_limit
+        )
+        results = list(queryset.filter(pk__gt=self.after).order_by(
+            'pk'
+        )[:self.limit + 1])
+        self.has_more = len(results) > self.limit
+        self.page = results[:self.limit]
+        self.last_id = self.page[-1].pk if self.page else self.after
+        return self.page
+
+    def get_next_link(self):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.after_query_param, self.last_id)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('last_id', self.last_id),
+            ('has_more', self.has_more),
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['last_id', 'has_more', 'results'],
+            'properties': {
+                'last_id': {'type': 'integer'},
+                'has_more': {'type': 'boolean'},
+                'next': {'type': 'string', 'format': 'uri'},
+                'results': schema,
+            },
+        }
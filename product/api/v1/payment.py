@@ -1,22 +1,158 @@
-from django.shortcuts import get_object_or_404
-from django.db.models import Count, F
-from django.db import transaction
+from collections import namedtuple
+
+from django.db import IntegrityError
+from django.db.models import (Case, Exists, F, OuterRef, Subquery, Value,
+                              When)
 
-from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from users.models import Balance, Subscription
+from courses import outbox
+from courses.cache import invalidate_courses
+from courses.models import Course
+from product.db import write_atomic
+
+
+class AlreadyPurchased(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = 'Вы ужи приобрели этот курс'
+    default_code = 'already_purchased'
+
+
+class InsufficientFunds(APIException):
+    status_code = status.HTTP_402_PAYMENT_REQUIRED
+    default_detail = 'На вашем счету недостаточно средств'
+    default_code = 'insufficient_funds'
+
+
+class CourseIsFull(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'На курсе не осталось свободных мест'
+    default_code = 'course_is_full'
+
+
+PurchaseStatus = namedtuple(
+    'PurchaseStatus', ('price', 'owned', 'bonuses', 'has_seats')
+)
+
+
+def purchase_status(user, course_id):
+    """
+    Предварительные проверки оплаты одним запросом по первичному ключу
+    курса: куплен ли курс (EXISTS по индексу (course, user) связи
+    студентов), баланс пользователя (подзапрос по user_id) и наличие мест
+    (счётчик students_count). Студенты курса не читаются.
+    Возвращает PurchaseStatus или None, если курса нет.
+    Окончательные проверки всё равно делает make_payment.
+    """
+    owned = Course.students.through.objects.filter(
+        course_id=OuterRef('pk'), customuser_id=user.pk
+    )
+    bonuses = Balance.objects.filter(user_id=user.pk).order_by().values(
+        'bonuses'
+    )[:1]
+    row = Course.objects.filter(pk=course_id).order_by().annotate(
+        owned=Exists(owned), bonuses=Subquery(bonuses)
+    ).values_list('price', 'owned', 'bonuses', 'students_count').first()
+    if row is None:
+        return None
+    price, owned, bonuses, students_count = row
+    return PurchaseStatus(
+        price=price,
+        owned=owned,
+        bonuses=bonuses or 0,
+        has_seats=students_count < Course.MAX_STUDENTS_QUANTITY,
+    )
 
-from users.models import Subscription
-from courses.models import Course, Group
 
+def make_payment(user, course):
+    """
+    Оплата курса.
+
+    Все проверки делает сама база, поэтому параллельные оплаты не могут
+    уйти в минус по балансу, превысить Course.MAX_STUDENTS_QUANTITY или
+    купить курс дважды. В транзакции фиксированное число запросов:
+    1. INSERT подписки - уникальность (user, course) - и задачи
+       распределения в группу: в группу студент попадает позже, воркером
+       очереди (courses.tasks);
+    2. UPDATE баланса с условием bonuses >= price;
+    3. INSERT студента курса - уникальность (course, user);
+    4. UPDATE курса с условием students_count < MAX_STUDENTS_QUANTITY -
+       занятие места, заодно пересчитывается is_available;
+    5. INSERT событий покупки, зачисления и списания в журнал
+       courses.outbox.
+    Самая востребованная строка - курс - блокируется последней, чтобы
+    держать блокировку как можно меньше.
+
+    Подписка остаётся, если студента исключили из курса (админка,
+    course.students.remove). Тогда первая попытка натыкается на
+    уникальность подписки, и покупка повторяется с заменой старой
+    подписки новой (_purchase(replace=True)). AlreadyPurchased - только
+    если студент действительно есть в курсе.
+    """
+    try:
+        subscription = _purchase(user, course)
+    except IntegrityError:
+        subscription = _purchase(user, course, replace=True)
+
+    invalidate_courses([course.pk])
+    return subscription
+
+
+def _purchase(user, course, replace=False):
+    """
+    Транзакция оплаты (см. make_payment). replace - сначала удалить
+    оставшуюся от прежнего зачисления подписку; новая подписка, как и при
+    первой покупке, ставит задачу распределения в группу.
+    """
+    price = course.price
+    with write_atomic():
+        if replace:
+            students = Course.students.through.objects.filter(
+                course_id=course.pk, customuser_id=user.pk
+            )
+            if students.exists():
+                raise AlreadyPurchased()
+            Subscription.objects.filter(user=user, course=course).delete()
 
-def make_payment(user, user_balance, course, price):
-    """Оплата курса. """
-    with transaction.atomic():
-        user_balance.bonuses = F('bonuses') - price
-        user_balance.save()
         subscription = Subscription.objects.create(
             user=user,
             course=course
         )
-        course.students.add(user)
-    return subscription
\ No newline at end of file
+
+        debited = Balance.objects.filter(
+            user=user, bonuses__gte=price
+        ).update(bonuses=F('bonuses') - price)
+        if not debited:
+            raise InsufficientFunds()
+
+        # Связь создаётся напрямую, без m2m_changed: счётчик и
+        # доступность курса обновляются следующим запросом.
+        Course.students.through.objects.create(
+            course_id=course.pk, customuser_id=user.pk
+        )
+
+        max_students = Course.MAX_STUDENTS_QUANTITY
+        claimed = Course.objects.filter(
+            pk=course.pk, students_count__lt=max_students
+        ).update(
+            students_count=F('students_count') + 1,
+            # В SET используется значение до увеличения.
+            is_available=Case(
+                When(students_count__lt=max_students - 1,
+                     then=Value(True)),
+                default=Value(False)
+            ),
+        )
+        if not claimed:
+            raise CourseIsFull()
+
+        outbox.record_many([
+            outbox.event(outbox.PURCHASE, user.pk, course.pk,
+                         price=price, subscription_id=subscription.pk),
+            outbox.event(outbox.ENROLL, user.pk, course.pk),
+            outbox.event(outbox.BALANCE, user.pk, course.pk,
+                         delta=-price, reason='purchase'),
+        ])
+    return subscription
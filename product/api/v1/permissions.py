@@ -1,5 +1,23 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
-from users.models import Subscription
+
+from courses.entitlements import ais_entitled, is_entitled
+
+
+def is_student_of_course(user, course_id):
+    """
+    Является ли пользователь студентом курса или админом. Для студента
+    права берутся из courses.entitlements, сам курс не читается.
+    """
+    if user.is_staff:
+        return True
+    return user.is_authenticated and is_entitled(user, course_id)
+
+
+async def ais_student_of_course(user, course_id):
+    """is_student_of_course для асинхронных представлений."""
+    if user.is_staff:
+        return True
+    return user.is_authenticated and await ais_entitled(user, course_id)
 
 
 class IsStudentOfCourseOrIsAdmin(BasePermission):
@@ -8,9 +26,7 @@ class IsStudentOfCourseOrIsAdmin(BasePermission):
     при обращении к уроку данного курса.
     """
     def has_object_permission(self, request, view, obj):
-        if request.user.is_staff:
-            return True
-        return obj.students.filter(id=request.user.id).exists()
+        return is_student_of_course(request.user, obj.pk)
 
 
 class IsStudentOfLessonOrIsAdmin(BasePermission):
@@ -19,9 +35,7 @@ class IsStudentOfLessonOrIsAdmin(BasePermission):
     при обращении к данному курсу.
     """
     def has_object_permission(self, request, view, obj):
-        if request.user.is_staff:
-            return True
-        return obj.course.students.filter(id=request.user.id).exists()
+        return is_student_of_course(request.user, obj.course_id)
 
 
 class ReadOnlyOrIsAdmin(BasePermission):
@@ -0,0 +1,44 @@
+"""
+Чтение безопасных запросов API с реплики (product.db).
+
+Аутентификация и проверка прав в initial() идут в основную базу,
+остальное чтение GET/HEAD/OPTIONS - в DATABASE_READ_ALIAS, если
+пользователь не записывал данные последние
+DATABASE_PRIMARY_PIN_SECONDS секунд. Успешный небезопасный запрос
+закрепляет чтение пользователя за основной базой.
+
+Действия из primary_actions всегда читают основную базу: это ответы,
+которые кэшируются под версией данных (courses.cache) или получают
+ETag. Версия меняется при записи в основную базу, и ответ, прочитанный
+с отстающей реплики, закрепился бы в кэше и у клиентов под новой
+версией до следующего изменения.
+"""
+
+from contextlib import ExitStack
+
+from rest_framework.permissions import SAFE_METHODS
+
+from product.db import is_pinned, pin_primary, read_from
+
+
+class ReplicaReadMixin:
+    primary_actions = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        user = request.user
+        if (request.method in SAFE_METHODS
+                and self.action not in self.primary_actions
+                and not (user.is_authenticated and is_pinned(user.pk))):
+            self._replica = ExitStack()
+            self._replica.enter_context(read_from())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        replica = self.__dict__.pop('_replica', None)
+        if replica is not None:
+            replica.close()
+        elif (request.method not in SAFE_METHODS
+                and response.status_code < 400
+                and request.user.is_authenticated):
+            pin_primary(request.user.pk)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -13,6 +13,15 @@ from drf_spectacular.utils import extend_schema_field
 User = get_user_model()
 
 
+def _groups_filled_percent(course):
+    # Аннотировано в CourseQuerySet.with_statistics, если курс получен
+    # через него.
+    percent = getattr(course, 'groups_filled_percent', None)
+    if percent is None:
+        percent = course.students_count * 100 / Group.MAX_STUDENTS_QUANTITY
+    return round(percent, 2) # round по желанию
+
+
 class LessonSerializer(serializers.ModelSerializer):
     """Список уроков."""
 
@@ -90,6 +99,74 @@ class CreateGroupSerializer(serializers.ModelSerializer):
             'number'
         )
 
+    def validate_number(self, value):
+        # Номер уникален в курсе (unique_group_number_in_course): занятый
+        # номер - ошибка запроса, а не IntegrityError при сохранении.
+        # Курс создаваемой группы - из URL (CourseLookupMixin.get_course).
+        if value is None:
+            return value
+        if self.instance is not None:
+            groups = Group.objects.filter(
+                course_id=self.instance.course_id
+            ).exclude(pk=self.instance.pk)
+        else:
+            groups = self.context['view'].get_course().groups.all()
+        if groups.filter(number=value).exists():
+            raise serializers.ValidationError(
+                'Группа с таким номером в курсе уже есть.'
+            )
+        return value
+
+
+class ReorderSerializer(serializers.Serializer):
+    """
+    Новый порядок групп или уроков курса: id всех объектов курса
+    в нужной последовательности. Допустимые id передаются в context['ids'].
+    """
+
+    order = serializers.ListField(child=serializers.IntegerField(),
+                                  allow_empty=False)
+
+    def validate_order(self, value):
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError('Идентификаторы повторяются.')
+        ids = self.context['ids']
+        unknown = set(value) - set(ids)
+        if unknown:
+            raise serializers.ValidationError(
+                f'Объекты не относятся к курсу: {sorted(unknown)}.'
+            )
+        if len(value) != len(ids):
+            raise serializers.ValidationError(
+                'Порядок должен содержать все объекты курса.'
+            )
+        return value
+
+
+class EnrollmentSerializer(serializers.Serializer):
+    """Пакетное зачисление на курс: id и/или email пользователей."""
+
+    user_ids = serializers.ListField(child=serializers.IntegerField(),
+                                     required=False, default=list)
+    emails = serializers.ListField(child=serializers.EmailField(),
+                                   required=False, default=list)
+
+    def validate(self, attrs):
+        if not attrs['user_ids'] and not attrs['emails']:
+            raise serializers.ValidationError(
+                'Нужно передать user_ids или emails.'
+            )
+        return attrs
+
+
+class EnrollmentResultSerializer(serializers.Serializer):
+    """Результат пакетного зачисления (courses.enrollment)."""
+
+    enrolled = serializers.ListField(child=serializers.IntegerField())
+    already_enrolled = serializers.ListField(child=serializers.IntegerField())
+    no_seats = serializers.ListField(child=serializers.IntegerField())
+    not_found = serializers.ListField(child=serializers.CharField())
+
 
 class MiniLessonSerializer(serializers.ModelSerializer):
     """Список названий уроков для списка курсов."""
@@ -115,12 +192,12 @@ class CourseSerializer(serializers.ModelSerializer):
     @extend_schema_field(serializers.IntegerField())
     def get_lessons_count(self, obj):
         """Количество уроков в курсе."""
-        return obj.lessons.count()
+        return obj.lessons_count
 
     @extend_schema_field(serializers.IntegerField())
     def get_students_count(self, obj):
         """Общее количество студентов на курсе."""
-        return obj.students.count()
+        return obj.students_count
 
     @extend_schema_field(serializers.IntegerField())
     def get_groups_filled_percent(self, obj):
@@ -138,9 +215,7 @@ class CourseSerializer(serializers.ModelSerializer):
         # Но т.к в самом курсе у меня есть поле students, то сделать
         # это легко через сам курс:
 
-        all_students = obj.students.count()
-        percent = all_students / Group.MAX_STUDENTS_QUANTITY * 100
-        return round(percent, 2) # round по желанию
+        return _groups_filled_percent(obj)
 
     @extend_schema_field(serializers.IntegerField())
     def get_demand_course_percent(self, obj):
@@ -148,10 +223,17 @@ class CourseSerializer(serializers.ModelSerializer):
         Подсчёт процента приобретаемости конкретного курса.
         Учитываются только клиенты - пользователи с is_staff=False.
         """
-        all_client_count = User.objects.filter(is_staff=False).count()
-        all_students = obj.students.count()
+        percent = getattr(obj, 'demand_course_percent', None)
+        if percent is not None:
+            # Аннотировано в CourseQuerySet.with_statistics.
+            return round(percent, 2)
+
+        all_client_count = self.context.get('clients_count')
+        if all_client_count is None:
+            all_client_count = User.objects.filter(is_staff=False).count()
+        all_students = obj.students_count
         if all_client_count: # != 0
-            percent = (all_students / all_client_count) * 100
+            percent = all_students * 100 / all_client_count
             percent = round(percent, 2) # по желанию
         else:
             percent = 0
@@ -192,19 +274,17 @@ class CourseDetailSerializer(serializers.ModelSerializer):
     @extend_schema_field(serializers.IntegerField())
     def get_lessons_count(self, obj):
         """Количество уроков в курсе."""
-        return obj.lessons.count()
+        return obj.lessons_count
 
     @extend_schema_field(serializers.IntegerField())
     def get_students_count(self, obj):
         """Общее количество студентов на курсе."""
-        return obj.students.count()
+        return obj.students_count
 
     @extend_schema_field(serializers.IntegerField())
     def get_groups_filled_percent(self, obj):
         """Процент заполнения групп, если в группе максимум 30 чел."""
-        all_students = obj.students.count()
-        percent = all_students / Group.MAX_STUDENTS_QUANTITY * 100
-        return round(percent, 2) # round по желанию
+        return _groups_filled_percent(obj)
 
 
 class CreateCourseSerializer(serializers.ModelSerializer):
@@ -0,0 +1,13 @@
+from rest_framework import serializers
+
+from courses.models import Event
+
+
+class EventSerializer(serializers.ModelSerializer):
+    """Событие журнала courses.outbox для потребителей аналитики."""
+
+    class Meta:
+        model = Event
+        fields = ('id', 'kind', 'user_id', 'course_id', 'group_id', 'data',
+                  'created')
+        read_only_fields = fields
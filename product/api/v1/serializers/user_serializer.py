@@ -2,7 +2,9 @@ from django.contrib.auth import get_user_model
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
 
-from users.models import Subscription
+from courses import outbox
+from product.db import write_atomic
+from users.models import Balance, Subscription
 
 User = get_user_model()
 
@@ -48,8 +50,17 @@ class UserAdminEditSerializer(serializers.ModelSerializer):
         if bonuses:
             # Меняем количество бонусов на счету у пользователя,
             # если это количество передано.
-            instance.balance.bonuses = bonuses
-            instance.balance.save()
+            balance = instance.balance
+            with write_atomic():
+                # Изменение для журнала - от значения в транзакции, а не
+                # от прочитанного до неё.
+                delta = bonuses - Balance.objects.select_for_update(
+                ).values_list('bonuses', flat=True).get(pk=balance.pk)
+                balance.bonuses = bonuses
+                balance.save()
+                if delta:
+                    outbox.record(outbox.BALANCE, instance.pk, delta=delta,
+                                  reason='admin')
         return super().update(instance, validated_data)
 
 
@@ -0,0 +1,226 @@
+import threading
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.signals import request_finished
+from django.db import connection, connections
+from django.http import QueryDict
+from django.test import AsyncClient, TransactionTestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from courses.models import Course, Lesson
+
+User = get_user_model()
+
+
+class AsyncViewsTest(APITestCase):
+    """
+    Асинхронные представления (api.v1.views.async_view) отвечают так же,
+    как CourseViewSet и LessonViewSet.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@test.com', is_staff=True
+        )
+        cls.student = User.objects.create_user(
+            username='student', email='student@test.com'
+        )
+        cls.other = User.objects.create_user(
+            username='other', email='other@test.com'
+        )
+        cls.course = Course.objects.create(author=cls.admin, title='Course',
+                                           price=10)
+        Course.objects.create(author=cls.admin, title='Other', price=10)
+        cls.lessons = [
+            Lesson.objects.create(course=cls.course, title=f'Lesson {number}',
+                                  link='https://example.com')
+            for number in range(3)
+        ]
+        cls.course.students.add(cls.student)
+        cls.token = Token.objects.create(user=cls.student)
+
+    def setUp(self):
+        cache.clear()
+
+    def routes(self):
+        course, lesson = self.course.pk, self.lessons[0].pk
+        return [
+            ('courses-list', 'async-courses-list', ()),
+            ('courses-detail', 'async-courses-detail', (course,)),
+            ('lessons-list', 'async-lessons-list', (course,)),
+            ('lessons-detail', 'async-lessons-detail', (course, lesson)),
+        ]
+
+    def test_same_responses(self):
+        for user in (self.student, self.admin):
+            self.client.force_authenticate(user)
+            for name, async_name, args in self.routes():
+                with self.subTest(user=user.username, route=name):
+                    cache.clear()
+                    expected = self.client.get(reverse(name, args=args))
+                    response = self.client.get(
+                        reverse(async_name, args=args)
+                    )
+                    self.assertEqual(response.status_code,
+                                     status.HTTP_200_OK)
+                    self.assertEqual(
+                        response.json(),
+                        self.replace_paths(expected.json(), name, async_name,
+                                           args)
+                    )
+                    for header in ('ETag', 'X-Cache'):
+                        self.assertEqual(response.get(header) is None,
+                                         expected.get(header) is None)
+
+    def replace_paths(self, data, name, async_name, args):
+        path, async_path = (reverse(name, args=args),
+                            reverse(async_name, args=args))
+        for link in ('next', 'previous'):
+            if data.get(link):
+                data[link] = data[link].replace(path, async_path)
+        return data
+
+    def test_pagination(self):
+        # Все страницы вперёд и обратно по ссылкам next и previous - те же,
+        # что выдаёт CursorPagination в CourseViewSet и LessonViewSet.
+        self.client.force_authenticate(self.student)
+        for name, async_name, args in self.routes():
+            if not name.endswith('-list'):
+                continue
+            with self.subTest(route=name):
+                query = {'page_size': 1, 'with_total': 1}
+                pages = 0
+                for link in ('next', 'previous'):
+                    while True:
+                        cache.clear()
+                        expected = self.client.get(reverse(name, args=args),
+                                                   query).json()
+                        response = self.client.get(
+                            reverse(async_name, args=args), query
+                        )
+                        self.assertEqual(
+                            response.json(),
+                            self.replace_paths(dict(expected), name,
+                                               async_name, args)
+                        )
+                        pages += 1
+                        if not expected[link]:
+                            break
+                        query = QueryDict(urlsplit(expected[link]).query)
+                self.assertEqual(pages, 2 * expected['total'])
+
+    def test_methods(self):
+        self.client.force_authenticate(self.admin)
+        for name, async_name, args in self.routes():
+            url = reverse(async_name, args=args)
+            with self.subTest(route=name):
+                response = self.client.options(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response['Allow'], 'GET, HEAD, OPTIONS')
+                self.assertEqual(self.client.head(url).status_code,
+                                 status.HTTP_200_OK)
+                response = self.client.post(url)
+                self.assertEqual(response.status_code,
+                                 status.HTTP_405_METHOD_NOT_ALLOWED)
+                self.assertEqual(response.json(),
+                                 {'detail': 'Method "POST" not allowed.'})
+
+    def test_cache_and_etag(self):
+        self.client.force_authenticate(self.student)
+        url = reverse('async-courses-detail', args=(self.course.pk,))
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        url = reverse('async-lessons-list', args=(self.course.pk,))
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_errors(self):
+        course, lesson = self.course.pk, self.lessons[0].pk
+        cases = [
+            (None, 'courses-detail', 'async-courses-detail', (course,)),
+            (None, 'lessons-list', 'async-lessons-list', (course,)),
+            (None, 'lessons-detail', 'async-lessons-detail',
+             (course, lesson)),
+            (self.other, 'courses-detail', 'async-courses-detail',
+             (course,)),
+            (self.other, 'lessons-list', 'async-lessons-list', (course,)),
+            (self.other, 'lessons-detail', 'async-lessons-detail',
+             (course, lesson)),
+            (self.admin, 'courses-detail', 'async-courses-detail', (0,)),
+            (self.admin, 'lessons-list', 'async-lessons-list', (0,)),
+            (self.other, 'lessons-list', 'async-lessons-list', (0,)),
+            (None, 'lessons-list', 'async-lessons-list', (0,)),
+            (self.admin, 'lessons-detail', 'async-lessons-detail',
+             (course, 0)),
+        ]
+        for user, name, async_name, args in cases:
+            with self.subTest(user=user and user.username, route=name):
+                self.client.force_authenticate(user)
+                expected = self.client.get(reverse(name, args=args))
+                response = self.client.get(reverse(async_name, args=args))
+                self.assertGreaterEqual(expected.status_code, 400)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.json(), expected.json())
+                self.assertEqual(response.get('WWW-Authenticate'),
+                                 expected.get('WWW-Authenticate'))
+
+    async def test_async_client(self):
+        client = AsyncClient()
+        response = await client.get(
+            reverse('async-lessons-list', args=(self.course.pk,)),
+            headers={'Authorization': f'Token {self.token.key}'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['results']), 3)
+
+        response = await client.get(
+            reverse('async-courses-list'),
+            headers={'Authorization': 'Token invalid'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+
+
+class AsgiConnectionsTest(TransactionTestCase):
+    """
+    Под ASGI соединение потока запроса закрывается в конце запроса
+    (product.asgi), под WSGI - переиспользуется (CONN_MAX_AGE).
+    """
+
+    def is_open_after_request(self, handler_class):
+        opened = []
+
+        def request():
+            try:
+                connection.ensure_connection()
+                request_finished.send(sender=handler_class)
+                opened.append(connection.connection is not None)
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=request)
+        thread.start()
+        thread.join()
+        return opened[0]
+
+    def test_close_connections(self):
+        import product.asgi  # noqa: F401 - подключает close_connections.
+
+        self.assertFalse(self.is_open_after_request(ASGIHandler))
+        self.assertTrue(self.is_open_after_request(WSGIHandler))
@@ -0,0 +1,92 @@
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from benchmarks import concurrency, ordering, payment
+from benchmarks.api import (check_budget, get_scenarios, load_budget,
+                            run_benchmark, router_routes, scenario_key,
+                            seed_dataset)
+from courses.seeding import seed_data
+
+
+class BenchmarkTest(TestCase):
+    """
+    Бенчмарк покрывает все маршруты API, а количество запросов и память
+    укладываются в бюджет. Задержка в тестах не проверяется - она зависит
+    от машины.
+    """
+
+    def test_covers_all_routes(self):
+        scenarios = get_scenarios(seed_dataset(400, 40))
+        self.assertEqual(
+            {(scenario.name, scenario.method) for scenario in scenarios},
+            router_routes()
+        )
+        self.assertEqual(
+            set(load_budget()),
+            {scenario_key(scenario) for scenario in scenarios}
+        )
+
+    def test_budget(self):
+        results = run_benchmark([400], iterations=2)
+        self.assertEqual(check_budget(results, load_budget(), latency=False),
+                         [])
+
+    def test_budget_violations(self):
+        results = run_benchmark([400], iterations=1)
+        budget = {key: dict(limits, queries=0)
+                  for key, limits in load_budget().items()}
+        self.assertEqual(len(check_budget(results, budget, latency=False)),
+                         len(results))
+
+
+@override_settings(ALLOWED_HOSTS=[concurrency.HOST])
+class ConcurrencyBenchmarkTest(TransactionTestCase):
+    """
+    Бенчмарк WSGI/ASGI проходит по всем маршрутам без ошибок. Потоки
+    бенчмарка видят только закоммиченные данные, поэтому
+    TransactionTestCase.
+    """
+
+    def test_run_benchmark(self):
+        with self.assertRaises(LookupError):
+            concurrency.get_targets()
+
+        seed_data(users=20, courses=2)
+        results = concurrency.run_benchmark(
+            requests=6, concurrency=3, workers=2, db_latency_ms=1
+        )
+        self.assertEqual(
+            [(result.server, result.route) for result in results],
+            [(server, route) for route, _ in concurrency.ROUTES
+             for server in ('wsgi', 'asgi')]
+        )
+        for result in results:
+            self.assertEqual(result.requests, 6)
+            self.assertEqual(result.errors, 0, result)
+
+
+class PaymentBenchmarkTest(TransactionTestCase):
+    """
+    Бенчмарк оплаты проходит с обоими профилями SQLite; с профилем из
+    settings все параллельные покупки проходят.
+    """
+
+    def test_run_benchmark(self):
+        default, tuned = payment.run_benchmark(purchases=20, courses=2,
+                                               threads=4)
+        self.assertEqual(default.profile, 'default')
+        self.assertEqual(sum(default.outcomes.values()), 20)
+        self.assertEqual(tuned.profile, 'tuned')
+        self.assertEqual(tuned.outcomes, {'paid': 20})
+        self.assertGreater(tuned.rate, 0)
+
+
+class OrderingBenchmarkTest(TransactionTestCase):
+    """Бенчмарк нумерации: у счётчика OrderField конфликтов нет."""
+
+    def test_run_benchmark(self):
+        sequence, legacy = ordering.run_benchmark(threads=4, per_thread=5)
+        self.assertEqual(sequence.strategy, 'sequence')
+        self.assertEqual(sequence.inserts, 20)
+        self.assertEqual(sequence.conflicts, 0)
+        self.assertEqual(legacy.strategy, 'max')
+        self.assertLessEqual(legacy.conflicts, 20)
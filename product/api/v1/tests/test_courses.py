@@ -1,13 +1,20 @@
+from unittest import mock
+
 from rest_framework.test import APITestCase
 from rest_framework import status
 
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 
-from courses.models import Course, Lesson, Group
+from api.v1.pagination import KeysetPagination
+from api.v1.payment import AlreadyPurchased, make_payment, purchase_status
+from courses.cache import catalogue_cache, invalidate_courses
+from courses.jobs import work
+from courses.models import Course, Event, Lesson, Group
 from api.v1.serializers.course_serializer import (CourseSerializer,
                                                   CourseDetailSerializer)
 from users.models import Subscription
+from django.core.cache import cache
 from django.test.utils import CaptureQueriesContext
 from django.db import connection
 User = get_user_model()
@@ -44,6 +51,10 @@ class UsersAPITest(APITestCase):
         course = course_create(author=user)
         lesson_create(course=course)
 
+    def setUp(self):
+        # Версии кэша каталога не откатываются вместе с транзакцией теста.
+        cache.clear()
+
     def auth(self, email=None, password=None):
         if not email:
             email = self.email
@@ -58,7 +69,7 @@ class UsersAPITest(APITestCase):
         url = reverse('courses-list')
 
         response = self.client.get(url)
-        data = response.json()
+        data = response.json()['results']
         self.assertEqual(len(data), 1)
 
         data = data[0]
@@ -69,6 +80,226 @@ class UsersAPITest(APITestCase):
         self.assertEqual(data['lessons_count'], 1)
         self.assertEqual(data['demand_course_percent'], 0)
 
+    def test_courses_list_queries_count(self):
+        url = reverse('courses-list')
+        student = user_create(username='student', email='student@test.com',
+                              is_staff=False)
+
+        def add_courses(quantity):
+            # bulk_create не вызывает сигналы, счётчики задаём сразу.
+            courses = Course.objects.bulk_create(
+                Course(author=self.user, title=f'Course {num}', price=10,
+                       lessons_count=1, students_count=1)
+                for num in range(quantity)
+            )
+            Lesson.objects.bulk_create(
+                Lesson(course=course, title='Lesson', link='https://a.com')
+                for course in courses
+            )
+            Course.students.through.objects.bulk_create(
+                Course.students.through(course=course, customuser=student)
+                for course in courses
+            )
+            invalidate_courses()
+
+        url += '?page_size=100'
+        add_courses(9) # + курс из setUpTestData
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.get(url)
+        self.assertEqual(len(response.json()['results']), 10)
+
+        add_courses(990)
+        with CaptureQueriesContext(connection) as big:
+            response = self.client.get(url)
+        data = response.json()['results']
+        self.assertEqual(len(data), 100)
+        self.assertEqual(len(small), len(big))
+
+        # Количество запросов не зависит ни от размера страницы, ни от
+        # того, насколько далеко листает клиент: все 1000 курсов, каждая
+        # страница - из базы, а не из кэша.
+        seen = 0
+        next_url = url
+        while next_url:
+            cache.clear()
+            with CaptureQueriesContext(connection) as page:
+                page_data = self.client.get(next_url).json()
+            self.assertEqual(len(page), len(small))
+            seen += len(page_data['results'])
+            next_url = page_data['next']
+        self.assertEqual(seen, 1000)
+        cache.clear()
+        with CaptureQueriesContext(connection) as page:
+            self.client.get(reverse('courses-list') + '?page_size=10')
+        self.assertEqual(len(page), len(small))
+
+        course = data[0]
+        self.assertEqual(course['lessons_count'], 1)
+        self.assertEqual(course['students_count'], 1)
+        self.assertEqual(course['demand_course_percent'], 100)
+        self.assertEqual(course['groups_filled_percent'],
+                         round(1 / 30 * 100, 2))
+
+    def test_courses_list_pagination(self):
+        for num in range(4):
+            course_create(author=self.user, title=f'Course {num}')
+        ids = list(Course.objects.order_by('-id').values_list('id', flat=True))
+
+        url = reverse('courses-list') + '?page_size=2&with_total=1'
+        response = self.client.get(url)
+        data = response.json()
+        self.assertEqual([course['id'] for course in data['results']], ids[:2])
+        self.assertEqual(data['total'], 5)
+        self.assertFalse(data['total_is_approximate'])
+        self.assertIsNone(data['previous'])
+
+        received = []
+        url = reverse('courses-list') + '?page_size=2'
+        while url:
+            data = self.client.get(url).json()
+            self.assertNotIn('total', data)
+            received += [course['id'] for course in data['results']]
+            url = data['next']
+        self.assertEqual(received, ids)
+
+    def test_courses_list_approximate_total(self):
+        course_create(author=self.user, title='Course 2')
+        url = reverse('courses-list') + '?with_total=1'
+        with mock.patch.object(KeysetPagination, 'total_limit', 1):
+            data = self.client.get(url).json()
+        self.assertEqual(data['total'], 1)
+        self.assertTrue(data['total_is_approximate'])
+
+    def test_courses_list_cache(self):
+        url = reverse('courses-list')
+        catalogue_cache.reset_stats()
+
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(response.json()['results'][0]['students_count'], 0)
+
+        # Покупка курса меняет версию каталога.
+        student = user_create(username='adfsf', email='fja@afj.com',
+                              is_staff=False)
+        Course.objects.first().students.add(student)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'][0]['students_count'], 1)
+
+        self.assertEqual(catalogue_cache.stats(),
+                         {'list': {'hits': 1, 'misses': 2}})
+
+    def test_course_detail_cache(self):
+        user2 = user_create(username='adfsf', email='fja@afj.com',
+                            is_staff=False)
+        self.auth(email=user2.email, password=self.password)
+        course = Course.objects.first()
+        course.students.add(user2)
+        url = reverse('courses-detail', args=(course.id,))
+
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.json()['lessons_count'], 1)
+
+        lesson_create(course=course, title='New Lesson')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['lessons_count'], 2)
+
+        # Закэшированный ответ не отдаётся тем, у кого нет доступа.
+        course.students.remove(user2)
+        self.client.get(url)
+        course.students.add(user2)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        # Права доступа кэшируются (courses.entitlements) и сбрасываются
+        # сигналами m2m_changed, поэтому связь удаляется через remove().
+        course.students.remove(user2)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_course_detail_etag(self):
+        student = user_create(username='adfsf', email='fja@afj.com',
+                              is_staff=False)
+        course = Course.objects.first()
+        course.students.add(student)
+        self.client.force_authenticate(user=student)
+        url = reverse('courses-detail', args=(course.id,))
+
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertLessEqual(len(queries), 1)
+
+        course.title = 'New title'
+        course.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # Без доступа к курсу 304 не отдаётся.
+        etag = response['ETag']
+        self.client.force_authenticate(
+            user=user_create(username='other', email='other@afj.com',
+                             is_staff=False)
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_lessons_list_etag(self):
+        student = user_create(username='adfsf', email='fja@afj.com',
+                              is_staff=False)
+        course = Course.objects.first()
+        course.students.add(student)
+        self.client.force_authenticate(user=student)
+        url = reverse('lessons-list', args=(course.id,))
+
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertLessEqual(len(queries), 1)
+
+        # Покупки курса другими студентами список уроков не меняют.
+        course.students.add(user_create(username='user3',
+                                        email='user3@afj.com'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        lesson_create(course=course, title='New Lesson')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_groups_list_etag(self):
+        self.client.force_authenticate(user=self.user)
+        course = Course.objects.first()
+        url = reverse('groups-list', args=(course.id,))
+
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(len(queries), 0)
+
+        student = user_create(username='adfsf', email='fja@afj.com',
+                              is_staff=False)
+        course.groups.get(number=1).students.add(student)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        student.first_name = 'New name'
+        student.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_course_detail(self):
         user2 = user_create(username='adfsf', email='fja@afj.com',
                             is_staff=False)
@@ -139,6 +370,8 @@ class UsersAPITest(APITestCase):
         course.refresh_from_db()
         self.assertIn(user2, course.students.all())
 
+        # В группу студента распределяет воркер очереди.
+        self.assertEqual(work(burst=True), 1)
         self.assertEqual(Group.objects.count(), 10)
         group = Group.objects.get(course=course, number=1)
         self.assertIn(user2, group.students.all())
@@ -149,6 +382,7 @@ class UsersAPITest(APITestCase):
         response = self.client.post(url)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
+        work(burst=True)
         group2 = Group.objects.get(course=course, number=2)
         self.assertIn(user3, group2.students.all())
 
@@ -163,6 +397,119 @@ class UsersAPITest(APITestCase):
         response = self.client.post(url)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_course_payment_after_removal(self):
+        user2 = user_create(username='adfsf', email='fja@afj.com',
+                            is_staff=False)
+        self.client.force_authenticate(user2)
+        course = Course.objects.first()
+        url = reverse('courses-pay', args=(course.id,))
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        work(burst=True)
+
+        # Подписка остаётся после исключения из курса.
+        course.students.remove(user2)
+        self.assertFalse(purchase_status(user2, course.id).owned)
+        old = Subscription.objects.get(user=user2, course=course)
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        subscription = Subscription.objects.get(user=user2, course=course)
+        self.assertNotEqual(subscription.pk, old.pk)
+        self.assertIn(user2, course.students.all())
+        user2.balance.refresh_from_db()
+        self.assertEqual(user2.balance.bonuses, 1000 - 2 * course.price)
+
+        # Новая подписка снова распределяет студента в группу.
+        self.assertEqual(work(burst=True), 1)
+        self.assertTrue(course.groups.filter(students=user2).exists())
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.assertRaises(AlreadyPurchased):
+            make_payment(user2, course)
+
+    def test_course_payment_queries(self):
+        course = Course.objects.first()
+        url = reverse('courses-pay', args=(course.id,))
+
+        def pay(username):
+            user = user_create(username=username,
+                               email=f'{username}@test.com', is_staff=False)
+            self.client.force_authenticate(user)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(url)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return [query['sql'] for query in queries]
+
+        small = pay('first')
+        # Без пароля - хэширование только замедлило бы тест.
+        course.students.add(*(
+            User.objects.create_user(username=f'user{num}',
+                                     email=f'user{num}@test.com')
+            for num in range(50)
+        ))
+        big = pay('second')
+        # Проверки + 6 запросов оплаты (см. CourseViewSet.pay) внутри
+        # точки сохранения. Количество не зависит от количества
+        # студентов, а студенты курса целиком не читаются.
+        self.assertEqual(len(small), len(big))
+        statements = [sql for sql in big if 'SAVEPOINT' not in sql]
+        self.assertEqual(len(statements), 7)
+        self.assertFalse([sql for sql in big
+                          if 'INNER JOIN "courses_course_students"' in sql])
+
+        # Повторная покупка отклоняется одним запросом проверок.
+        with self.assertNumQueries(1):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        poor = user_create(username='poor', email='poor@test.com',
+                           is_staff=False)
+        poor.balance.bonuses = 0
+        poor.balance.save()
+        self.client.force_authenticate(poor)
+        with self.assertNumQueries(1):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code,
+                         status.HTTP_402_PAYMENT_REQUIRED)
+
+        with mock.patch.object(Course, 'MAX_STUDENTS_QUANTITY', 52):
+            self.client.force_authenticate(user_create(
+                username='late', email='late@test.com', is_staff=False
+            ))
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_course_enroll(self):
+        course = Course.objects.first()
+        url = reverse('courses-enroll', args=(course.id,))
+        student = user_create(username='adfsf', email='fja@afj.com',
+                              is_staff=False)
+        data = {'user_ids': [student.id], 'emails': ['none@test.com']}
+
+        self.client.force_authenticate(student)
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.user)
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {
+            'enrolled': [student.id],
+            'already_enrolled': [],
+            'no_seats': [],
+            'not_found': ['none@test.com'],
+        })
+        self.assertTrue(course.students.filter(pk=student.pk).exists())
+        self.assertTrue(
+            Group.objects.filter(course=course, students=student).exists()
+        )
+
+        response = self.client.post(url, {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_course_update(self):
         self.auth()
         course = Course.objects.first()
@@ -210,7 +557,7 @@ class UsersAPITest(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
-        data = response.json()
+        data = response.json()['results']
         self.assertEqual(len(data), 1)
 
         data = data[0]
@@ -228,6 +575,10 @@ class UsersAPITest(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+        # Несуществующий курс - 404, а не отказ в доступе.
+        response = self.client.get(reverse('lessons-list', args=(0,)))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_lesson_retrieve(self):
         user2 = user_create(username='adfsf', email='fja@afj.com',
                             is_staff=False)
@@ -247,6 +598,71 @@ class UsersAPITest(APITestCase):
         self.assertEqual(data['link'], lesson.link)
         self.assertEqual(data['course'], lesson.course.title)
 
+    def test_lessons_permission_queries(self):
+        user2 = user_create(username='adfsf', email='fja@afj.com',
+                            is_staff=False)
+        self.auth(email=user2.email, password=self.password)
+
+        course = Course.objects.first()
+        lesson = Lesson.objects.first()
+        course.students.add(user2)
+        urls = [
+            reverse('lessons-list', args=(course.id,)),
+            reverse('lessons-detail', args=(course.id, lesson.id)),
+        ]
+
+        def entitlement_queries():
+            with CaptureQueriesContext(connection) as queries:
+                for url in urls:
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code,
+                                     status.HTTP_200_OK)
+            return [query for query in queries
+                    if 'courses_course_students' in query['sql']]
+
+        self.assertEqual(len(entitlement_queries()), 1)
+        # Права уже в кэше - проверки доступа не обращаются к базе.
+        self.assertEqual(entitlement_queries(), [])
+
+        course.students.remove(user2)
+        response = self.client.get(urls[1])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_lessons_queries(self):
+        student = user_create(username='adfsf', email='fja@afj.com',
+                              is_staff=False)
+        course = Course.objects.first()
+        course.students.add(student)
+        for num in range(5):
+            lesson_create(course=course, title=f'Lesson {num}')
+        lesson = course.lessons.last()
+        list_url = reverse('lessons-list', args=(course.id,))
+        detail_url = reverse('lessons-detail', args=(course.id, lesson.id))
+
+        # Админ: права не проверяются, курс читается вместе с уроками.
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(1):
+            response = self.client.get(list_url)
+        self.assertEqual(len(response.json()['results']), 6)
+        self.assertEqual(response.json()['results'][0]['course'],
+                         course.title)
+        with self.assertNumQueries(1):
+            response = self.client.get(detail_url)
+        self.assertEqual(response.json()['title'], lesson.title)
+
+        # Студент: плюс не более одного запроса прав доступа.
+        self.client.force_authenticate(student)
+        with self.assertNumQueries(2):
+            self.client.get(list_url)
+        with self.assertNumQueries(1):
+            response = self.client.get(detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Пустой список несуществующего курса - 404.
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('lessons-list', args=(0,)))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_lesson_retrieve_forbidden(self):
         user2 = user_create(username='adfsf', email='fja@afj.com',
                             is_staff=False)
@@ -316,7 +732,7 @@ class UsersAPITest(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
-        data = response.json()
+        data = response.json()['results']
         self.assertEqual(len(data), 10)
 
         data = data[0]
@@ -446,5 +862,177 @@ class UsersAPITest(APITestCase):
         response = self.client.patch(url, data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_group_number_taken(self):
+        self.auth()
+
+        course = Course.objects.first()
+        group = course.groups.get(number=1)
+        other = course_create(author=self.user, title='Other')
+
+        url = reverse('groups-list', args=(course.id,))
+        response = self.client.post(url, {'title': 'Group 0', 'number': 2})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('number', response.json())
+        self.assertEqual(course.groups.count(), 10)
+
+        url = reverse('groups-detail', args=(course.id, group.id))
+        response = self.client.patch(url, {'number': 2})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('number', response.json())
+
+        # Свой номер и номер, занятый только в другом курсе, допустимы.
+        response = self.client.patch(url, {'number': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        url = reverse('groups-list', args=(other.id,))
+        response = self.client.post(url, {'title': 'Group 0', 'number': 11})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(other.groups.get(title='Group 0').number, 11)
+
+    def test_groups_reorder(self):
+        self.auth()
+
+        course = Course.objects.first()
+        ids = list(course.groups.values_list('id', flat=True))
+        order = ids[::-1]
+
+        url = reverse('groups-reorder', args=(course.id,))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {'order': order}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        updates = [query for query in queries
+                   if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+
+        self.assertEqual(
+            list(course.groups.values_list('id', flat=True)), order
+        )
+        self.assertEqual(
+            list(course.groups.values_list('number', flat=True)),
+            list(range(1, 11))
+        )
+
+        # Следующая группа получает номер после всех существующих.
+        group = Group.objects.create(course=course, title='Group 0')
+        self.assertEqual(group.number, 11)
+
+    def test_groups_reorder_invalid(self):
+        self.auth()
+
+        course = Course.objects.first()
+        ids = list(course.groups.values_list('id', flat=True))
+        other = course_create(author=self.user, title='Other')
+        url = reverse('groups-reorder', args=(course.id,))
+
+        foreign = other.groups.first().id
+        for order in (ids[:-1], ids + ids[:1], ids[:-1] + [foreign], []):
+            response = self.client.post(url, {'order': order}, format='json')
+            self.assertEqual(response.status_code,
+                             status.HTTP_400_BAD_REQUEST)
+
+        self.assertEqual(
+            list(course.groups.values_list('id', flat=True)), ids
+        )
+
+    def test_groups_reorder_forbidden(self):
+        user2 = user_create(username='adfsf', email='fja@afj.com',
+                            is_staff=False)
+        self.auth(email=user2.email, password=self.password)
+
+        course = Course.objects.first()
+        ids = list(course.groups.values_list('id', flat=True))
+
+        url = reverse('groups-reorder', args=(course.id,))
+        response = self.client.post(url, {'order': ids[::-1]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_lessons_reorder(self):
+        self.auth()
+
+        course = Course.objects.first()
+        for num in range(499):
+            lesson_create(course=course, title=f'Lesson {num}')
+        ids = list(course.lessons.values_list('id', flat=True))
+        order = ids[1:] + ids[:1]
+
+        # Порядок уроков виден и в детальной информации о курсе.
+        self.client.get(reverse('courses-detail', args=(course.id,)))
+
+        url = reverse('lessons-reorder', args=(course.id,))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {'order': order}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLess(len(queries), 10)
+
+        self.assertEqual(
+            list(course.lessons.values_list('id', flat=True)), order
+        )
+        response = self.client.get(
+            reverse('courses-detail', args=(course.id,))
+        )
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['lessons'][-1]['title'],
+                         'Test Lesson')
+
+    def test_course_payment_events(self):
+        user2 = user_create(username='adfsf', email='fja@afj.com',
+                            is_staff=False)
+        self.client.force_authenticate(user2)
+        course = Course.objects.first()
+        after = Event.objects.order_by('pk').last().pk
+
+        response = self.client.post(reverse('courses-pay', args=(course.id,)))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        work(burst=True)
+        # Повторная оплата откатывается вместе с событиями.
+        response = self.client.post(reverse('courses-pay', args=(course.id,)))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        group = Group.objects.get(course=course, number=1)
+        subscription = Subscription.objects.get(user=user2)
+        self.assertEqual(
+            [(event.kind, event.user_id, event.course_id, event.group_id,
+              event.data)
+             for event in Event.objects.filter(pk__gt=after)],
+            [(Event.PURCHASE, user2.pk, course.pk, None,
+              {'price': course.price, 'subscription_id': subscription.pk}),
+             (Event.ENROLL, user2.pk, course.pk, None, {}),
+             (Event.BALANCE, user2.pk, course.pk, None,
+              {'delta': -course.price, 'reason': 'purchase'}),
+             (Event.GROUP_JOIN, user2.pk, course.pk, group.pk, {})]
+        )
 
+    def test_events_list(self):
+        url = reverse('events-list')
+        student = user_create(username='student', email='student@test.com',
+                              is_staff=False)
+        Course.objects.first().students.add(student)
+        self.client.force_authenticate(student)
+        self.assertEqual(self.client.get(url).status_code,
+                         status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.user)
+        ids = list(Event.objects.values_list('pk', flat=True))
+        response = self.client.get(url, {'after': ids[0], 'limit': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual([event['id'] for event in data['results']],
+                         [ids[1]])
+        self.assertEqual(data['last_id'], ids[1])
+        self.assertTrue(data['has_more'])
 
+        response = self.client.get(data['next'])
+        data = response.json()
+        self.assertEqual([event['id'] for event in data['results']],
+                         ids[2:])
+        self.assertFalse(data['has_more'])
+        self.assertEqual(data['last_id'], ids[-1])
+
+        # Новых событий нет - позиция остаётся прежней.
+        data = self.client.get(data['next']).json()
+        self.assertEqual(data['results'], [])
+        self.assertEqual(data['last_id'], ids[-1])
+
+        for params in ({'after': -1}, {'after': 'x'}, {'limit': 0}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code,
+                             status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,164 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from courses.models import Course, Event, Group, Lesson
+
+User = get_user_model()
+
+
+def explain(sql):
+    """Строки плана EXPLAIN QUERY PLAN (SQLite) для запроса."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(sql):
+    """
+    Полные просмотры таблиц в плане запроса: SCAN без индекса.
+    Исключение - просмотр основной таблицы запроса с LIMIT без сортировки
+    во временном B-дереве (первая страница keyset-пагинации по
+    первичному ключу): он останавливается после нужного количества строк.
+    """
+    plan = explain(sql)
+    main_table = sql.split(' FROM ', 1)[1].split()[0].strip('"')
+    limited = ' LIMIT ' in sql and not any(
+        'TEMP B-TREE' in line for line in plan
+    )
+    scans = []
+    for line in plan:
+        if not line.startswith('SCAN ') or ' USING ' in line:
+            continue
+        if limited and line.split()[1] == main_table:
+            continue
+        scans.append(line)
+    return scans
+
+
+class QueryPlansTest(APITestCase):
+    """
+    Все запросы чтения, выполняемые эндпоинтами API, должны
+    использовать индексы. Проверяются планы SQLite (EXPLAIN QUERY PLAN).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@test.com', is_staff=True
+        )
+        cls.student = User.objects.create_user(
+            username='student', email='student@test.com'
+        )
+        cls.course = Course.objects.create(author=cls.admin, title='Course',
+                                           price=10)
+        cls.lesson = Lesson.objects.create(course=cls.course, title='Lesson',
+                                           link='https://example.com')
+        cls.course.students.add(cls.student)
+        cls.course.groups.first().students.add(cls.student)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertIndexed(self, method, url, user, data=None,
+                      expected=status.HTTP_200_OK):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data,
+                                                    format='json')
+        self.assertEqual(response.status_code, expected)
+
+        selects = [query['sql'] for query in queries
+                   if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            self.assertEqual(full_scans(sql), [], sql)
+
+    def test_available_courses(self):
+        # Список доступных курсов (CourseManager) - по частичному индексу.
+        sql = str(Course.available.all()[:20].query)
+        self.assertIn('course_available_idx', ' '.join(explain(sql)))
+
+    def test_courses(self):
+        self.assertIndexed('get', reverse('courses-list'), self.student)
+        self.assertIndexed(
+            'get', reverse('courses-detail', args=(self.course.pk,)),
+            self.student
+        )
+
+    def test_lessons(self):
+        self.assertIndexed(
+            'get', reverse('lessons-list', args=(self.course.pk,)),
+            self.student
+        )
+        self.assertIndexed(
+            'get',
+            reverse('lessons-detail', args=(self.course.pk, self.lesson.pk)),
+            self.student
+        )
+
+    def test_groups(self):
+        self.assertIndexed(
+            'get', reverse('groups-list', args=(self.course.pk,)), self.admin
+        )
+        group = Group.objects.filter(course=self.course).first()
+        self.assertIndexed(
+            'get', reverse('groups-detail', args=(self.course.pk, group.pk)),
+            self.admin
+        )
+
+    def test_async(self):
+        for name, args in (
+            ('async-courses-list', ()),
+            ('async-courses-detail', (self.course.pk,)),
+            ('async-lessons-list', (self.course.pk,)),
+            ('async-lessons-detail', (self.course.pk, self.lesson.pk)),
+        ):
+            with self.subTest(name=name):
+                cache.clear()
+                self.assertIndexed('get', reverse(name, args=args),
+                                   self.student)
+
+    def test_events(self):
+        event = Event.objects.order_by('pk').first()
+        self.assertIndexed('get', reverse('events-list'), self.admin)
+        self.assertIndexed('get', reverse('events-list'), self.admin,
+                           {'after': event.pk, 'limit': 2})
+        self.assertIndexed(
+            'get', reverse('events-detail', args=(event.pk,)), self.admin
+        )
+
+    def test_users(self):
+        self.assertIndexed('get', reverse('users-list'), self.admin)
+        self.assertIndexed(
+            'get', reverse('users-detail', args=(self.student.pk,)),
+            self.admin
+        )
+
+    def test_pay(self):
+        user = User.objects.create_user(username='buyer',
+                                        email='buyer@test.com')
+        url = reverse('courses-pay', args=(self.course.pk,))
+        self.assertIndexed('post', url, user,
+                           expected=status.HTTP_201_CREATED)
+        self.assertIndexed('post', url, user,
+                           expected=status.HTTP_400_BAD_REQUEST)
+
+    def test_reorder(self):
+        ids = list(self.course.groups.values_list('pk', flat=True))
+        self.assertIndexed(
+            'post', reverse('groups-reorder', args=(self.course.pk,)),
+            self.admin, {'order': ids[::-1]}
+        )
+
+    def test_enroll(self):
+        user = User.objects.create_user(username='new', email='new@test.com')
+        self.assertIndexed(
+            'post', reverse('courses-enroll', args=(self.course.pk,)),
+            self.admin, {'user_ids': [user.pk], 'emails': [user.email]}
+        )
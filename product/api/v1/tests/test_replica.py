@@ -0,0 +1,141 @@
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from courses.models import Course, Lesson
+from product.db import ReplicaRouter, read_from, sync_replica
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_READ_ALIAS='replica')
+class ReplicaTest(TransactionTestCase):
+    """
+    Реплика - второй файл SQLite, который синхронизируется с основной
+    базой только вызовом sync_replica().
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # В настройках реплика не объявлена (DATABASE_REPLICA_NAME):
+        # псевдоним добавляется на время тестов, схему и данные файл
+        # получает от sync_replica(). Запросы к нему не ограничиваются
+        # атрибутом databases - его проверяет запуск тестов до
+        # setUpClass.
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = {
+            **connections.settings['default'],
+            'NAME': Path(cls.replica_dir.name) / 'replica.sqlite3',
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.replica_dir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@test.com', is_staff=True
+        )
+        self.student = User.objects.create_user(
+            username='student', email='student@test.com'
+        )
+        self.course = Course.objects.create(author=self.admin,
+                                            title='Course', price=10)
+        self.course.students.add(self.student)
+        sync_replica()
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def get(self, name, *args):
+        return self.client.get(reverse(name, args=args))
+
+    def test_router(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Course), 'default')
+        with read_from():
+            self.assertEqual(router.db_for_read(Course), 'replica')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Course), 'default')
+        self.assertEqual(router.db_for_write(Course), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'courses'))
+
+    def test_safe_requests_read_replica(self):
+        lesson = Lesson.objects.create(course=self.course, title='Lesson',
+                                       link='https://example.com')
+        response = self.get('lessons-detail', self.course.pk, lesson.pk)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        sync_replica()
+        response = self.get('lessons-detail', self.course.pk, lesson.pk)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_versioned_responses_read_primary(self):
+        # Реплика отстаёт: курса и урока в ней нет, а версии каталога и
+        # уроков курса уже увеличены. Кэш и ETag получают данные основной
+        # базы.
+        Course.objects.create(author=self.admin, title='New', price=10)
+        Lesson.objects.create(course=self.course, title='Lesson',
+                              link='https://example.com')
+        for prefix in ('', 'async-'):
+            with self.subTest(prefix=prefix):
+                cache.clear()
+                courses = self.get(f'{prefix}courses-list').json()
+                self.assertEqual(
+                    [course['title'] for course in courses['results']],
+                    ['New', 'Course']
+                )
+                course = self.get(f'{prefix}courses-detail', self.course.pk)
+                self.assertEqual(
+                    [lesson['title'] for lesson in course.json()['lessons']],
+                    ['Lesson']
+                )
+                self.assertIn('ETag', course)
+                lessons = self.get(f'{prefix}lessons-list', self.course.pk)
+                self.assertEqual(
+                    [lesson['title'] for lesson in lessons.json()['results']],
+                    ['Lesson']
+                )
+                self.assertIn('ETag', lessons)
+
+    def test_read_your_writes(self):
+        # Реплика отстаёт: курса нет, покупка - в основной базе.
+        course = Course.objects.create(author=self.admin, title='New',
+                                       price=10)
+        lesson = Lesson.objects.create(course=course, title='Lesson',
+                                       link='https://example.com')
+        response = self.client.post(reverse('courses-pay',
+                                            args=(course.pk,)))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # Покупатель сразу видит свои изменения.
+        response = self.get('lessons-detail', course.pk, lesson.pk)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Остальные читают реплику.
+        self.client.force_authenticate(self.admin)
+        response = self.get('lessons-detail', course.pk, lesson.pk)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # Закрепление истекает.
+        buyer = User.objects.create_user(username='buyer',
+                                         email='buyer@test.com')
+        self.client.force_authenticate(buyer)
+        with override_settings(DATABASE_PRIMARY_PIN_SECONDS=0):
+            response = self.client.post(reverse('courses-pay',
+                                                args=(course.pk,)))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.get('lessons-detail', course.pk, lesson.pk)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,95 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import serializers, status
+from rest_framework.test import APITestCase
+
+from courses.models import Course, Lesson
+
+User = get_user_model()
+
+
+@override_settings(API_TIMING_SAMPLE_RATE=1)
+class ServerTimingTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@test.com', is_staff=True
+        )
+        cls.student = User.objects.create_user(
+            username='student', email='student@test.com'
+        )
+        cls.course = Course.objects.create(author=cls.admin, title='Course',
+                                           price=10)
+        Lesson.objects.create(course=cls.course, title='Lesson',
+                              link='https://example.com')
+
+    def setUp(self):
+        cache.clear()
+
+    def metrics(self, response):
+        return {
+            metric.split(';')[0]: metric
+            for metric in response['Server-Timing'].split(', ')
+        }
+
+    def test_pay(self):
+        self.client.force_authenticate(self.student)
+        url = reverse('courses-pay', args=(self.course.pk,))
+        with self.assertLogs('api.middleware', 'INFO') as logs, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        metrics = self.metrics(response)
+        self.assertEqual(set(metrics),
+                         {'total', 'db', 'serializer', 'render'})
+        self.assertIn(f'desc="{len(queries)} queries"', metrics['db'])
+
+        self.assertEqual(len(logs.records), 1)
+        record = logs.records[0]
+        self.assertIn('view=CourseViewSet.pay', record.getMessage())
+        self.assertEqual(record.timing['view'], 'CourseViewSet.pay')
+        self.assertEqual(record.timing['queries'], len(queries))
+        self.assertEqual(record.timing['status'], 201)
+        self.assertGreaterEqual(record.timing['total_ms'],
+                                record.timing['db_ms'])
+
+    def test_list(self):
+        self.client.force_authenticate(self.student)
+        self.course.students.add(self.student)
+        with self.assertLogs('api.middleware', 'INFO') as logs:
+            response = self.client.get(
+                reverse('lessons-list', args=(self.course.pk,))
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = logs.records[0].timing
+        self.assertEqual(timing['view'], 'LessonViewSet.list')
+        self.assertGreater(timing['serializer_ms'], 0)
+        self.assertGreater(timing['render_ms'], 0)
+
+    def test_pay_serializer(self):
+        self.client.force_authenticate(self.student)
+        with self.assertLogs('api.middleware', 'INFO') as logs:
+            self.client.post(reverse('courses-pay', args=(self.course.pk,)))
+        self.assertGreater(logs.records[0].timing['serializer_ms'], 0)
+
+    def test_drf_classes_unchanged(self):
+        data = serializers.BaseSerializer.__dict__['data']
+        is_valid = serializers.BaseSerializer.__dict__['is_valid']
+        self.client.force_authenticate(self.admin)
+        with self.assertLogs('api.middleware', 'INFO'):
+            self.client.get(reverse('courses-list'))
+        self.assertIs(serializers.BaseSerializer.__dict__['data'], data)
+        self.assertIs(serializers.BaseSerializer.__dict__['is_valid'],
+                      is_valid)
+
+    @override_settings(API_TIMING_SAMPLE_RATE=0)
+    def test_disabled(self):
+        self.client.force_authenticate(self.student)
+        response = self.client.get(reverse('courses-list'))
+        self.assertNotIn('Server-Timing', response)
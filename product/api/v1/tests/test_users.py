@@ -49,7 +49,7 @@ class UsersAPITest(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
-        data = response.json()
+        data = response.json()['results']
         self.assertEqual(len(data), 1)
 
         data = data[0]
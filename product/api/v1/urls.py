@@ -3,7 +3,10 @@ from drf_spectacular.views import (SpectacularAPIView, SpectacularRedocView,
                                    SpectacularSwaggerView)
 from rest_framework.routers import DefaultRouter
 
+from api.v1.views.async_view import (CourseDetailView, CourseListView,
+                                     LessonDetailView, LessonListView)
 from api.v1.views.course_view import CourseViewSet, LessonViewSet, GroupViewSet
+from api.v1.views.event_view import EventViewSet
 from api.v1.views.user_view import UserViewSet
 
 v1_router = DefaultRouter()
@@ -15,6 +18,7 @@ v1_router.register(
 v1_router.register(
     r'courses/(?P<course_id>\d+)/groups', GroupViewSet, basename='groups'
 )
+v1_router.register('events', EventViewSet, basename='events')
 
 urlpatterns = [
     path("", include(v1_router.urls)),
@@ -24,6 +28,18 @@ urlpatterns = [
     # Авторизация пользователя     api/v1/auth/token/login/
 ]
 
+# Асинхронные варианты чтения курсов и уроков (для ASGI).
+urlpatterns += [
+    path('async/courses/', CourseListView.as_view(),
+         name='async-courses-list'),
+    path('async/courses/<int:pk>/', CourseDetailView.as_view(),
+         name='async-courses-detail'),
+    path('async/courses/<int:course_id>/lessons/', LessonListView.as_view(),
+         name='async-lessons-list'),
+    path('async/courses/<int:course_id>/lessons/<int:pk>/',
+         LessonDetailView.as_view(), name='async-lessons-detail'),
+]
+
 urlpatterns += [
     path(
         'schema/',
@@ -0,0 +1,220 @@
+"""
+Асинхронные варианты чтения курсов и уроков для ASGI (product.asgi).
+
+Под ASGI запрос, который ждёт базу, не занимает поток воркера: пока
+выполняется запрос к базе, цикл событий обслуживает другие соединения.
+
+DRF 3.14 асинхронных представлений не поддерживает, поэтому
+AsyncAPIView - APIView с асинхронным dispatch: аутентификация, права,
+обработка ошибок и рендеринг - методы самого APIView, синхронные части
+выполняются в потоке (sync_to_async). Представления повторяют ответы
+CourseViewSet.list/retrieve и LessonViewSet.list/retrieve: те же
+сериализаторы, пагинация, кэш ответов, ETag и права (только JSON, без
+Browsable API). Запросы к базе и кэшу - асинхронным API: aget, acount,
+cache.aget. prefetch_related с асинхронной итерацией в Django 4.2 не
+работает, поэтому уроки курсов догружаются отдельно -
+aprefetch_related_objects.
+"""
+
+from contextlib import ExitStack
+from inspect import isawaitable
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db.models import prefetch_related_objects
+from django.http import Http404
+
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from api.v1.etag import etag_matches, make_etag, not_modified
+from api.v1.pagination import KeysetPagination
+from api.v1.permissions import (IsStudentOfCourseOrIsAdmin,
+                                IsStudentOfLessonOrIsAdmin,
+                                ReadOnlyOrIsAdmin, ais_student_of_course)
+from api.v1.serializers.course_serializer import (CourseDetailSerializer,
+                                                  CourseSerializer,
+                                                  LessonSerializer)
+from api.v1.views.course_view import course_queryset, lesson_queryset
+from courses.cache import (LESSONS, aget_catalogue_version,
+                           aget_course_version, aget_version,
+                           catalogue_cache)
+from courses.models import Course, Lesson
+from product.db import ais_pinned, read_from
+
+User = get_user_model()
+
+# Есть в Django 5.0.
+aprefetch_related_objects = sync_to_async(prefetch_related_objects)
+
+
+class AsyncAPIView(APIView):
+    """
+    Основа асинхронных представлений. dispatch повторяет
+    APIView.dispatch, только обработчик get - корутина, а initial
+    (аутентификация, права, согласование формата) выполняется в потоке.
+    Чтение - с реплики, как в api.v1.replica.ReplicaReadMixin;
+    представления с read_replica = False всегда читают основную базу -
+    как primary_actions ReplicaReadMixin.
+    """
+
+    http_method_names = ['get', 'head', 'options']
+    renderer_classes = (JSONRenderer,)
+    # Те же ответы, что у CourseViewSet и LessonViewSet, - в схеме OpenAPI
+    # их уже описывают синхронные маршруты.
+    schema = None
+    ordering = None
+    read_replica = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            user = request.user
+            with ExitStack() as stack:
+                if self.read_replica and not (
+                        user.is_authenticated and await ais_pinned(user.pk)):
+                    stack.enter_context(read_from())
+                handler = getattr(self, request.method.lower(),
+                                  self.http_method_not_allowed)
+                response = handler(request, *args, **kwargs)
+                if isawaitable(response):
+                    response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args,
+                                               **kwargs)
+        return self.response
+
+    def get_serializer_context(self):
+        return {'request': self.request, 'format': None, 'view': self}
+
+    async def paginate(self, queryset):
+        paginator = KeysetPagination()
+        page = await paginator.apaginate_queryset(queryset, self.request,
+                                                  self)
+        return paginator, page
+
+
+class CourseListView(AsyncAPIView):
+    """Асинхронный CourseViewSet.list."""
+
+    permission_classes = (ReadOnlyOrIsAdmin,)
+    ordering = '-id'
+    # Ответы кэшируются под версией каталога.
+    read_replica = False
+
+    async def get(self, request):
+        key = catalogue_cache.make_key(
+            'list', await aget_catalogue_version(), request
+        )
+        data = await catalogue_cache.aget('list', key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        clients_count = await User.objects.filter(is_staff=False).acount()
+        paginator, page = await self.paginate(course_queryset(clients_count))
+        await aprefetch_related_objects(page, 'lessons')
+        context = self.get_serializer_context()
+        context['clients_count'] = clients_count
+        serializer = CourseSerializer(page, many=True, context=context)
+        response = paginator.get_paginated_response(serializer.data)
+        await catalogue_cache.aset(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class CourseDetailView(AsyncAPIView):
+    """Асинхронный CourseViewSet.retrieve."""
+
+    permission_classes = (IsStudentOfCourseOrIsAdmin,)
+    # Ответы кэшируются под версией курса и получают ETag.
+    read_replica = False
+
+    async def get(self, request, pk):
+        version = await aget_course_version(pk)
+        etag = make_etag('course', pk, version)
+        # ETag и закэшированный ответ выдаются только для существующего
+        # курса, поэтому права проверяются до чтения курса.
+        if etag_matches(request, etag):
+            await self.check_course_access(pk)
+            return not_modified(etag)
+
+        key = catalogue_cache.make_key('detail', version, request)
+        data = await catalogue_cache.aget('detail', key)
+        if data is not None:
+            await self.check_course_access(pk)
+            return Response(data, headers={'X-Cache': 'HIT', 'ETag': etag})
+
+        try:
+            course = await course_queryset().aget(pk=pk)
+        except Course.DoesNotExist:
+            raise Http404
+        await self.check_course_access(pk)
+        await aprefetch_related_objects([course], 'lessons')
+        data = CourseDetailSerializer(
+            course, context=self.get_serializer_context()
+        ).data
+        await catalogue_cache.aset(key, data)
+        return Response(data, headers={'X-Cache': 'MISS', 'ETag': etag})
+
+    async def check_course_access(self, pk):
+        if not await ais_student_of_course(self.request.user, pk):
+            self.permission_denied(self.request)
+
+
+class LessonListView(AsyncAPIView):
+    """Асинхронный LessonViewSet.list."""
+
+    permission_classes = (IsStudentOfLessonOrIsAdmin,)
+    ordering = 'number'
+    # Ответ получает ETag версии уроков курса.
+    read_replica = False
+
+    async def get(self, request, course_id):
+        etag = make_etag('lessons', course_id,
+                         await aget_version(LESSONS, course_id))
+        if not await ais_student_of_course(request.user, course_id):
+            # Как LessonViewSet.check_course_access: 404 для
+            # несуществующего курса, иначе 403 и анонимному.
+            if not await Course.objects.filter(pk=course_id).aexists():
+                raise Http404
+            raise exceptions.PermissionDenied()
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        paginator, page = await self.paginate(lesson_queryset(course_id))
+        if not page and not await Course.objects.filter(
+                pk=course_id).aexists():
+            raise Http404
+        serializer = LessonSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        response = paginator.get_paginated_response(serializer.data)
+        response['ETag'] = etag
+        return response
+
+
+class LessonDetailView(AsyncAPIView):
+    """Асинхронный LessonViewSet.retrieve."""
+
+    permission_classes = (IsStudentOfLessonOrIsAdmin,)
+
+    async def get(self, request, course_id, pk):
+        try:
+            lesson = await lesson_queryset(course_id).aget(pk=pk)
+        except Lesson.DoesNotExist:
+            raise Http404
+        if not await ais_student_of_course(request.user, lesson.course_id):
+            self.permission_denied(request)
+        serializer = LessonSerializer(lesson,
+                                      context=self.get_serializer_context())
+        return Response(serializer.data)
@@ -1,3 +1,5 @@
+from django.contrib.auth import get_user_model
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.core.exceptions import PermissionDenied
 
@@ -8,26 +10,146 @@ from rest_framework.response import Response
 
 from drf_spectacular.utils import extend_schema, extend_schema_field
 
+from api.middleware import TimedSerializersMixin, timed_serializer
+from api.v1.etag import etag_matches, make_etag, not_modified
 from api.v1.permissions import (IsStudentOfCourseOrIsAdmin,
                                 IsStudentOfLessonOrIsAdmin,
-                                ReadOnlyOrIsAdmin)
+                                ReadOnlyOrIsAdmin,
+                                is_student_of_course)
 from api.v1.serializers.course_serializer import (CourseSerializer,
                                                   CourseDetailSerializer,
                                                   CreateCourseSerializer,
                                                   CreateGroupSerializer,
                                                   CreateLessonSerializer,
+                                                  EnrollmentResultSerializer,
+                                                  EnrollmentSerializer,
                                                   GroupSerializer,
-                                                  LessonSerializer)
+                                                  LessonSerializer,
+                                                  ReorderSerializer)
 from api.v1.serializers.user_serializer import SubscriptionSerializer
-from courses.models import Course
+from courses.cache import (CATALOGUE, COURSE, GROUPS, LESSONS,
+                           bump_versions, catalogue_cache,
+                           get_catalogue_version, get_course_version,
+                           get_version)
+from courses.enrollment import enroll_students
+from courses.models import Course, Group, Lesson
+from product.db import write_atomic
 from users.models import Subscription
 
-from api.v1.payment import make_payment
+from api.v1.pagination import KeysetPagination
+from api.v1.payment import (AlreadyPurchased, CourseIsFull,
+                            InsufficientFunds, make_payment,
+                            purchase_status)
+from api.v1.replica import ReplicaReadMixin
+
+User = get_user_model()
+
+
+def course_queryset(clients_count=None):
+    """
+    Курсы для list и retrieve - со статистикой и автором; названия
+    уроков догружаются prefetch_related('lessons').
+    """
+    return Course.objects.with_statistics(
+        clients_count=clients_count
+    ).select_related('author').only(
+        'title', 'start_date', 'price', 'students_count', 'lessons_count',
+        'author__first_name', 'author__last_name', 'lessons__title'
+    )
+
+
+def lesson_queryset(course_id):
+    """Уроки курса для list и retrieve - вместе с курсом."""
+    return Lesson.objects.filter(
+        course_id=course_id
+    ).select_related('course').only(
+        'title', 'link', 'number', 'course__title'
+    )
 
 
-class LessonViewSet(viewsets.ModelViewSet):
+class CourseLookupMixin:
+    """
+    Курс из URL (course_id) для вложенных ресурсов - уроков и групп.
+
+    Прочитанные за запрос курсы хранятся в словаре на запросе (identity
+    map): повторные обращения к тому же курсу запросов не выполняют, а
+    объекты, полученные через select_related('course'), ссылаются на один
+    и тот же экземпляр курса.
+    """
+
+    def get_course_map(self):
+        if not hasattr(self.request, 'course_map'):
+            self.request.course_map = {}
+        return self.request.course_map
+
+    def get_course(self):
+        course_id = int(self.kwargs['course_id'])
+        courses = self.get_course_map()
+        if course_id not in courses:
+            courses[course_id] = get_object_or_404(Course, id=course_id)
+        return courses[course_id]
+
+    def remember_courses(self, objs):
+        courses = self.get_course_map()
+        for obj in objs:
+            obj.course = courses.setdefault(obj.course_id, obj.course)
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            if not page:
+                # Пустая страница - возможно, курса нет (404).
+                self.get_course()
+            self.remember_courses(page)
+        return page
+
+    def get_object(self):
+        obj = super().get_object()
+        self.remember_courses([obj])
+        return obj
+
+
+class ReorderMixin:
+    """
+    Действие reorder - новый порядок всех объектов курса (поле number)
+    одним запросом вместо PATCH каждого объекта.
+    reorder_scopes - области версий кэша, которые нужно сбросить.
+    """
+
+    reorder_scopes = ()
+
+    @extend_schema(request=ReorderSerializer, responses=ReorderSerializer)
+    @action(methods=['post'], detail=False)
+    def reorder(self, request, course_id):
+        queryset = self.get_queryset()
+        field = queryset.model._meta.get_field('number')
+        with write_atomic():
+            numbers = dict(
+                queryset.select_for_update().order_by().values_list(
+                    'pk', 'number'
+                )
+            )
+            serializer = timed_serializer(ReorderSerializer(
+                data=request.data, context={'ids': numbers}
+            ))
+            serializer.is_valid(raise_exception=True)
+            field.reorder(queryset, serializer.validated_data['order'],
+                          max(numbers.values()))
+        bump_versions(self.reorder_scopes, [int(course_id)])
+        return Response(serializer.data)
+
+
+class LessonViewSet(TimedSerializersMixin, ReplicaReadMixin,
+                    CourseLookupMixin, ReorderMixin, viewsets.ModelViewSet):
     """Уроки."""
 
+    pagination_class = KeysetPagination
+    ordering = 'number'
+    # Названия уроков по порядку есть и в ответах о курсе.
+    reorder_scopes = (LESSONS, COURSE, CATALOGUE)
+    # Список уроков отдаётся с ETag версии уроков курса.
+    primary_actions = ('list',)
+
     # permission_classes = (IsStudentOrIsAdmin,)
 
     def get_permissions(self):
@@ -45,35 +167,110 @@ class LessonViewSet(viewsets.ModelViewSet):
         return CreateLessonSerializer
 
     def perform_create(self, serializer):
-        course = get_object_or_404(Course, id=self.kwargs.get('course_id'))
-        serializer.save(course=course)
+        serializer.save(course=self.get_course())
 
     def get_queryset(self):
-        course = get_object_or_404(Course, id=self.kwargs.get('course_id'))
-        if self.action == 'list':
-            if not course.students.filter(id=self.request.user.id).exists():
-                raise PermissionDenied('Курс не был приобретён.')
-        return course.lessons.all()
+        if self.action in ['list', 'retrieve']:
+            # Курс читается вместе с уроками; права - из
+            # courses.entitlements, обычно без запроса.
+            course_id = self.kwargs['course_id']
+            if self.action == 'list':
+                self.check_course_access(course_id)
+            return lesson_queryset(course_id)
+        return self.get_course().lessons.all()
+
+    def check_course_access(self, course_id):
+        if not is_student_of_course(self.request.user, course_id):
+            # Несуществующий курс - 404, а не 403: запрос курса только
+            # при отказе, студентам он не нужен.
+            self.get_course()
+            raise PermissionDenied('Курс не был приобретён.')
+
+    def list(self, request, *args, **kwargs):
+        course_id = kwargs['course_id']
+        etag = make_etag('lessons', course_id,
+                         get_version(LESSONS, course_id))
+        if etag_matches(request, etag):
+            self.check_course_access(course_id)
+            return not_modified(etag)
+
+        response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        return response
+
+
+class CourseViewSet(TimedSerializersMixin, ReplicaReadMixin,
+                    viewsets.ModelViewSet):
+    """Курсы """
 
+    pagination_class = KeysetPagination
+    ordering = '-id'
+    # Ответы кэшируются под версией каталога и курса.
+    primary_actions = ('list', 'retrieve')
 
-class CourseViewSet(viewsets.ModelViewSet):
-    """Курсы """
+    def get_clients_count(self):
+        """
+        Количество клиентов (is_staff=False) для процента приобретаемости
+        курсов. Считается один раз на запрос.
+        """
+        if not hasattr(self, '_clients_count'):
+            self._clients_count = User.objects.filter(is_staff=False).count()
+        return self._clients_count
 
     def get_queryset(self):
         if self.action in ['list', 'retrieve']:
-            return Course.objects.all().select_related(
-                'author'
-            ).prefetch_related('lessons').only(
-                'title', 'start_date', 'price', 'author__first_name',
-                'author__last_name', 'lessons__title'
-            )
+            clients_count = None
+            if self.action == 'list':
+                clients_count = self.get_clients_count()
+            return course_queryset(clients_count).prefetch_related('lessons')
         return Course.objects.all()
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'list':
+            context['clients_count'] = self.get_clients_count()
+        return context
+
+    def list(self, request, *args, **kwargs):
+        key = catalogue_cache.make_key(
+            'list', get_catalogue_version(), request
+        )
+        data = catalogue_cache.get('list', key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        response = super().list(request, *args, **kwargs)
+        catalogue_cache.set(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        version = get_course_version(kwargs['pk'])
+        etag = make_etag('course', kwargs['pk'], version)
+        if etag_matches(request, etag):
+            # Такой ETag выдавался для текущей версии курса, значит курс
+            # существует; для проверки доступа достаточно его pk.
+            self.check_object_permissions(request, Course(pk=kwargs['pk']))
+            return not_modified(etag)
+
+        key = catalogue_cache.make_key('detail', version, request)
+        data = catalogue_cache.get('detail', key)
+        if data is not None:
+            # Так же, как и для ETag, курс существует.
+            self.check_object_permissions(request, Course(pk=kwargs['pk']))
+            return Response(data, headers={'X-Cache': 'HIT', 'ETag': etag})
+
+        response = super().retrieve(request, *args, **kwargs)
+        catalogue_cache.set(key, response.data)
+        response['X-Cache'] = 'MISS'
+        response['ETag'] = etag
+        return response
+
     def get_permissions(self):
         if self.action == 'retrieve':
             return [IsStudentOfCourseOrIsAdmin()]
         if self.action in ['create', 'update',
-                           'partial_update', 'delete']:
+                           'partial_update', 'delete', 'enroll']:
             return [permissions.IsAdminUser()]
         if self.action == 'pay':
             return [IsAuthenticated()]
@@ -97,50 +294,66 @@ class CourseViewSet(viewsets.ModelViewSet):
     def pay(self, request, pk):
         """
         Оплата курса за бонусы. Пустой post-запрос на ендпоинт.
+
+        Запросы к базе (не считая аутентификации):
+        1. purchase_status - все предварительные проверки одним SELECT
+           по первичному ключу курса; отказ (куплен, не хватает бонусов,
+           нет мест) на этом и заканчивается;
+        2. make_payment - в одной транзакции: подписка, задача
+           распределения в группу, списание бонусов, студент курса,
+           место на курсе, события журнала (6 запросов).
+        Ни один из них не зависит от количества студентов курса.
+        Распределение в группу выполняет воркер очереди (run_worker).
         """
         user = request.user
 
-        course = get_object_or_404(Course, id=pk)
-
-        if user in course.students.all():
-            return Response(
-                {'detail': 'Вы ужи приобрели этот курс'},
-                status.HTTP_400_BAD_REQUEST
-            )
-
-        price = course.price
-
-        user_balance = user.balance
-
-        if user_balance.bonuses < price:
-            return Response(
-                {'detail': 'На вашем счету недостаточно средств'},
-                status.HTTP_402_PAYMENT_REQUIRED
-            )
-
+        purchase = purchase_status(user, pk)
+        if purchase is None:
+            raise Http404
+        if purchase.owned:
+            raise AlreadyPurchased()
+        if purchase.bonuses < purchase.price:
+            raise InsufficientFunds()
+        if not purchase.has_seats:
+            raise CourseIsFull()
+
+        # Для оплаты достаточно pk и цены, курс заново не читается.
         subscription = make_payment(
-            user=user,
-            user_balance=user_balance,
-            course=course,
-            price=price
+            user=user, course=Course(pk=int(pk), price=purchase.price)
         )
 
-        if subscription is None:
-            return Response(
-                {'error': 'Произошла ошибка, повторите попытку позже'},
-                status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-
         return Response(
-            SubscriptionSerializer(subscription).data,
+            timed_serializer(SubscriptionSerializer(subscription)).data,
             status=status.HTTP_201_CREATED
         )
 
+    @extend_schema(request=EnrollmentSerializer,
+                   responses=EnrollmentResultSerializer)
+    @action(methods=['post'], detail=True)
+    def enroll(self, request, pk):
+        """
+        Пакетное зачисление студентов на курс администратором без оплаты:
+        {"user_ids": [...], "emails": [...]}. Все студенты зачисляются
+        одной транзакцией с фиксированным числом запросов
+        (courses.enrollment).
+        """
+        course = get_object_or_404(Course.objects.only('pk'), pk=pk)
+        serializer = timed_serializer(EnrollmentSerializer(data=request.data))
+        serializer.is_valid(raise_exception=True)
+        result = enroll_students(course.pk, **serializer.validated_data)
+        return Response(timed_serializer(
+            EnrollmentResultSerializer(result._asdict())
+        ).data)
+
 
-class GroupViewSet(viewsets.ModelViewSet):
+class GroupViewSet(TimedSerializersMixin, ReplicaReadMixin,
+                   CourseLookupMixin, ReorderMixin, viewsets.ModelViewSet):
     """Группы."""
 
     permission_classes = (permissions.IsAdminUser,)
+    pagination_class = KeysetPagination
+    ordering = 'number'
+    reorder_scopes = (GROUPS,)
 
     def get_serializer_class(self):
         if self.action in ['list', 'retrieve']:
@@ -148,14 +361,24 @@ class GroupViewSet(viewsets.ModelViewSet):
         return CreateGroupSerializer
 
     def perform_create(self, serializer):
-        course = get_object_or_404(Course, id=self.kwargs.get('course_id'))
-        serializer.save(course=course)
+        serializer.save(course=self.get_course())
+
+    def list(self, request, *args, **kwargs):
+        course_id = kwargs['course_id']
+        etag = make_etag('groups', course_id, get_version(GROUPS, course_id))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        return response
 
     def get_queryset(self):
-        course = get_object_or_404(Course, id=self.kwargs.get('course_id'))
         if self.action in ['list', 'retrieve']:
-            return course.groups.all().select_related('course').prefetch_related(
+            return Group.objects.filter(
+                course_id=self.kwargs['course_id']
+            ).select_related('course').prefetch_related(
                 'students'
-            ).only('title', 'course__title', 'students__email',
+            ).only('title', 'number', 'course__title', 'students__email',
                    'students__first_name', 'students__last_name')
-        return course.groups.all()
\ No newline at end of file
+        return self.get_course().groups.all()
\ No newline at end of file
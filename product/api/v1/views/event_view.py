@@ -0,0 +1,23 @@
+from rest_framework import permissions, viewsets
+
+from api.middleware import TimedSerializersMixin
+from api.v1.pagination import AfterIdPagination
+from api.v1.replica import ReplicaReadMixin
+from api.v1.serializers.event_serializer import EventSerializer
+from courses.models import Event
+
+
+class EventViewSet(TimedSerializersMixin, ReplicaReadMixin,
+                   viewsets.ReadOnlyModelViewSet):
+    """
+    Журнал событий (courses.outbox) для потребителей аналитики: события
+    после ?after=<id> по возрастанию id пакетами по ?limit=N. Реплика
+    применяет транзакции в порядке фиксации, поэтому отставание реплики
+    задерживает события, но не пропускает их.
+    """
+
+    queryset = Event.objects.all()
+    serializer_class = EventSerializer
+    http_method_names = ["get", "head", "options"]
+    permission_classes = (permissions.IsAdminUser,)
+    pagination_class = AfterIdPagination
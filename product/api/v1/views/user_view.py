@@ -1,19 +1,33 @@
 from django.contrib.auth import get_user_model
 from rest_framework import permissions, viewsets
 
+from api.middleware import TimedSerializersMixin
+from api.v1.pagination import KeysetPagination
+from api.v1.replica import ReplicaReadMixin
 from api.v1.serializers.user_serializer import (CustomUserSerializer,
                                                 UserAdminEditSerializer)
 
 User = get_user_model()
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(TimedSerializersMixin, ReplicaReadMixin,
+                  viewsets.ModelViewSet):
     queryset = User.objects.all().select_related('balance')
     serializer_class = CustomUserSerializer
     http_method_names = ["get", "head", "options", "patch"]
     # Админ может изменить информацию о пользователе, в том числе
     # и баланс, используя API.
     permission_classes = (permissions.IsAdminUser,)
+    pagination_class = KeysetPagination
+    ordering = '-id'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ["list", "retrieve"]:
+            # CustomUserSerializer выводит группы и права пользователя -
+            # без prefetch_related это два запроса на каждого пользователя.
+            queryset = queryset.prefetch_related('groups', 'user_permissions')
+        return queryset
 
     def get_serializer_class(self):
         if self.action in ["list", "retrieve", "head", "options"]:
@@ -0,0 +1,6 @@
+"""
+Инструменты измерения производительности (команды benchmark_api,
+benchmark_concurrency, benchmark_payment и benchmark_ordering).
+Используют django.test, поэтому приложением не импортируются - только
+командами и тестами.
+"""
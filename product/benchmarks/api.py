@@ -0,0 +1,340 @@
+"""
+Бенчмарк эндпоинтов API: количество запросов к базе, задержка (p50/p95)
+и пиковая память на каждый маршрут v1_router при разных объёмах данных.
+
+Команда benchmark_api работает на временной базе (throwaway_database),
+а не на настроенной: данные каждого объёма создаются в транзакции,
+которая в конце откатывается, и на SQLite всё это время держится
+блокировка записи. Каждый запрос выполняется в своей точке сохранения,
+которая тоже откатывается - поэтому изменяющие запросы (оплата,
+удаление) повторяются на одних и тех же данных. Перед каждым запросом
+кэш очищается: измеряется путь через базу, а не через кэш ответов.
+
+Бюджеты хранятся в BUDGET_PATH: {"GET courses-list": {"queries": 5,
+"p95_ms": 50, "peak_kb": 2048}, ...}. Количество запросов не должно
+зависеть от объёма данных, поэтому бюджет один на все объёмы - рост
+количества запросов (N+1) ловится уже на малых данных.
+"""
+
+import json
+import secrets
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_databases, teardown_databases)
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from api.v1.urls import v1_router
+from courses.models import Course, Event, Group, Lesson
+from users.models import Balance
+
+User = get_user_model()
+
+BUDGET_PATH = Path(__file__).with_name('budget.json')
+
+# Студенты основного курса бенчмарка: почти полный курс, чтобы списки
+# групп и студентов были самыми большими, но место для оплаты оставалось.
+MAIN_COURSE_STUDENTS = Course.MAX_STUDENTS_QUANTITY - 10
+GROUP_NAMES = ('А', 'Б', 'В', 'Г', 'Д', 'Е', 'Ж', 'З', 'И', 'К')
+LESSONS_PER_COURSE = 3
+
+Dataset = namedtuple(
+    'Dataset',
+    ('admin', 'student', 'buyer', 'course', 'lessons', 'groups', 'event')
+)
+Scenario = namedtuple('Scenario', ('name', 'method', 'user', 'kwargs', 'data'))
+Result = namedtuple(
+    'Result', ('scale', 'key', 'queries', 'p50_ms', 'p95_ms', 'peak_kb')
+)
+
+
+def seed_dataset(users, courses):
+    """
+    Набор данных: users пользователей и courses курсов, по 10 групп и
+    LESSONS_PER_COURSE уроков на курс. Первый курс почти заполнен
+    (MAIN_COURSE_STUDENTS студентов), остальные пользователи
+    распределены по остальным курсам (не меньше одного на курс, пока
+    хватает пользователей). Сигналы не вызываются, счётчики заполняются
+    сразу. Имена пользователей уникальны для каждого вызова - набор можно
+    создать в базе, где он уже есть.
+    """
+    tag = secrets.token_hex(4)
+    admin = User.objects.create_user(username=f'bench-{tag}-admin',
+                                     email=f'bench-{tag}-admin@test.com',
+                                     is_staff=True)
+    # Без пароля - хэширование только замедлило бы загрузку.
+    people = User.objects.bulk_create(
+        User(username=f'bench-{tag}-{num}',
+             email=f'bench-{tag}-{num}@test.com',
+             first_name='Имя', last_name=f'Фамилия {num}')
+        for num in range(users)
+    )
+    Balance.objects.bulk_create(Balance(user=user) for user in people)
+
+    main, rest = people[:MAIN_COURSE_STUDENTS], people[MAIN_COURSE_STUDENTS:]
+    courses = max(courses, 2)
+    per_course = min(max(len(rest) // (courses - 1), 1),
+                     Course.MAX_STUDENTS_QUANTITY)
+    members = [main] + [rest[num * per_course:(num + 1) * per_course]
+                        for num in range(courses - 1)]
+
+    course_objs = Course.objects.bulk_create(
+        Course(author=admin, title=f'Курс {num}', price=10,
+               students_count=len(members[num]),
+               lessons_count=LESSONS_PER_COURSE)
+        for num in range(courses)
+    )
+    groups = []
+    lessons = []
+    for course in course_objs:
+        groups += [Group(course=course, title=f'Группа {name}', number=num)
+                   for num, name in enumerate(GROUP_NAMES, start=1)]
+        lessons += [Lesson(course=course, title=f'Урок {num}',
+                           link='https://example.com', number=num)
+                    for num in range(1, LESSONS_PER_COURSE + 1)]
+    Group._meta.get_field('number').mark_reserved(groups)
+    Lesson._meta.get_field('number').mark_reserved(lessons)
+
+    links = []
+    for course_num, students in enumerate(members):
+        course_groups = groups[course_num * 10:(course_num + 1) * 10]
+        for num, user in enumerate(students):
+            course_groups[num % 10].member_count += 1
+            links.append((course_groups[num % 10], user))
+    groups = Group.objects.bulk_create(groups)
+    Lesson.objects.bulk_create(lessons)
+    Course.students.through.objects.bulk_create(
+        Course.students.through(course=course, customuser=user)
+        for course, students in zip(course_objs, members)
+        for user in students
+    )
+    Group.students.through.objects.bulk_create(
+        Group.students.through(group=group, customuser=user)
+        for group, user in links
+    )
+    # Журнал событий - как если бы студентов зачисляли по одному.
+    Event.objects.bulk_create(
+        Event(kind=Event.ENROLL, user_id=user.pk, course_id=course.pk)
+        for course, students in zip(course_objs, members)
+        for user in students
+    )
+
+    return Dataset(
+        admin=admin,
+        student=main[0],
+        # Покупатель - не студент ни одного курса.
+        buyer=User.objects.create_user(username=f'bench-{tag}-buyer',
+                                       email=f'bench-{tag}-buyer@test.com'),
+        course=course_objs[0],
+        lessons=[lesson.pk for lesson in lessons[:LESSONS_PER_COURSE]],
+        groups=[group.pk for group in groups[:10]],
+        event=Event.objects.values_list('pk', flat=True).first(),
+    )
+
+
+def get_scenarios(data):
+    """Запросы бенчмарка - по одному на каждый метод каждого маршрута."""
+    course = {'pk': data.course.pk}
+    nested = {'course_id': data.course.pk}
+    lesson = {'course_id': data.course.pk, 'pk': data.lessons[0]}
+    group = {'course_id': data.course.pk, 'pk': data.groups[0]}
+    new_course = {'title': 'Новый курс', 'price': 10}
+    new_lesson = {'title': 'Новый урок', 'link': 'https://example.com'}
+    return [
+        Scenario('users-list', 'get', data.admin, {}, None),
+        Scenario('users-detail', 'get', data.admin,
+                 {'pk': data.student.pk}, None),
+        Scenario('users-detail', 'patch', data.admin,
+                 {'pk': data.student.pk}, {'first_name': 'Имя'}),
+        Scenario('courses-list', 'get', data.student, {}, None),
+        Scenario('courses-list', 'post', data.admin, {}, new_course),
+        Scenario('courses-detail', 'get', data.student, course, None),
+        Scenario('courses-detail', 'put', data.admin, course, new_course),
+        Scenario('courses-detail', 'patch', data.admin, course,
+                 {'title': 'Курс'}),
+        Scenario('courses-detail', 'delete', data.admin, course, None),
+        Scenario('courses-pay', 'post', data.buyer, course, None),
+        Scenario('courses-enroll', 'post', data.admin, course,
+                 {'user_ids': [data.buyer.pk]}),
+        Scenario('lessons-list', 'get', data.student, nested, None),
+        Scenario('lessons-list', 'post', data.admin, nested, new_lesson),
+        Scenario('lessons-reorder', 'post', data.admin, nested,
+                 {'order': data.lessons[::-1]}),
+        Scenario('lessons-detail', 'get', data.student, lesson, None),
+        Scenario('lessons-detail', 'put', data.admin, lesson, new_lesson),
+        Scenario('lessons-detail', 'patch', data.admin, lesson,
+                 {'title': 'Урок'}),
+        Scenario('lessons-detail', 'delete', data.admin, lesson, None),
+        Scenario('groups-list', 'get', data.admin, nested, None),
+        Scenario('groups-list', 'post', data.admin, nested,
+                 {'title': 'Группа'}),
+        Scenario('groups-reorder', 'post', data.admin, nested,
+                 {'order': data.groups[::-1]}),
+        Scenario('groups-detail', 'get', data.admin, group, None),
+        Scenario('groups-detail', 'put', data.admin, group,
+                 {'title': 'Группа'}),
+        Scenario('groups-detail', 'patch', data.admin, group,
+                 {'title': 'Группа'}),
+        Scenario('groups-detail', 'delete', data.admin, group, None),
+        Scenario('events-list', 'get', data.admin, {}, None),
+        Scenario('events-detail', 'get', data.admin, {'pk': data.event},
+                 None),
+    ]
+
+
+def router_routes():
+    """Пары (имя маршрута, метод) всех маршрутов v1_router."""
+    routes = set()
+    for prefix, viewset, basename in v1_router.registry:
+        allowed = set(viewset.http_method_names)
+        for route in v1_router.get_routes(viewset):
+            for method in route.mapping:
+                if method in allowed:
+                    name = route.name.format(basename=basename)
+                    routes.add((name, method))
+    return routes
+
+
+def scenario_key(scenario):
+    return f'{scenario.method.upper()} {scenario.name}'
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def _request(client, scenario):
+    """Один запрос в откатываемой точке сохранения, на холодном кэше."""
+    cache.clear()
+    url = reverse(scenario.name, kwargs=scenario.kwargs)
+    client.force_authenticate(scenario.user)
+    with transaction.atomic():
+        response = getattr(client, scenario.method)(url, scenario.data,
+                                                    format='json')
+        transaction.set_rollback(True)
+    if response.status_code >= 400:
+        raise AssertionError(
+            f'{scenario_key(scenario)}: {response.status_code} '
+            f'{getattr(response, "data", "")}'
+        )
+
+
+def measure(scenario, iterations, client):
+    queries = 0
+    timings = []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            _request(client, scenario)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries = max(queries, len([
+            query for query in captured
+            if 'SAVEPOINT' not in query['sql']
+        ]))
+
+    # Память - отдельным запросом: tracemalloc заметно замедляет работу.
+    tracemalloc.start()
+    try:
+        _request(client, scenario)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return queries, timings, peak / 1024
+
+
+@contextmanager
+def throwaway_database(verbosity=0):
+    """
+    Временные базы вместо настроенных - как у тестов: схема создаётся
+    миграциями, по выходе базы удаляются. Базы SQLite - файлы во
+    временном каталоге, поэтому не совпадают и с базами тестов.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        originals = {}
+        for alias in connections:
+            settings_dict = connections[alias].settings_dict
+            if connections[alias].vendor == 'sqlite':
+                originals[alias] = dict(settings_dict['TEST'])
+                settings_dict['TEST']['NAME'] = str(
+                    Path(directory) / f'{alias}.sqlite3'
+                )
+        old_config = setup_databases(verbosity, interactive=False)
+        try:
+            yield
+        finally:
+            teardown_databases(old_config, verbosity)
+            for alias, test_settings in originals.items():
+                connections[alias].settings_dict['TEST'] = test_settings
+
+
+def run_benchmark(scales, iterations=20, courses_ratio=1, stdout=None):
+    """
+    Бенчмарк всех маршрутов для каждого объёма данных из scales
+    (количество пользователей; курсов - в courses_ratio раз меньше, по
+    умолчанию столько же). Возвращает список Result.
+    """
+    results = []
+    hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+    with override_settings(ALLOWED_HOSTS=hosts):
+        for scale in scales:
+            with transaction.atomic():
+                started = time.perf_counter()
+                data = seed_dataset(scale, scale // courses_ratio)
+                if stdout:
+                    stdout.write(f'{scale}: данные созданы за '
+                                 f'{time.perf_counter() - started:.1f} с')
+                client = APIClient()
+                for scenario in get_scenarios(data):
+                    queries, timings, peak_kb = measure(scenario, iterations,
+                                                        client)
+                    results.append(Result(
+                        scale=scale,
+                        key=scenario_key(scenario),
+                        queries=queries,
+                        p50_ms=round(statistics.median(timings), 2),
+                        p95_ms=round(_percentile(timings, 95), 2),
+                        peak_kb=round(peak_kb, 1),
+                    ))
+                transaction.set_rollback(True)
+    return results
+
+
+def load_budget(path=BUDGET_PATH):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def check_budget(results, budget, latency=True):
+    """
+    Нарушения бюджета - список строк. latency=False - не проверять
+    задержку (зависит от машины, например, в тестах).
+    """
+    metrics = ['queries', 'peak_kb'] + (['p95_ms'] if latency else [])
+    violations = []
+    for result in results:
+        limits = budget.get(result.key)
+        if limits is None:
+            violations.append(f'{result.key}: нет бюджета')
+            continue
+        for metric in metrics:
+            value = getattr(result, metric)
+            if metric in limits and value > limits[metric]:
+                violations.append(
+                    f'{result.key} [{result.scale}]: {metric} = {value}, '
+                    f'бюджет {limits[metric]}'
+                )
+    return violations
@@ -0,0 +1,254 @@
+"""
+Пропускная способность при параллельных соединениях: чтение курсов и
+уроков через WSGI (CourseViewSet, LessonViewSet) и через ASGI
+(api.v1.views.async_view).
+
+Приложения product.wsgi и product.asgi вызываются в процессе, без
+сервера и сети, так, как их вызывали бы серверы:
+- WSGI - пул из workers потоков (как потоки gunicorn), каждый поток
+  обслуживает один запрос за раз, остальные соединения ждут;
+- ASGI - один цикл событий (как воркер uvicorn) и concurrency
+  одновременных соединений.
+Данные берутся из настроенной базы (например, после seed_data): курс с
+уроками и его студент, для которого создаётся токен. Кэш на время
+бенчмарка отключается - измеряется путь через базу.
+
+Запросы к локальной SQLite почти не ждут, поэтому db_latency
+добавляет к каждому запросу к базе задержку (time.sleep) - как у базы
+по сети. Это ожидание и занимает поток WSGI; под ASGI запрос к базе
+выполняется в отдельном потоке (sync_to_async), а цикл событий
+продолжает принимать соединения. Соединения запросов ASGI закрывает
+само приложение (product.asgi.close_connections).
+"""
+
+import asyncio
+import statistics
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from wsgiref.util import setup_testing_defaults
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from courses.models import Lesson
+
+HOST = 'localhost'
+
+# Маршрут WSGI и его асинхронный вариант.
+ROUTES = (
+    ('courses-list', 'async-courses-list'),
+    ('courses-detail', 'async-courses-detail'),
+    ('lessons-list', 'async-lessons-list'),
+    ('lessons-detail', 'async-lessons-detail'),
+)
+
+Target = namedtuple('Target', ('route', 'wsgi_path', 'asgi_path'))
+Result = namedtuple(
+    'Result',
+    ('server', 'route', 'concurrency', 'requests', 'rps', 'p50_ms',
+     'p95_ms', 'errors')
+)
+
+DISABLED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+
+
+def get_targets():
+    """
+    Пути маршрутов на данных из базы и ключ токена студента курса.
+    LookupError, если в базе нет курса с уроками и студентами.
+    """
+    lesson = Lesson.objects.filter(
+        course__students__isnull=False
+    ).order_by('pk').first()
+    if lesson is None:
+        raise LookupError('Нет курса с уроками и студентами.')
+    student = lesson.course.students.order_by('pk').first()
+    token, _ = Token.objects.get_or_create(user=student)
+    args = {
+        'courses-list': (),
+        'courses-detail': (lesson.course_id,),
+        'lessons-list': (lesson.course_id,),
+        'lessons-detail': (lesson.course_id, lesson.pk),
+    }
+    targets = [
+        Target(name, reverse(name, args=args[name]),
+               reverse(async_name, args=args[name]))
+        for name, async_name in ROUTES
+    ]
+    return token.key, targets
+
+
+@contextmanager
+def db_latency(seconds):
+    """Задержка seconds перед каждым запросом к базе в новых соединениях."""
+    if not seconds:
+        yield
+        return
+
+    def wrapper(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def add_wrapper(sender, connection, **kwargs):
+        connection.execute_wrappers.append(wrapper)
+
+    connection_created.connect(add_wrapper)
+    try:
+        yield
+    finally:
+        connection_created.disconnect(add_wrapper)
+
+
+def _summary(server, route, concurrency, durations, statuses, elapsed):
+    durations = sorted(durations)
+    return Result(
+        server=server,
+        route=route,
+        concurrency=concurrency,
+        requests=len(durations),
+        rps=round(len(durations) / elapsed, 1),
+        p50_ms=round(statistics.median(durations) * 1000, 2),
+        p95_ms=round(durations[int(len(durations) * 0.95) - 1] * 1000, 2),
+        errors=sum(status != 200 for status in statuses),
+    )
+
+
+def run_wsgi(application, path, token, workers, requests):
+    """requests запросов GET path пулом из workers потоков."""
+    counter = iter(range(requests))
+    lock = threading.Lock()
+    durations, statuses = [], []
+
+    def worker():
+        try:
+            while True:
+                with lock:
+                    if next(counter, None) is None:
+                        return
+                environ = {
+                    'REQUEST_METHOD': 'GET',
+                    'PATH_INFO': path,
+                    'HTTP_HOST': HOST,
+                    'HTTP_AUTHORIZATION': f'Token {token}',
+                }
+                setup_testing_defaults(environ)
+                response_status = []
+                started = time.perf_counter()
+                body = application(
+                    environ,
+                    lambda status, headers: response_status.append(status)
+                )
+                try:
+                    b''.join(body)
+                finally:
+                    body.close()
+                with lock:
+                    durations.append(time.perf_counter() - started)
+                    statuses.append(int(response_status[0].split()[0]))
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return durations, statuses, time.perf_counter() - started
+
+
+async def _asgi_request(application, path, token):
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [(b'host', HOST.encode()),
+                    (b'authorization', f'Token {token}'.encode())],
+        'client': ('127.0.0.1', 0),
+        'server': (HOST, 80),
+    }
+    done = asyncio.Event()
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    response_status = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response_status.append(message['status'])
+        elif not message.get('more_body'):
+            done.set()
+
+    await application(scope, receive, send)
+    return response_status[0]
+
+
+def run_asgi(application, path, token, concurrency, requests):
+    """requests запросов GET path через concurrency соединений."""
+    durations, statuses = [], []
+
+    async def connection(count):
+        for _ in range(count):
+            started = time.perf_counter()
+            statuses.append(await _asgi_request(application, path, token))
+            durations.append(time.perf_counter() - started)
+
+    async def main():
+        counts = [requests // concurrency + (index < requests % concurrency)
+                  for index in range(concurrency)]
+        await asyncio.gather(*(connection(count) for count in counts
+                               if count))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    return durations, statuses, time.perf_counter() - started
+
+
+def run_benchmark(requests=500, concurrency=50, workers=4,
+                  db_latency_ms=5, routes=None, stdout=None):
+    """
+    Результаты WSGI и ASGI для каждого маршрута. Запросы повторяются
+    requests раз; concurrency - одновременные соединения ASGI, workers -
+    потоки WSGI.
+    """
+    from product.asgi import application as asgi_application
+    from product.wsgi import application as wsgi_application
+
+    token, targets = get_targets()
+    results = []
+    with override_settings(CACHES=DISABLED_CACHES), \
+            db_latency(db_latency_ms / 1000):
+        for target in targets:
+            if routes and target.route not in routes:
+                continue
+            if stdout:
+                stdout.write(f'{target.route}...')
+            results.append(_summary(
+                'wsgi', target.route, workers,
+                *run_wsgi(wsgi_application, target.wsgi_path, token,
+                          workers, requests)
+            ))
+            results.append(_summary(
+                'asgi', target.route, concurrency,
+                *run_asgi(asgi_application, target.asgi_path, token,
+                          concurrency, requests)
+            ))
+    return results
@@ -0,0 +1,101 @@
+"""
+Выдача номеров групп (OrderField) при параллельных вставках: threads
+потоков создают по per_thread групп одного курса.
+
+Способы нумерации (STRATEGIES):
+- sequence - OrderField: номер из счётчика OrderSequence, атомарным
+  UPDATE;
+- max - прежний способ: MAX(number) + 1 и отдельная вставка.
+  Параллельные вставки получают одинаковые номера, и часть из них
+  отклоняется ограничением уникальности (course, number).
+
+Потоки видят только закоммиченные данные, поэтому команда
+benchmark_ordering работает на временной базе (throwaway_database), без
+внешней транзакции. Для каждого способа создаётся новый курс.
+"""
+
+import secrets
+import threading
+import time
+from collections import Counter, namedtuple
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+
+from courses.models import Course, Group
+
+User = get_user_model()
+
+STRATEGIES = ('sequence', 'max')
+
+Result = namedtuple(
+    'Result', ('strategy', 'inserts', 'threads', 'rate', 'conflicts')
+)
+
+
+def _next_number(strategy, course_id):
+    if strategy == 'sequence':
+        # Номер назначит OrderField при сохранении.
+        return None
+    last = Group.objects.filter(course_id=course_id).order_by(
+        '-number'
+    ).values_list('number', flat=True).first()
+    return (last or 0) + 1
+
+
+def create_concurrently(strategy, course_id, threads, per_thread):
+    """
+    Вставки групп курса course_id в threads потоках. Возвращает Counter
+    ошибок по имени исключения и время выполнения, с.
+    """
+    errors = Counter()
+    lock = threading.Lock()
+    start = threading.Barrier(threads)
+
+    def worker():
+        start.wait()
+        try:
+            for _ in range(per_thread):
+                try:
+                    Group.objects.create(
+                        course_id=course_id, title='Группа',
+                        number=_next_number(strategy, course_id)
+                    )
+                except Exception as error:
+                    with lock:
+                        errors[type(error).__name__] += 1
+        finally:
+            connections.close_all()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return errors, time.perf_counter() - started
+
+
+def run_benchmark(threads=8, per_thread=20, strategies=STRATEGIES):
+    """
+    threads * per_thread вставок для каждого способа из strategies.
+    Возвращает список Result.
+    """
+    tag = secrets.token_hex(4)
+    author = User.objects.create_user(username=f'bench-{tag}-author',
+                                      email=f'bench-{tag}-author@test.com')
+    results = []
+    for strategy in strategies:
+        course = Course.objects.create(author=author, title=strategy,
+                                       price=10)
+        errors, elapsed = create_concurrently(strategy, course.pk, threads,
+                                              per_thread)
+        inserts = threads * per_thread
+        results.append(Result(
+            strategy=strategy,
+            inserts=inserts,
+            threads=threads,
+            rate=round(inserts / elapsed, 1),
+            conflicts=sum(errors.values()),
+        ))
+    return results
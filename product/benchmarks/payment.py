@@ -0,0 +1,133 @@
+"""
+Пропускная способность оплаты: make_payment из threads потоков, каждый
+со своим соединением, как у потоков WSGI. Покупатели и курсы создаются
+заново для каждого прогона, оплаты распределяются по курсам поровну.
+
+Профили SQLite (PROFILES) сравниваются на одной и той же базе:
+- default - настройки SQLite по умолчанию: журнал отката, synchronous=FULL
+  и обычный BEGIN, блокировка записи берётся только при первой записи;
+- tuned - профиль из settings: WAL, synchronous=NORMAL и BEGIN IMMEDIATE
+  (product.db.write_atomic).
+
+Потоки видят только закоммиченные данные, поэтому команда
+benchmark_payment работает на временной базе (throwaway_database), без
+внешней транзакции.
+"""
+
+import secrets
+import threading
+import time
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection, connections, transaction
+
+from api.v1.payment import make_payment
+from courses.models import Course
+
+User = get_user_model()
+
+PROFILES = ('default', 'tuned')
+# Настройки SQLite по умолчанию - для сравнения с профилем из settings.
+DEFAULT_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL',
+                   'busy_timeout': 5000}
+
+Result = namedtuple(
+    'Result', ('profile', 'purchases', 'threads', 'rate', 'outcomes')
+)
+
+
+def create_purchases(purchases, courses):
+    """
+    purchases пар (покупатель, курс) - новые пользователи и courses новых
+    курсов. Сигналы не отключаются: у покупателей есть баланс, у курсов -
+    группы.
+    """
+    tag = secrets.token_hex(4)
+    author = User.objects.create_user(username=f'bench-{tag}-author',
+                                      email=f'bench-{tag}-author@test.com')
+    course_objs = [
+        Course.objects.create(author=author, title=f'Курс {num}', price=10)
+        for num in range(courses)
+    ]
+    # Без пароля - хэширование только замедлило бы подготовку.
+    return [
+        (User.objects.create_user(username=f'bench-{tag}-{num}',
+                                  email=f'bench-{tag}-{num}@test.com'),
+         course_objs[num % courses])
+        for num in range(purchases)
+    ]
+
+
+def pay_concurrently(purchases, threads):
+    """
+    Оплаты (user, course) в threads потоках. Возвращает Counter исходов
+    ('paid' или имя исключения) и время выполнения, с.
+    """
+    outcomes = Counter()
+    lock = threading.Lock()
+    start = threading.Barrier(threads)
+
+    def worker(chunk):
+        start.wait()
+        try:
+            for user, course in chunk:
+                try:
+                    make_payment(user=user, course=course)
+                    outcome = 'paid'
+                except Exception as error:
+                    outcome = type(error).__name__
+                with lock:
+                    outcomes[outcome] += 1
+        finally:
+            connections.close_all()
+
+    workers = [threading.Thread(target=worker,
+                                args=(purchases[num::threads],))
+               for num in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return outcomes, time.perf_counter() - started
+
+
+@contextmanager
+def engine_profile(profile):
+    """Соединения, открытые внутри, используют профиль SQLite profile."""
+    if profile == 'tuned':
+        yield
+        return
+    # Настройки соединений потоков берутся из того же словаря. Режим
+    # журнала меняется только при единственном соединении.
+    connection.close()
+    with mock.patch.dict(connection.settings_dict, PRAGMAS=DEFAULT_PRAGMAS), \
+            mock.patch('api.v1.payment.write_atomic', transaction.atomic):
+        connection.ensure_connection()
+        try:
+            yield
+        finally:
+            connection.close()
+
+
+def run_benchmark(purchases=200, courses=20, threads=8, profiles=PROFILES):
+    """
+    Оплаты purchases покупателей courses курсов для каждого профиля из
+    profiles. Возвращает список Result.
+    """
+    results = []
+    for profile in profiles:
+        pairs = create_purchases(purchases, courses)
+        with engine_profile(profile):
+            outcomes, elapsed = pay_concurrently(pairs, threads)
+        results.append(Result(
+            profile=profile,
+            purchases=purchases,
+            threads=threads,
+            rate=round(purchases / elapsed, 1),
+            outcomes=dict(outcomes),
+        ))
+    return results
@@ -1,4 +1,6 @@
 from django.contrib import admin
+
+from .allocation import rebalance_groups
 from .models import Course, Lesson, Group
 
 
@@ -15,6 +17,14 @@ class CourseAdmin(admin.ModelAdmin):
     list_filter = ('is_available', 'start_date')
     ordering = ('-id',)
     filter_horizontal = ('students',)
+    actions = ('rebalance_groups',)
+
+    @admin.action(description='Выровнять группы выбранных курсов')
+    def rebalance_groups(self, request, queryset):
+        moves = rebalance_groups(list(queryset.values_list('pk', flat=True)))
+        self.message_user(
+            request, f'Перемещено студентов между группами: {len(moves)}.'
+        )
 
 
 @admin.register(Group)
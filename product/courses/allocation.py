@@ -0,0 +1,252 @@
+"""
+Распределение студентов курса по группам.
+
+Заполненность групп берётся из счётчика Group.member_count, а место в
+группе занимается условным UPDATE (member_count < MAX_STUDENTS_QUANTITY),
+поэтому группа не переполняется даже при параллельных покупках.
+"""
+
+import heapq
+from collections import namedtuple
+
+from django.db.models import Case, Count, F, Value, When
+
+from product.db import write_atomic
+from . import outbox
+from .cache import GROUPS, bump_versions
+from .counters import rebuild_member_counts
+from .models import Group
+
+# Сколько раз пробовать занять место, если выбранную группу успели
+# заполнить параллельные запросы.
+CLAIM_ATTEMPTS = 5
+
+# Сколько id передавать в одном IN (...) - ограничение SQLite на
+# количество параметров запроса.
+CHUNK_SIZE = 500
+
+# Перемещение студента между группами курса при перераспределении;
+# link_id - id удаляемой строки связи студента с прежней группой.
+Move = namedtuple(
+    'Move', ('course_id', 'user_id', 'from_group', 'to_group', 'link_id')
+)
+
+
+class GroupsAreFull(Exception):
+    """Во всех группах курса нет свободных мест."""
+
+
+def assign_to_group(course_id, user_id):
+    """
+    Добавление студента в наименее заполненную группу курса.
+    Выбор группы - один запрос по индексу (course, member_count, number),
+    занятие места - условный UPDATE, затем вставка строки связи и
+    события журнала (courses.outbox) - в одной транзакции.
+    Возвращает id группы.
+    """
+    with write_atomic():
+        for _ in range(CLAIM_ATTEMPTS):
+            group_id = Group.objects.filter(
+                course_id=course_id,
+                member_count__lt=Group.MAX_STUDENTS_QUANTITY
+            ).order_by('member_count', 'number').values_list(
+                'pk', flat=True
+            ).first()
+            if group_id is None:
+                raise GroupsAreFull()
+
+            claimed = Group.objects.filter(
+                pk=group_id, member_count__lt=Group.MAX_STUDENTS_QUANTITY
+            ).update(member_count=F('member_count') + 1)
+            if claimed:
+                # Напрямую, без m2m_changed: счётчик уже увеличен.
+                Group.students.through.objects.create(group_id=group_id,
+                                                      customuser_id=user_id)
+                outbox.record(outbox.GROUP_JOIN, user_id, course_id, group_id)
+                bump_versions((GROUPS,), [course_id])
+                return group_id
+
+    raise GroupsAreFull()
+
+
+def assign_to_groups(course_id, user_ids):
+    """
+    Пакетное распределение студентов по группам курса - для импорта и
+    перераспределения. Группы читаются одним запросом, распределение
+    считается в памяти (всегда в наименее заполненную группу), затем
+    пакетные вставки связей и событий журнала и один UPDATE счётчиков.
+    Студенты, уже состоящие в группе курса, пропускаются.
+    Возвращает словарь {user_id: group_id} и список студентов, которым
+    не хватило мест.
+    """
+    with write_atomic():
+        groups = list(
+            Group.objects.select_for_update().filter(
+                course_id=course_id
+            ).values_list('member_count', 'number', 'pk')
+        )
+        in_groups = set(
+            Group.students.through.objects.filter(
+                group__course_id=course_id, customuser_id__in=user_ids
+            ).values_list('customuser_id', flat=True)
+        )
+
+        heap = [group for group in groups
+                if group[0] < Group.MAX_STUDENTS_QUANTITY]
+        heapq.heapify(heap)
+        assigned = {}
+        unassigned = []
+        for user_id in dict.fromkeys(user_ids):
+            if user_id in in_groups:
+                continue
+            if not heap:
+                unassigned.append(user_id)
+                continue
+            count, number, group_id = heapq.heappop(heap)
+            assigned[user_id] = group_id
+            if count + 1 < Group.MAX_STUDENTS_QUANTITY:
+                heapq.heappush(heap, (count + 1, number, group_id))
+
+        if assigned:
+            Group.students.through.objects.bulk_create(
+                Group.students.through(group_id=group_id,
+                                       customuser_id=user_id)
+                for user_id, group_id in assigned.items()
+            )
+            outbox.record_many(
+                outbox.event(outbox.GROUP_JOIN, user_id, course_id, group_id)
+                for user_id, group_id in assigned.items()
+            )
+            added = {}
+            for group_id in assigned.values():
+                added[group_id] = added.get(group_id, 0) + 1
+            Group.objects.filter(pk__in=added).update(
+                member_count=F('member_count') + Case(
+                    *(When(pk=group_id, then=Value(count))
+                      for group_id, count in added.items())
+                )
+            )
+            bump_versions((GROUPS,), [course_id])
+
+    return assigned, unassigned
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def balanced_sizes(sizes, capacity=None):
+    """
+    Целевые размеры групп курса при равномерном распределении.
+    sizes - {group_id: количество студентов} в порядке номеров групп.
+    Размеры отличаются не больше чем на 1; лишние места получают самые
+    заполненные группы, поэтому перемещений нужно минимальное количество:
+    сумма превышений текущих размеров над целевыми.
+    Размер не превышает capacity (по умолчанию Group.MAX_STUDENTS_QUANTITY);
+    если студентов больше, чем мест во всех группах, не поместившиеся
+    остаются в самых переполненных группах.
+    """
+    capacity = capacity or Group.MAX_STUDENTS_QUANTITY
+    base, extra = divmod(sum(sizes.values()), len(sizes))
+    by_size = sorted(sizes, key=lambda pk: -sizes[pk])
+    larger = set(by_size[:extra])
+    targets = {pk: min(base + (pk in larger), capacity) for pk in sizes}
+
+    overflow = sum(sizes.values()) - sum(targets.values())
+    for pk in by_size:
+        if not overflow:
+            break
+        keep = min(max(sizes[pk] - targets[pk], 0), overflow)
+        targets[pk] += keep
+        overflow -= keep
+    return targets
+
+
+def plan_rebalance(course_ids=None):
+    """
+    План перераспределения студентов по группам курсов course_ids (по
+    умолчанию - всех курсов). Размеры групп считаются по связям, а не по
+    счётчикам. Из переполненных групп переводятся студенты, вступившие
+    последними. Возвращает список Move.
+    Запросы: один агрегирующий по группам и по одному на каждые
+    CHUNK_SIZE групп, из которых нужно кого-то перевести.
+    """
+    groups = Group.objects.order_by('course_id', 'number').annotate(
+        total=Count('students')
+    ).values_list('course_id', 'pk', 'total')
+    if course_ids is not None:
+        groups = groups.filter(course_id__in=course_ids)
+
+    sizes_by_course = {}
+    for course_id, group_id, total in groups:
+        sizes_by_course.setdefault(course_id, {})[group_id] = total
+
+    excess = {}      # group_id -> сколько студентов перевести
+    receivers = {}   # course_id -> [group_id, ...] по одному на место
+    for course_id, sizes in sizes_by_course.items():
+        for group_id, target in balanced_sizes(sizes).items():
+            if sizes[group_id] > target:
+                excess[group_id] = sizes[group_id] - target
+            elif sizes[group_id] < target:
+                receivers.setdefault(course_id, []).extend(
+                    [group_id] * (target - sizes[group_id])
+                )
+
+    moves = []
+    through = Group.students.through
+    for group_ids in _chunks(excess):
+        rows = through.objects.filter(group_id__in=group_ids).order_by(
+            'group_id', '-id'
+        ).values_list('pk', 'group_id', 'group__course_id', 'customuser_id')
+        for link_id, group_id, course_id, user_id in rows:
+            if not excess[group_id]:
+                continue
+            excess[group_id] -= 1
+            moves.append(Move(course_id, user_id, group_id,
+                              receivers[course_id].pop(), link_id))
+    return moves
+
+
+def apply_rebalance(moves):
+    """
+    Выполнение плана plan_rebalance: пакетное удаление и вставка связей
+    студентов с группами, вставка событий перевода (courses.outbox) и один
+    UPDATE счётчиков member_count на каждые CHUNK_SIZE курсов. Счётчики
+    групп затронутых курсов пересчитываются по связям, а не сдвигаются:
+    расхождение счётчика с данными после перераспределения не остаётся.
+    """
+    if not moves:
+        return
+    through = Group.students.through
+    course_ids = {move.course_id for move in moves}
+
+    with write_atomic():
+        for link_ids in _chunks(move.link_id for move in moves):
+            through.objects.filter(pk__in=link_ids).delete()
+        through.objects.bulk_create(
+            through(group_id=move.to_group, customuser_id=move.user_id)
+            for move in moves
+        )
+        outbox.record_many(
+            outbox.event(outbox.GROUP_MOVE, move.user_id, move.course_id,
+                         move.to_group, from_group=move.from_group)
+            for move in moves
+        )
+        for chunk in _chunks(course_ids):
+            rebuild_member_counts(Group.objects.filter(course_id__in=chunk))
+        bump_versions((GROUPS,), course_ids)
+
+
+def rebalance_groups(course_ids=None, dry_run=False):
+    """
+    Выравнивание размеров групп курсов course_ids (по умолчанию - всех):
+    план plan_rebalance и, если это не пробный запуск, его выполнение
+    в одной транзакции. Возвращает список Move.
+    """
+    with write_atomic():
+        moves = plan_rebalance(course_ids)
+        if not dry_run:
+            apply_rebalance(moves)
+    return moves
@@ -7,3 +7,4 @@ class CoursesConfig(AppConfig):
 
     def ready(self):
         import courses.signals
+        import courses.tasks
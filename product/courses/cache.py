@@ -0,0 +1,156 @@
+"""
+Версионированный кэш ответов каталога курсов.
+
+В ключ закэшированного ответа входит номер версии: общий для каталога
+(список курсов) или отдельный для курса (детальная информация). Сигналы
+в courses.signals увеличивают версии при изменении курсов, уроков и
+состава студентов, после чего старые ключи просто перестают читаться и
+вытесняются по TTL - удалять ничего не нужно.
+
+Те же версии используются для ETag ответов (api.v1.etag).
+
+Функции и методы с префиксом a - то же для асинхронных представлений
+(асинхронный API кэша).
+"""
+
+import hashlib
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# Области версий. catalogue - общая для списка курсов, остальные
+# ведутся отдельно для каждого курса: course - детальная информация,
+# lessons - список уроков, groups - состав групп.
+CATALOGUE = 'catalogue'
+COURSE = 'course'
+LESSONS = 'lessons'
+GROUPS = 'groups'
+
+
+def _version_key(scope, course_id=None):
+    if course_id is None:
+        return f'courses:{scope}:version'
+    return f'courses:{course_id}:{scope}:version'
+
+
+def _new_version():
+    # Не счётчик, а время: если ключ версии вытеснен из кэша, новая версия
+    # всё равно не совпадёт ни с одной из уже выданных.
+    return time.time_ns()
+
+
+def get_version(scope, course_id=None):
+    key = _version_key(scope, course_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_catalogue_version():
+    return get_version(CATALOGUE)
+
+
+def get_course_version(course_id):
+    return get_version(COURSE, course_id)
+
+
+async def aget_version(scope, course_id=None):
+    key = _version_key(scope, course_id)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, _new_version(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+async def aget_catalogue_version():
+    return await aget_version(CATALOGUE)
+
+
+async def aget_course_version(course_id):
+    return await aget_version(COURSE, course_id)
+
+
+def _bump_versions(scopes, course_ids):
+    keys = [_version_key(scope, pk) for scope in scopes for pk in course_ids]
+    if CATALOGUE in scopes:
+        keys.append(_version_key(CATALOGUE))
+    version = _new_version()
+    cache.set_many({key: version for key in keys}, timeout=None)
+
+
+def bump_versions(scopes, course_ids=()):
+    """
+    Увеличение версий переданных областей для курсов course_ids.
+    Версии меняются сразу и ещё раз после коммита: иначе ответ,
+    собранный параллельным запросом до коммита, мог бы сохраниться под
+    новой версией со старыми данными.
+    """
+    course_ids = list(course_ids)
+    _bump_versions(scopes, course_ids)
+    transaction.on_commit(lambda: _bump_versions(scopes, course_ids))
+
+
+def invalidate_courses(course_ids=()):
+    """Сброс списка курсов и детальной информации о курсах course_ids."""
+    bump_versions((CATALOGUE, COURSE), course_ids)
+
+
+class ResponseCache:
+    """
+    Кэш сериализованных ответов со счётчиками попаданий и промахов
+    по типам ответов ('list', 'detail').
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._hits = defaultdict(int)
+        self._misses = defaultdict(int)
+
+    def make_key(self, kind, version, request):
+        # Ссылки в ответах абсолютные, поэтому в ключ входит весь URL
+        # вместе с хостом и параметрами запроса.
+        url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        return f'{self.prefix}:{kind}:{version}:{url}'
+
+    def _count(self, kind, data):
+        with self._lock:
+            if data is None:
+                self._misses[kind] += 1
+            else:
+                self._hits[kind] += 1
+        return data
+
+    def get(self, kind, key):
+        return self._count(kind, cache.get(key))
+
+    def set(self, key, data):
+        cache.set(key, data, timeout=settings.COURSES_CACHE_TIMEOUT)
+
+    async def aget(self, kind, key):
+        return self._count(kind, await cache.aget(key))
+
+    async def aset(self, key, data):
+        await cache.aset(key, data, timeout=settings.COURSES_CACHE_TIMEOUT)
+
+    def stats(self):
+        with self._lock:
+            return {
+                kind: {'hits': self._hits[kind], 'misses': self._misses[kind]}
+                for kind in sorted(set(self._hits) | set(self._misses))
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._hits.clear()
+            self._misses.clear()
+
+
+catalogue_cache = ResponseCache('courses:response')
@@ -0,0 +1,121 @@
+"""
+Поддержка денормализованных счётчиков Course.students_count,
+Course.lessons_count и Group.member_count.
+
+Счётчики меняются только атомарными UPDATE ... SET x = x + n (F()) в той же
+транзакции, что и изменение связей, а rebuild_counters пересчитывает их
+заново по реальным данным.
+"""
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Course, Group, Lesson
+
+# Модель со счётчиком -> (m2m-поле, счётчик)
+MEMBER_COUNTERS = {
+    Course: ('students', 'students_count'),
+    Group: ('students', 'member_count'),
+}
+
+
+def _shift_counter(model, counter, pk_list, delta):
+    if not pk_list or not delta:
+        return
+    model.objects.filter(pk__in=pk_list).update(
+        **{counter: F(counter) + delta}
+    )
+
+
+def update_members_counter(model, instance, action, reverse, pk_set,
+                           removed=()):
+    """
+    Обработчик m2m_changed для связи model.students. Вызывается как с
+    прямой стороны (course.students.add(user)), так и с обратной
+    (user.joined_courses.add(course)). removed - пары (pk объекта model,
+    pk студента) связей, удалённых remove/clear: их читает
+    courses.signals до удаления.
+    Возвращает pk объектов model, чей счётчик изменился.
+    """
+    counter = MEMBER_COUNTERS[model][1]
+
+    if action == 'post_add':
+        # Django передаёт в post_add только действительно добавленные pk.
+        if reverse:
+            _shift_counter(model, counter, pk_set, 1)
+            return list(pk_set)
+        _shift_counter(model, counter, [instance.pk], len(pk_set))
+        setattr(instance, counter, getattr(instance, counter) + len(pk_set))
+        return [instance.pk] if pk_set else []
+
+    elif action in ('post_remove', 'post_clear'):
+        if reverse:
+            owner_ids = [owner_id for owner_id, _ in removed]
+            _shift_counter(model, counter, owner_ids, -1)
+            return owner_ids
+        if action == 'post_clear':
+            model.objects.filter(pk=instance.pk).update(**{counter: 0})
+            setattr(instance, counter, 0)
+            return [instance.pk]
+        _shift_counter(model, counter, [instance.pk], -len(removed))
+        setattr(instance, counter, getattr(instance, counter) - len(removed))
+        return [instance.pk] if removed else []
+
+    return []
+
+
+def forget_member(user):
+    """
+    Уменьшение счётчиков перед удалением пользователя: строки связей
+    удаляются каскадно, без m2m_changed.
+    Возвращает словарь: модель -> pk объектов, чей счётчик изменился.
+    """
+    changed = {}
+    for model, (field_name, counter) in MEMBER_COUNTERS.items():
+        changed[model] = list(model.objects.filter(
+            **{field_name: user}
+        ).values_list('pk', flat=True))
+        _shift_counter(model, counter, changed[model], -1)
+    return changed
+
+
+def update_lessons_counter(course_id, delta):
+    _shift_counter(Course, 'lessons_count', [course_id], delta)
+
+
+def _count_subquery(queryset, field):
+    queryset = queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+        field
+    ).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(queryset), 0)
+
+
+def rebuild_counters(course_ids=None):
+    """
+    Пересчёт всех счётчиков по реальным данным. Два UPDATE с
+    подзапросами, независимо от количества курсов.
+    Возвращает количество обновлённых курсов и групп.
+    """
+    courses = Course.objects.all()
+    groups = Group.objects.all()
+    if course_ids is not None:
+        courses = courses.filter(pk__in=course_ids)
+        groups = groups.filter(course_id__in=course_ids)
+
+    courses_updated = courses.update(
+        students_count=_count_subquery(Course.students.through.objects,
+                                       'course'),
+        lessons_count=_count_subquery(Lesson.objects, 'course'),
+    )
+    groups_updated = rebuild_member_counts(groups)
+    return courses_updated, groups_updated
+
+
+def rebuild_member_counts(groups):
+    """
+    Пересчёт Group.member_count групп queryset groups по связям - один
+    UPDATE с подзапросом. Возвращает количество обновлённых групп.
+    """
+    return groups.update(
+        member_count=_count_subquery(Group.students.through.objects, 'group'),
+    )
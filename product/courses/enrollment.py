@@ -0,0 +1,112 @@
+"""
+Пакетное зачисление студентов на курс администратором - без оплаты и
+без сигналов на каждого студента.
+
+В одной транзакции фиксированное число запросов независимо от размера
+пачки: поиск пользователей, проверка уже зачисленных, распределение по
+группам (courses.allocation.assign_to_groups - в памяти), bulk_create
+подписок и студентов курса, один UPDATE счётчика и один UPDATE
+доступности курса. События журнала (courses.outbox) вставляются
+пакетами по 166 строк - ограничение SQLite на количество параметров.
+"""
+
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.db.models import F
+
+from product.db import write_atomic
+from users.models import Subscription
+from . import entitlements, outbox
+from .allocation import assign_to_groups
+from .cache import invalidate_courses
+from .models import Course
+
+User = get_user_model()
+
+# enrolled - id зачисленных, already_enrolled - id уже бывших студентами
+# курса, no_seats - id тех, кому не хватило мест на курсе или в группах,
+# not_found - переданные id и email, для которых нет пользователей.
+EnrollmentResult = namedtuple(
+    'EnrollmentResult',
+    ('enrolled', 'already_enrolled', 'no_seats', 'not_found')
+)
+
+
+def resolve_users(user_ids=(), emails=()):
+    """
+    id пользователей по списку id и email (по одному запросу на каждый
+    список). Возвращает список id в порядке передачи без повторов и
+    список ненайденных значений.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    emails = list(dict.fromkeys(emails))
+    found = set(User.objects.filter(pk__in=user_ids).values_list(
+        'pk', flat=True
+    )) if user_ids else set()
+    by_email = dict(User.objects.filter(email__in=emails).values_list(
+        'email', 'pk'
+    )) if emails else {}
+
+    resolved = [pk for pk in user_ids if pk in found]
+    resolved += [by_email[email] for email in emails if email in by_email]
+    not_found = [pk for pk in user_ids if pk not in found]
+    not_found += [email for email in emails if email not in by_email]
+    return list(dict.fromkeys(resolved)), not_found
+
+
+def enroll_students(course_id, user_ids=(), emails=()):
+    """
+    Зачисление пользователей на курс. Студенты зачисляются в порядке
+    передачи, пока есть места на курсе (MAX_STUDENTS_QUANTITY) и в его
+    группах; каждый зачисленный получает подписку и место в наименее
+    заполненной группе. Возвращает EnrollmentResult.
+    """
+    candidates, not_found = resolve_users(user_ids, emails)
+
+    with write_atomic():
+        course = Course.objects.select_for_update().only(
+            'students_count'
+        ).get(pk=course_id)
+        students = set(Course.students.through.objects.filter(
+            course_id=course_id, customuser_id__in=candidates
+        ).values_list('customuser_id', flat=True))
+        already_enrolled = [pk for pk in candidates if pk in students]
+        candidates = [pk for pk in candidates if pk not in students]
+
+        seats = max(Course.MAX_STUDENTS_QUANTITY - course.students_count, 0)
+        no_seats = candidates[seats:]
+        assigned, no_group = assign_to_groups(course_id, candidates[:seats])
+        enrolled = [pk for pk in candidates[:seats] if pk in assigned]
+        no_seats = no_group + no_seats
+
+        if enrolled:
+            # Подписка могла остаться от прежнего зачисления.
+            Subscription.objects.bulk_create(
+                (Subscription(user_id=pk, course_id=course_id)
+                 for pk in enrolled),
+                ignore_conflicts=True
+            )
+            Course.students.through.objects.bulk_create(
+                Course.students.through(course_id=course_id,
+                                        customuser_id=pk)
+                for pk in enrolled
+            )
+            courses = Course.objects.filter(pk=course_id)
+            courses.update(
+                students_count=F('students_count') + len(enrolled)
+            )
+            courses.update_availability()
+            outbox.record_many(
+                outbox.event(outbox.ENROLL, pk, course_id, reason='admin')
+                for pk in enrolled
+            )
+            invalidate_courses([course_id])
+            entitlements.forget(enrolled)
+
+    return EnrollmentResult(
+        enrolled=enrolled,
+        already_enrolled=already_enrolled,
+        no_seats=no_seats,
+        not_found=not_found,
+    )
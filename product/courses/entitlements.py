@@ -0,0 +1,103 @@
+"""
+Права доступа студентов к курсам: множество id купленных курсов
+пользователя.
+
+Множество читается одним запросом и хранится в двух местах:
+- на объекте пользователя - на время запроса (request.user один на
+  запрос), повторные проверки в пределах запроса бесплатны;
+- в кэше Django с ограниченным временем жизни - между запросами.
+Сигналы в courses.signals сбрасывают кэш при изменении состава
+студентов курса. Если курса в закэшированном множестве нет, оно
+перечитывается из базы: только что купленный курс доступен сразу, даже
+если кэш другого процесса ещё не сброшен. Связи, удалённые в обход
+сигналов (queryset.delete() по промежуточной таблице), перестают
+действовать по истечении COURSES_ENTITLEMENTS_TIMEOUT.
+
+Функции с префиксом a - то же для асинхронных представлений
+(асинхронные ORM и кэш).
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Course
+
+_REQUEST_ATTR = '_entitled_course_ids'
+
+
+def _cache_key(user_id):
+    return f'courses:entitlements:{user_id}'
+
+
+def _course_ids_queryset(user):
+    return Course.students.through.objects.filter(
+        customuser_id=user.pk
+    ).values_list('course_id', flat=True)
+
+
+def _load(user):
+    course_ids = frozenset(_course_ids_queryset(user))
+    cache.set(_cache_key(user.pk), course_ids,
+              timeout=settings.COURSES_ENTITLEMENTS_TIMEOUT)
+    user.__dict__[_REQUEST_ATTR] = course_ids
+    return course_ids
+
+
+def get_course_ids(user):
+    """Множество id курсов, на которые зачислен пользователь."""
+    course_ids = user.__dict__.get(_REQUEST_ATTR)
+    if course_ids is None:
+        course_ids = cache.get(_cache_key(user.pk))
+        if course_ids is None:
+            return _load(user)
+        user.__dict__[_REQUEST_ATTR] = course_ids
+    return course_ids
+
+
+def is_entitled(user, course_id):
+    """
+    Зачислен ли пользователь на курс. Положительный ответ из кэша не
+    требует запросов, отрицательный перепроверяется одним запросом.
+    """
+    course_id = int(course_id)
+    if course_id in get_course_ids(user):
+        return True
+    return course_id in _load(user)
+
+
+async def _aload(user):
+    course_ids = frozenset([pk async for pk in _course_ids_queryset(user)])
+    await cache.aset(_cache_key(user.pk), course_ids,
+                     timeout=settings.COURSES_ENTITLEMENTS_TIMEOUT)
+    user.__dict__[_REQUEST_ATTR] = course_ids
+    return course_ids
+
+
+async def aget_course_ids(user):
+    course_ids = user.__dict__.get(_REQUEST_ATTR)
+    if course_ids is None:
+        course_ids = await cache.aget(_cache_key(user.pk))
+        if course_ids is None:
+            return await _aload(user)
+        user.__dict__[_REQUEST_ATTR] = course_ids
+    return course_ids
+
+
+async def ais_entitled(user, course_id):
+    course_id = int(course_id)
+    if course_id in await aget_course_ids(user):
+        return True
+    return course_id in await _aload(user)
+
+
+def forget(user_ids):
+    """
+    Сброс закэшированных прав пользователей user_ids - сразу и ещё раз
+    после коммита, как и версии кэша каталога (courses.cache).
+    """
+    keys = [_cache_key(pk) for pk in user_ids]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
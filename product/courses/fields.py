@@ -1,30 +1,164 @@
-from django.db.models import PositiveIntegerField
-from django.core.exceptions import ObjectDoesNotExist
+from django.apps import apps
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Max, PositiveIntegerField, When
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_init
 
 
 class OrderField(PositiveIntegerField):
     """
     Поле для автоматического определения порядка, отсчёт с 1. Порядок
     определяется относительно других полей модели.
+
+    Номера выдаются из счётчика OrderSequence отдельно для каждого
+    родителя (значений fields) атомарным UPDATE ... SET last_value =
+    last_value + n, поэтому параллельные вставки не получают одинаковых
+    номеров. Уникальность (родитель, номер) должна обеспечиваться
+    ограничением модели.
     """
     def __init__(self, fields=None, *args, **kwargs):
         self.fields = fields # поля, относительно которых формируется порядок
         super().__init__(*args, **kwargs)
 
+    def contribute_to_class(self, cls, name, *args, **kwargs):
+        super().contribute_to_class(cls, name, *args, **kwargs)
+        if not cls._meta.abstract:
+            post_init.connect(self.remember_value, sender=cls, weak=False)
+
+    def remember_value(self, instance, **kwargs):
+        """
+        Номер объекта при создании или загрузке из базы: при сохранении
+        счётчик сдвигается, только если номер новый или изменился.
+        """
+        instance.__dict__.setdefault('_saved_order', {})[self.attname] = (
+            instance.__dict__.get(self.attname)
+        )
+
     def pre_save(self, model_instance, add):
-        if getattr(model_instance, self.attname) is None:
+        value = getattr(model_instance, self.attname)
+        saved = model_instance.__dict__.setdefault('_saved_order', {})
+        if value is None:
             # Если не поле не передано, автоматически назначаем порядок
-            try:
-                queryset = self.model.objects.all()
-                if self.fields:
-                    condition = {field: getattr(model_instance, field) \
-                                 for field in self.fields}
-                    queryset = queryset.filter(**condition)
-                last_object = queryset.latest(self.attname)
-                value = getattr(last_object, self.attname) + 1
-            except ObjectDoesNotExist:
-                value = 1
+            value = self.reserve(self.parent_of(model_instance))
             setattr(model_instance, self.attname, value)
+            saved[self.attname] = value
             return value
-        else:
-            return super().pre_save(model_instance, add)
\ No newline at end of file
+        if (add or value != saved.get(self.attname)) and (
+                self.attname not in model_instance.__dict__.get(
+                    '_reserved_order', ())):
+            # Номер задан вручную - следующие автоматические номера
+            # должны быть больше него. Обычное сохранение существующей
+            # строки с прежним номером счётчик не трогает.
+            self.advance(self.parent_of(model_instance), value)
+        saved[self.attname] = value
+        return super().pre_save(model_instance, add)
+
+    @property
+    def sequence_name(self):
+        return f'{self.model._meta.label_lower}.{self.attname}'
+
+    def parent_of(self, model_instance):
+        return tuple(
+            getattr(model_instance, self.model._meta.get_field(field).attname)
+            for field in self.fields or ()
+        )
+
+    def _sequence(self, parent):
+        OrderSequence = apps.get_model('courses', 'OrderSequence')
+        scope = ':'.join(str(value) for value in parent)
+        return OrderSequence, {'name': self.sequence_name, 'scope': scope}
+
+    def _current_max(self, parent):
+        """Наибольший номер среди уже существующих строк родителя."""
+        attnames = [self.model._meta.get_field(field).attname
+                    for field in self.fields or ()]
+        return self.model._default_manager.filter(
+            **dict(zip(attnames, parent))
+        ).aggregate(last=Max(self.attname))['last'] or 0
+
+    def reserve(self, parent, count=1):
+        """
+        Резервирование count номеров подряд для родителя parent.
+        Возвращает первый из них. Обычно это UPDATE и SELECT одной строки
+        счётчика; при первом обращении к родителю счётчик создаётся от
+        наибольшего существующего номера.
+        """
+        OrderSequence, lookup = self._sequence(parent)
+        sequence = OrderSequence.objects.filter(**lookup)
+        increment = {'last_value': F('last_value') + count}
+        with transaction.atomic(savepoint=False):
+            if sequence.update(**increment):
+                last_value = sequence.values_list('last_value',
+                                                  flat=True).get()
+                return last_value - count + 1
+
+            last_value = self._current_max(parent) + count
+            try:
+                with transaction.atomic():
+                    OrderSequence.objects.create(last_value=last_value,
+                                                 **lookup)
+            except IntegrityError:
+                # Счётчик параллельно создал другой запрос.
+                sequence.update(**increment)
+                last_value = sequence.values_list('last_value',
+                                                  flat=True).get()
+        return last_value - count + 1
+
+    def advance(self, parent, value):
+        """Сдвиг счётчика родителя так, чтобы он был не меньше value."""
+        OrderSequence, lookup = self._sequence(parent)
+        OrderSequence.objects.filter(**lookup).update(
+            last_value=Greatest(F('last_value'), value)
+        )
+
+    def assign_bulk(self, instances):
+        """
+        Назначение порядка сразу пачке объектов без порядка, например
+        перед bulk_create. Номера резервируются в счётчике одним
+        диапазоном на каждого родителя, независимо от размера пачки и
+        количества уже существующих строк.
+        """
+        by_parent = {}
+        for obj in instances:
+            if getattr(obj, self.attname) is None:
+                by_parent.setdefault(self.parent_of(obj), []).append(obj)
+
+        for parent, objs in by_parent.items():
+            first = self.reserve(parent, len(objs))
+            for value, obj in enumerate(objs, start=first):
+                setattr(obj, self.attname, value)
+            # Чтобы pre_save при bulk_create не трогал счётчик ещё раз.
+            self.mark_reserved(objs)
+
+    def mark_reserved(self, instances):
+        """
+        Номера объектов уже согласованы со счётчиком - pre_save не будет
+        его сдвигать. Например, при массовой загрузке новых родителей,
+        у которых счётчика ещё нет: он будет создан от наибольшего номера
+        при первом резервировании.
+        """
+        for obj in instances:
+            obj.__dict__.setdefault('_reserved_order', set()).add(
+                self.attname
+            )
+
+    def reorder(self, queryset, pks, current_max):
+        """
+        Новый порядок всех объектов queryset (одного родителя): pks - их
+        первичные ключи в нужной последовательности, номера становятся
+        1..len(pks). current_max - наибольший из текущих номеров.
+
+        Два UPDATE вместо одного: ограничение уникальности проверяется
+        для каждой строки сразу, поэтому при прямой перестановке номер
+        мог бы совпасть с ещё не изменённым. Сначала все номера
+        сдвигаются выше current_max, затем новые выставляются одним CASE.
+        Счётчик родителя не меняется - он не меньше current_max.
+        """
+        if not pks:
+            return
+        with transaction.atomic(savepoint=False):
+            queryset.update(**{self.attname: F(self.attname) + current_max})
+            queryset.update(**{self.attname: Case(
+                *(When(pk=pk, then=number)
+                  for number, pk in enumerate(pks, start=1))
+            )})
@@ -0,0 +1,192 @@
+"""
+Очередь задач в базе (модель Job) - для работы, которую не нужно делать
+в запросе: например, распределение студента в группу после оплаты
+(courses.tasks).
+
+Задача ставится enqueue() в той же транзакции, что и изменение, ради
+которого она нужна: откатилась транзакция - нет и задачи. Выполняет
+задачи команда run_worker (work()).
+
+- At-least-once: взятая задача откладывается на JOBS_LEASE_SECONDS и
+  удаляется только после успешного выполнения, поэтому задачу упавшего
+  или зависшего воркера выполнит другой. Обработчики должны быть
+  идемпотентными.
+- Повторы: при ошибке задача откладывается на
+  JOBS_RETRY_SECONDS * 2 ** (попытка - 1) секунд; после
+  JOBS_MAX_ATTEMPTS попыток остаётся в таблице с failed=True.
+- Пакеты: воркер берёт до batch_size готовых задач одного вида и
+  передаёт обработчику список их данных одним вызовом. Ошибка
+  обработчика повторяет весь пакет; если не выполнена только часть
+  задач, обработчик сообщает о них исключением BatchFailed - тогда
+  повторяются (или получают failed=True) только они, остальные задачи
+  пакета удаляются как выполненные.
+
+Задачи берутся в write_atomic (BEGIN IMMEDIATE на SQLite), поэтому
+несколько воркеров не возьмут одну и ту же задачу; на других базах -
+select_for_update(skip_locked=True).
+"""
+
+import logging
+import time
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+
+from product.db import write_atomic
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+Handler = namedtuple('Handler', ('function', 'batch_size'))
+
+# Выполненный пакет: вид задач, их количество и ошибка обработчика.
+BatchResult = namedtuple('BatchResult', ('kind', 'jobs', 'error'))
+
+_handlers = {}
+
+
+class BatchFailed(Exception):
+    """
+    Не выполнена часть пакета: failed - номера (позиции) данных задач в
+    списке, переданном обработчику, error - причина.
+    """
+
+    def __init__(self, failed, error):
+        super().__init__(str(error))
+        self.failed = list(failed)
+        self.error = error
+
+
+def handler(kind, batch_size=None):
+    """
+    Регистрация обработчика задач вида kind - функции, которая принимает
+    список данных (payload) задач пакета. batch_size - размер пакета, по
+    умолчанию JOBS_BATCH_SIZE.
+    """
+    def register(function):
+        _handlers[kind] = Handler(function, batch_size)
+        return function
+    return register
+
+
+def enqueue(kind, payload=None, delay=0):
+    """Постановка задачи; delay - через сколько секунд её можно взять."""
+    if kind not in _handlers:
+        raise ValueError(f'Нет обработчика задач {kind!r}.')
+    return Job.objects.create(
+        kind=kind, payload=payload or {},
+        run_at=timezone.now() + timedelta(seconds=delay)
+    )
+
+
+def _due(now):
+    return Job.objects.filter(failed=False, run_at__lte=now)
+
+
+def _batch_size(kind):
+    handler = _handlers.get(kind)
+    return (handler and handler.batch_size) or settings.JOBS_BATCH_SIZE
+
+
+def claim(now=None):
+    """
+    Взятие пакета готовых задач одного вида - того, чья задача ждёт
+    дольше всех. Задачи откладываются на время аренды, счётчик попыток
+    увеличивается. Возвращает список Job, пустой - если готовых задач нет.
+    """
+    now = now or timezone.now()
+    with write_atomic():
+        kind = _due(now).values_list('kind', flat=True).first()
+        if kind is None:
+            return []
+        jobs = list(
+            _due(now).filter(kind=kind).select_for_update(
+                skip_locked=True
+            )[:_batch_size(kind)]
+        )
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            run_at=now + timedelta(seconds=settings.JOBS_LEASE_SECONDS),
+            attempts=F('attempts') + 1,
+        )
+    for job in jobs:
+        job.attempts += 1
+    return jobs
+
+
+def _retry(jobs, error):
+    """Повтор задач с экспоненциальной задержкой или отказ от них."""
+    now = timezone.now()
+    message = f'{type(error).__name__}: {error}'
+    by_attempts = defaultdict(list)
+    for job in jobs:
+        by_attempts[job.attempts].append(job.pk)
+    for attempts, pks in by_attempts.items():
+        if attempts >= settings.JOBS_MAX_ATTEMPTS:
+            Job.objects.filter(pk__in=pks).update(failed=True,
+                                                  last_error=message)
+            continue
+        delay = settings.JOBS_RETRY_SECONDS * 2 ** (attempts - 1)
+        Job.objects.filter(pk__in=pks).update(
+            run_at=now + timedelta(seconds=delay), last_error=message
+        )
+
+
+def run_batch(now=None):
+    """
+    Выполнение одного пакета задач. Возвращает BatchResult или None, если
+    готовых задач нет.
+    """
+    jobs = claim(now)
+    if not jobs:
+        return None
+    kind = jobs[0].kind
+    failed, error = [], None
+    try:
+        _handlers[kind].function([job.payload for job in jobs])
+    except BatchFailed as partial:
+        failed = [jobs[index] for index in partial.failed]
+        error = partial.error
+        logger.error('Пакет задач %s: не выполнено %d из %d: %s', kind,
+                     len(failed), len(jobs), error)
+    except Exception as exc:
+        failed, error = jobs, exc
+        logger.exception('Пакет задач %s (%d) не выполнен.', kind, len(jobs))
+
+    if failed:
+        _retry(failed, error)
+    failed_pks = {job.pk for job in failed}
+    done = [job.pk for job in jobs if job.pk not in failed_pks]
+    if done:
+        Job.objects.filter(pk__in=done).delete()
+    return BatchResult(kind, len(jobs), error)
+
+
+def work(burst=False, poll_interval=None, max_batches=None, callback=None):
+    """
+    Цикл воркера: пакеты выполняются, пока есть готовые задачи, затем
+    ожидание poll_interval секунд (по умолчанию JOBS_POLL_SECONDS).
+    burst - выйти, когда готовых задач не осталось. callback вызывается
+    с BatchResult каждого пакета. Возвращает количество пакетов.
+    """
+    if poll_interval is None:
+        poll_interval = settings.JOBS_POLL_SECONDS
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        # Воркер работает долго - соединения обновляются, как между
+        # запросами (CONN_MAX_AGE). Внутри транзакции (тесты) - нельзя.
+        if not connection.in_atomic_block:
+            close_old_connections()
+        result = run_batch()
+        if result is None:
+            if burst:
+                break
+            time.sleep(poll_interval)
+            continue
+        batches += 1
+        if callback is not None:
+            callback(result)
+    return batches
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.enrollment import enroll_students
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = (
+        'Пакетное зачисление студентов на курс без оплаты. Пользователи '
+        'задаются id или email - в аргументах или в файле, по одному в '
+        'строке.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id', type=int)
+        parser.add_argument(
+            'users', nargs='*',
+            help='id или email пользователей.'
+        )
+        parser.add_argument(
+            '--file', dest='path',
+            help='Файл со списком id или email, по одному в строке.'
+        )
+
+    def handle(self, *args, course_id, users, path=None, **options):
+        values = list(users)
+        if path:
+            with open(path, encoding='utf-8') as file:
+                values += [line.strip() for line in file if line.strip()]
+        if not values:
+            raise CommandError('Не переданы пользователи.')
+
+        user_ids = [int(value) for value in values if value.isdigit()]
+        emails = [value for value in values if not value.isdigit()]
+
+        started = time.perf_counter()
+        try:
+            result = enroll_students(course_id, user_ids, emails)
+        except Course.DoesNotExist:
+            raise CommandError(f'Курс {course_id} не найден.')
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Зачислено: {len(result.enrolled)} за {elapsed:.2f} с '
+            f'({len(values) / elapsed:.0f} пользователей/с).'
+        ))
+        if result.already_enrolled:
+            self.stdout.write(
+                f'Уже на курсе: {len(result.already_enrolled)}.'
+            )
+        if result.no_seats:
+            self.stdout.write(self.style.WARNING(
+                f'Не хватило мест: {len(result.no_seats)}.'
+            ))
+        if result.not_found:
+            self.stdout.write(self.style.WARNING(
+                'Не найдены: '
+                + ', '.join(str(value) for value in result.not_found)
+            ))
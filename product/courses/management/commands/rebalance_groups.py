@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from courses.allocation import rebalance_groups
+
+
+class Command(BaseCommand):
+    help = (
+        'Равномерное перераспределение студентов по группам курсов '
+        'с минимальным количеством перемещений.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course', type=int, nargs='+', dest='course_ids',
+            help='id курсов, группы которых выровнять '
+                 '(по умолчанию - все).'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать план, ничего не меняя.'
+        )
+
+    def handle(self, *args, course_ids=None, dry_run=False, **options):
+        started = time.perf_counter()
+        moves = rebalance_groups(course_ids, dry_run=dry_run)
+        elapsed = time.perf_counter() - started
+
+        if options['verbosity'] > 1:
+            for move in moves:
+                self.stdout.write(
+                    f'Курс {move.course_id}: студент {move.user_id}, '
+                    f'группа {move.from_group} -> {move.to_group}'
+                )
+        courses = len({move.course_id for move in moves})
+        verb = 'Будет перемещено' if dry_run else 'Перемещено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} студентов: {len(moves)}, курсов: {courses} '
+            f'({elapsed:.2f} с).'
+        ))
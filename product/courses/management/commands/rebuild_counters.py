@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчёт денормализованных счётчиков курсов и групп '
+        '(students_count, lessons_count, member_count).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course', type=int, nargs='+', dest='course_ids',
+            help='id курсов, для которых пересчитать счётчики '
+                 '(по умолчанию - все).'
+        )
+
+    def handle(self, *args, course_ids=None, **options):
+        with transaction.atomic():
+            courses, groups = rebuild_counters(course_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитаны счётчики: курсов - {courses}, групп - {groups}.'
+        ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from courses.jobs import work
+
+
+class Command(BaseCommand):
+    help = (
+        'Воркер очереди задач (courses.jobs): выполняет задачи пакетами '
+        'по видам, с повторами при ошибках.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Выйти, когда готовых задач не останется.'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float,
+            help='Пауза, когда готовых задач нет, сек '
+                 '(по умолчанию JOBS_POLL_SECONDS).'
+        )
+        parser.add_argument(
+            '--max-batches', type=int,
+            help='Выйти после стольких пакетов.'
+        )
+
+    def handle(self, *args, burst, poll_interval=None, max_batches=None,
+               **options):
+        batches = work(burst=burst, poll_interval=poll_interval,
+                       max_batches=max_batches, callback=self.report)
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено пакетов: {batches}.'
+        ))
+
+    def report(self, result):
+        if result.error is None:
+            self.stdout.write(f'{result.kind}: {result.jobs}')
+        else:
+            self.stderr.write(
+                f'{result.kind}: {result.jobs} - ошибка {result.error!r}'
+            )
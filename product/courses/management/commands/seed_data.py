@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.seeding import CHUNK_SIZE, seed_data
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерация синтетических данных для нагрузочного тестирования: '
+        'пользователи, балансы, курсы, уроки, группы, подписки и состав '
+        'курсов и групп. При одном и том же --seed на пустой базе '
+        'создаётся один и тот же набор данных.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--courses', type=int, default=1000)
+        parser.add_argument(
+            '--lessons', type=int, default=5,
+            help='Количество уроков в каждом курсе.'
+        )
+        parser.add_argument(
+            '--enrollments', type=int, default=3,
+            help='Среднее количество курсов у одного студента.'
+        )
+        parser.add_argument(
+            '--authors', type=int,
+            help='Количество администраторов - авторов курсов '
+                 '(по умолчанию - один на 20 курсов).'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--password', default='password',
+            help='Пароль всех созданных пользователей.'
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, users, courses, lessons, enrollments, authors,
+               seed, password, chunk_size, **options):
+        if min(users, courses, lessons, enrollments, chunk_size - 1) < 0:
+            raise CommandError('Параметры не могут быть отрицательными, '
+                               '--chunk-size - меньше 1.')
+
+        started = time.perf_counter()
+        try:
+            result = seed_data(users, courses, lessons, enrollments,
+                               authors, seed, password, chunk_size)
+        except ValueError as error:
+            raise CommandError(error)
+        elapsed = time.perf_counter() - started
+
+        for table, count in result._asdict().items():
+            self.stdout.write(f'{table}: {count}')
+        total = sum(result)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано строк: {total} за {elapsed:.2f} с '
+            f'({total / elapsed:.0f} строк/с).'
+        ))
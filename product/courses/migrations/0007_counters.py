@@ -0,0 +1,56 @@
+# Generated by Django 4.2.10 on 2026-10-18 04:52
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count_subquery(queryset, field):
+    queryset = queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+        field
+    ).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(queryset), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Group = apps.get_model('courses', 'Group')
+    Lesson = apps.get_model('courses', 'Lesson')
+    Course._default_manager.update(
+        students_count=_count_subquery(Course.students.through.objects,
+                                       'course'),
+        lessons_count=_count_subquery(Lesson.objects, 'course'),
+    )
+    Group.objects.update(
+        member_count=_count_subquery(Group.students.through.objects, 'group'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_alter_course_managers_course_is_available'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='group',
+            options={'ordering': ('number',), 'verbose_name': 'Группа', 'verbose_name_plural': 'Группы'},
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='lessons_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='students_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-18 05:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['course', 'member_count', 'number'], name='group_course_fill_idx'),
+        ),
+    ]
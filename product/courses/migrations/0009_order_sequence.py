@@ -0,0 +1,64 @@
+# Generated by Django 4.2.10 on 2026-10-18 05:05
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def renumber_duplicate_groups(apps, schema_editor):
+    """Перенумерация групп курсов, в которых номера повторяются."""
+    Group = apps.get_model('courses', 'Group')
+    course_ids = Group.objects.values('course', 'number').annotate(
+        total=Count('id')
+    ).filter(total__gt=1).values_list('course', flat=True).distinct()
+    for course_id in course_ids:
+        groups = list(Group.objects.filter(course_id=course_id).order_by(
+            'number', 'id'
+        ))
+        for number, group in enumerate(groups, start=1):
+            group.number = number
+        Group.objects.bulk_update(groups, ['number'])
+
+
+def create_sequences(apps, schema_editor):
+    Group = apps.get_model('courses', 'Group')
+    OrderSequence = apps.get_model('courses', 'OrderSequence')
+    rows = Group.objects.values('course').annotate(last=Max('number'))
+    OrderSequence.objects.bulk_create(
+        OrderSequence(name='courses.group.number', scope=str(row['course']),
+                      last_value=row['last'])
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_group_fill_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('scope', models.CharField(max_length=100)),
+                ('last_value', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Счётчик порядка',
+                'verbose_name_plural': 'Счётчики порядка',
+            },
+        ),
+        migrations.RunPython(renumber_duplicate_groups,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='group',
+            constraint=models.UniqueConstraint(fields=('course', 'number'), name='unique_group_number_in_course'),
+        ),
+        migrations.AddConstraint(
+            model_name='ordersequence',
+            constraint=models.UniqueConstraint(fields=('name', 'scope'), name='unique_order_sequence'),
+        ),
+        migrations.RunPython(create_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.10 on 2026-10-18 07:40
+
+import courses.fields
+from django.db import migrations, models
+
+
+def number_lessons(apps, schema_editor):
+    """Нумерация существующих уроков каждого курса по порядку создания."""
+    Lesson = apps.get_model('courses', 'Lesson')
+    OrderSequence = apps.get_model('courses', 'OrderSequence')
+    lessons = list(Lesson.objects.order_by('course', 'id'))
+    last = {}
+    for lesson in lessons:
+        lesson.number = last[lesson.course_id] = (
+            last.get(lesson.course_id, 0) + 1
+        )
+    Lesson.objects.bulk_update(lessons, ['number'], batch_size=500)
+    OrderSequence.objects.bulk_create(
+        OrderSequence(name='courses.lesson.number', scope=str(course_id),
+                      last_value=last_value)
+        for course_id, last_value in last.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_order_sequence'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='lesson',
+            options={'ordering': ('number',), 'verbose_name': 'Урок', 'verbose_name_plural': 'Уроки'},
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='number',
+            field=courses.fields.OrderField(blank=True, default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(number_lessons, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='lesson',
+            constraint=models.UniqueConstraint(fields=('course', 'number'), name='unique_lesson_number_in_course'),
+        ),
+    ]
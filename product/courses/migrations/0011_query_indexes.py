@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-18 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_lesson_number'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['-id'], name='course_available_idx'),
+        ),
+    ]
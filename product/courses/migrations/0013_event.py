@@ -0,0 +1,30 @@
+# Generated by Django 4.2.10 on 2026-10-18 05:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Event',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('purchase', 'Покупка курса'), ('enroll', 'Зачисление на курс'), ('unenroll', 'Отчисление с курса'), ('group_join', 'Добавление в группу'), ('group_leave', 'Удаление из группы'), ('group_move', 'Перевод в другую группу'), ('balance', 'Изменение баланса')], max_length=20)),
+                ('user_id', models.PositiveBigIntegerField()),
+                ('course_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('group_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Событие',
+                'verbose_name_plural': 'События',
+                'ordering': ('id',),
+            },
+        ),
+    ]
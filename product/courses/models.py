@@ -1,19 +1,92 @@
 from django.db import models
+from django.db.models import (BooleanField, ExpressionWrapper, F, FloatField,
+                              Q, Value)
+from django.utils import timezone
 from .fields import OrderField
 
 from users.user_model import CustomUser as User
 
 
-class CourseManager(models.Manager):
+class CounterFieldsMixin:
+    """
+    Счётчики (COUNTER_FIELDS) меняются только атомарными F() в
+    courses.counters, поэтому обычный save() существующего объекта их
+    не перезаписывает - иначе значение, прочитанное до конкурентного
+    изменения, затёрло бы его.
+    """
+
+    COUNTER_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+                and field.attname not in deferred
+            ]
+        return super().save(*args, **kwargs)
+
+
+class CourseQuerySet(models.QuerySet):
+
+    def with_statistics(self, clients_count=None):
+        """
+        Добавляет к каждому курсу проценты заполнения групп и
+        приобретаемости курса, считая их по счётчику students_count.
+        clients_count - количество клиентов (is_staff=False), считается
+        один раз на запрос; если не передано, процент приобретаемости
+        не аннотируется.
+        """
+        queryset = self.annotate(
+            groups_filled_percent=ExpressionWrapper(
+                F('students_count') * 100.0 / Group.MAX_STUDENTS_QUANTITY,
+                output_field=FloatField()
+            )
+        )
+        if clients_count is None:
+            return queryset
+        if clients_count:
+            demand = ExpressionWrapper(
+                F('students_count') * 100.0 / clients_count,
+                output_field=FloatField()
+            )
+        else:
+            demand = Value(0)
+        return queryset.annotate(demand_course_percent=demand)
+
+    def update_availability(self):
+        """
+        Приведение is_available в соответствие со счётчиком
+        students_count одним UPDATE: курс доступен, пока
+        students_count < MAX_STUDENTS_QUANTITY. Затрагиваются только
+        курсы, у которых доступность действительно меняется, поэтому
+        пакетное добавление, перешагнувшее порог, обрабатывается так же,
+        как и попадание ровно в него.
+        Возвращает количество изменённых курсов.
+        """
+        has_seats = Q(students_count__lt=Course.MAX_STUDENTS_QUANTITY)
+        return self.filter(
+            Q(has_seats, is_available=False) | Q(~has_seats, is_available=True)
+        ).update(is_available=ExpressionWrapper(
+            has_seats, output_field=BooleanField()
+        ))
+
+
+class CourseManager(models.Manager.from_queryset(CourseQuerySet)):
     def get_queryset(self):
         return super().get_queryset().filter(is_available=True)
 
 
-class Course(models.Model):
+class Course(CounterFieldsMixin, models.Model):
     """Модель продукта - курса."""
 
     MAX_STUDENTS_QUANTITY = 300 # Максимальное кол-во студентов на курсе
 
+    COUNTER_FIELDS = ('students_count', 'lessons_count')
+
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -47,13 +120,24 @@ class Course(models.Model):
         verbose_name='Дата и время начала курса'
     )
 
+    # Денормализованные счётчики, чтобы не делать COUNT по students и
+    # lessons при каждом чтении. Поддерживаются сигналами в
+    # courses.signals, пересчитываются командой rebuild_counters.
+    students_count = models.PositiveIntegerField(default=0, editable=False)
+    lessons_count = models.PositiveIntegerField(default=0, editable=False)
+
     available = CourseManager()
-    objects = models.Manager()
+    objects = CourseQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Курс'
         verbose_name_plural = 'Курсы'
         ordering = ('-id',)
+        indexes = [
+            # Список доступных курсов (CourseManager) в порядке -id.
+            models.Index(fields=('-id',), condition=Q(is_available=True),
+                         name='course_available_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -75,20 +159,29 @@ class Lesson(models.Model):
         verbose_name='Ссылка',
     )
 
+    # Порядок урока в курсе, меняется действием reorder.
+    number = OrderField(blank=True, fields=['course'])
+
     class Meta:
         verbose_name = 'Урок'
         verbose_name_plural = 'Уроки'
-        ordering = ('id',)
+        ordering = ('number',)
+        constraints = [
+            models.UniqueConstraint(fields=('course', 'number'),
+                                    name='unique_lesson_number_in_course'),
+        ]
 
     def __str__(self):
         return self.title
 
 
-class Group(models.Model):
+class Group(CounterFieldsMixin, models.Model):
     """Модель группы."""
 
     MAX_STUDENTS_QUANTITY = 30 # Максимальное количество студентов в группе
 
+    COUNTER_FIELDS = ('member_count',)
+
     # "Группа А", "Группа Б" ...
     title = models.CharField(max_length=150)
 
@@ -101,6 +194,9 @@ class Group(models.Model):
     students = models.ManyToManyField(User,
                                       related_name='joined_groups',
                                       blank=True)
+    # Количество студентов в группе, поддерживается так же, как
+    # счётчики курса.
+    member_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         verbose_name = 'Группа'
@@ -110,3 +206,107 @@ class Group(models.Model):
         # в курсе - фронтендер должен будет сообщить лишь новую
         # последовательность для всех уроков курса.
         ordering = ('number',)
+        indexes = [
+            # Выбор наименее заполненной группы курса (courses.allocation).
+            models.Index(fields=('course', 'member_count', 'number'),
+                         name='group_course_fill_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=('course', 'number'),
+                                    name='unique_group_number_in_course'),
+        ]
+
+
+class OrderSequence(models.Model):
+    """
+    Последний выданный OrderField номер для одного родителя: name -
+    поле ('courses.group.number'), scope - значения полей, относительно
+    которых считается порядок ('15' - id курса).
+    """
+
+    name = models.CharField(max_length=100)
+    scope = models.CharField(max_length=100)
+    last_value = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Счётчик порядка'
+        verbose_name_plural = 'Счётчики порядка'
+        constraints = [
+            models.UniqueConstraint(fields=('name', 'scope'),
+                                    name='unique_order_sequence'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} [{self.scope}] = {self.last_value}'
+
+
+class Job(models.Model):
+    """
+    Задача очереди courses.jobs: вид (обработчик) и данные для него.
+    run_at - время, с которого задачу можно взять; взятая задача
+    откладывается на время аренды, поэтому задачу упавшего воркера
+    возьмёт другой. Задачи, исчерпавшие попытки, остаются в таблице с
+    failed=True и текстом последней ошибки.
+    """
+
+    kind = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    failed = models.BooleanField(default=False)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        ordering = ('run_at', 'id')
+        indexes = [
+            # Выбор готовых к выполнению задач (courses.jobs.claim).
+            models.Index(fields=('run_at', 'kind'),
+                         condition=Q(failed=False), name='job_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk}'
+
+
+class Event(models.Model):
+    """
+    Событие журнала courses.outbox: покупка, зачисление, изменение
+    состава группы или баланса. Пользователь, курс и группа хранятся
+    числами, а не внешними ключами: события остаются и после удаления
+    объектов.
+    """
+
+    PURCHASE = 'purchase'
+    ENROLL = 'enroll'
+    UNENROLL = 'unenroll'
+    GROUP_JOIN = 'group_join'
+    GROUP_LEAVE = 'group_leave'
+    GROUP_MOVE = 'group_move'
+    BALANCE = 'balance'
+    KINDS = (
+        (PURCHASE, 'Покупка курса'),
+        (ENROLL, 'Зачисление на курс'),
+        (UNENROLL, 'Отчисление с курса'),
+        (GROUP_JOIN, 'Добавление в группу'),
+        (GROUP_LEAVE, 'Удаление из группы'),
+        (GROUP_MOVE, 'Перевод в другую группу'),
+        (BALANCE, 'Изменение баланса'),
+    )
+
+    kind = models.CharField(max_length=20, choices=KINDS)
+    user_id = models.PositiveBigIntegerField()
+    course_id = models.PositiveBigIntegerField(null=True, blank=True)
+    group_id = models.PositiveBigIntegerField(null=True, blank=True)
+    data = models.JSONField(default=dict, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Событие'
+        verbose_name_plural = 'События'
+        ordering = ('id',)
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk}'
@@ -0,0 +1,129 @@
+"""
+Журнал событий (transactional outbox) для аналитики: покупки,
+зачисления и отчисления, изменения состава групп и баланса.
+
+Событие (модель Event) записывается в той же транзакции, что и само
+изменение: откатилось изменение - нет и события, зафиксировалось -
+событие уже в таблице. Потребители читают события по возрастанию id
+после последнего прочитанного (read(), stream(), GET api/v1/events/).
+
+Порядок id совпадает с порядком фиксации: SQLite допускает одну
+пишущую транзакцию за раз, и id события выдаётся, когда транзакция
+уже держит блокировку записи; первичный ключ - AUTOINCREMENT, id
+удалённых событий не выдаются повторно. На базах с параллельной
+записью (PostgreSQL) транзакция с меньшим id может зафиксироваться
+позже, и потребитель, ушедший вперёд, её пропустит - там нужна
+блокировка журнала при записи или чтение с отставанием.
+
+Где пишутся события:
+- make_payment (api.v1.payment) - покупка, зачисление и списание;
+- enroll_students - зачисление администратором;
+- assign_to_group, assign_to_groups, apply_rebalance
+  (courses.allocation) - добавление в группу и перевод;
+- m2m_changed связей студентов курса и групп (courses.signals) -
+  изменения через add/remove/clear, в том числе из админки;
+- создание баланса пользователя и изменение его администратором.
+Массовое наполнение (seed_data) и каскадное удаление пользователей
+событий не пишут.
+"""
+
+from django.conf import settings
+
+from .models import Course, Event, Group
+
+PURCHASE = Event.PURCHASE
+ENROLL = Event.ENROLL
+UNENROLL = Event.UNENROLL
+GROUP_JOIN = Event.GROUP_JOIN
+GROUP_LEAVE = Event.GROUP_LEAVE
+GROUP_MOVE = Event.GROUP_MOVE
+BALANCE = Event.BALANCE
+
+# Модель со студентами -> (событие добавления, событие удаления)
+MEMBERSHIP_EVENTS = {
+    Course: (ENROLL, UNENROLL),
+    Group: (GROUP_JOIN, GROUP_LEAVE),
+}
+
+
+def event(kind, user_id, course_id=None, group_id=None, **data):
+    """Несохранённое событие для record_many."""
+    return Event(kind=kind, user_id=user_id, course_id=course_id,
+                 group_id=group_id, data=data)
+
+
+def record(kind, user_id, course_id=None, group_id=None, **data):
+    """Запись одного события; остальные именованные аргументы - data."""
+    return record_many([event(kind, user_id, course_id, group_id, **data)])[0]
+
+
+def record_many(events):
+    """
+    Запись событий пакетными INSERT в порядке передачи. Вызывается внутри
+    транзакции изменения. Размер пакета выбирает Django по ограничению
+    базы на количество параметров запроса: на SQLite 999 // 6 столбцов =
+    166 событий.
+    """
+    return Event.objects.bulk_create(events)
+
+
+def read(after=0, limit=None):
+    """
+    События с id больше after по возрастанию id, не больше limit (по
+    умолчанию OUTBOX_BATCH_SIZE). Один запрос по первичному ключу.
+    """
+    limit = limit or settings.OUTBOX_BATCH_SIZE
+    return list(Event.objects.filter(pk__gt=after).order_by('pk')[:limit])
+
+
+def stream(after=0, batch_size=None):
+    """
+    Все события после after пакетами по batch_size: генератор списков
+    событий, каждый пакет - отдельный запрос от последнего id
+    предыдущего. Останавливается, когда новых событий нет.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    while True:
+        events = read(after, batch_size)
+        if events:
+            yield events
+            after = events[-1].pk
+        if len(events) < batch_size:
+            return
+
+
+def _group_courses(group_ids):
+    return dict(Group.objects.filter(pk__in=group_ids).values_list(
+        'pk', 'course_id'
+    ))
+
+
+def record_membership(model, instance, action, reverse, pk_set, removed=()):
+    """
+    Обработчик m2m_changed для связи model.students: события
+    добавления и удаления студентов курса или группы с прямой
+    (course.students.add(user)) и обратной (user.joined_courses.add(course))
+    стороны. removed - пары (pk объекта model, pk студента) связей,
+    удалённых remove/clear: их читает courses.signals до удаления.
+    """
+    if action == 'post_add':
+        pairs = [(pk, instance.pk) if reverse else (instance.pk, pk)
+                 for pk in pk_set]
+        kind = MEMBERSHIP_EVENTS[model][0]
+    elif action in ('post_remove', 'post_clear'):
+        pairs = removed
+        kind = MEMBERSHIP_EVENTS[model][1]
+    else:
+        return
+    if not pairs:
+        return
+
+    if model is Course:
+        events = [event(kind, user_id, owner_id)
+                  for owner_id, user_id in sorted(pairs)]
+    else:
+        courses = ({instance.pk: instance.course_id} if not reverse
+                   else _group_courses({owner_id for owner_id, _ in pairs}))
+        events = [event(kind, user_id, courses[owner_id], owner_id)
+                  for owner_id, user_id in sorted(pairs)]
+    record_many(events)
@@ -0,0 +1,228 @@
+"""
+Генерация синтетических данных для нагрузочного тестирования: пользователи
+с балансами, курсы с уроками и группами, подписки и состав курсов и групп.
+
+Данные детерминированы: при одном и том же seed на пустой базе получается
+один и тот же набор (кроме дат подписок и начала курсов). Всё создаётся в
+одной транзакции с отключёнными сигналами - обработчики из
+courses.signals и users.signals не вызываются, счётчики, доступность
+курсов и номера групп и уроков заполняются сразу. Пароль хэшируется
+один раз на всех пользователей.
+
+Строки вставляются через executemany кортежами значений, без создания
+объектов моделей: bulk_create тратит на подготовку каждого объекта в
+несколько раз больше времени, чем SQLite на его вставку. Таблицы и
+столбцы берутся из _meta моделей.
+
+id пользователей, курсов и групп назначаются заранее, следующими после
+наибольших существующих, поэтому связи создаются без чтения только что
+вставленных строк. Подписки и связи вставляются раньше курсов и групп:
+внешние ключи проверяются при фиксации транзакции.
+"""
+
+import random
+import string
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+
+from users.models import Balance, Subscription
+from .cache import invalidate_courses
+from .models import Course, Group, Lesson
+
+User = get_user_model()
+
+CHUNK_SIZE = 5000
+GROUPS_PER_COURSE = 10
+GROUP_NAMES = ('А', 'Б', 'В', 'Г', 'Д', 'Е', 'Ж', 'З', 'И', 'К')
+FIRST_NAMES = ('Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Сергей',
+               'Елена', 'Дмитрий', 'Наталья', 'Алексей')
+LAST_NAMES = ('Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев',
+              'Петров', 'Соколов', 'Михайлов', 'Новиков', 'Фёдоров')
+DATE_JOINED = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+SIGNALS = (pre_save, post_save, pre_delete, post_delete, m2m_changed)
+
+# Количество созданных строк по таблицам.
+SeedResult = namedtuple(
+    'SeedResult',
+    ('users', 'balances', 'courses', 'groups', 'lessons', 'subscriptions',
+     'course_students', 'group_students')
+)
+
+
+@contextmanager
+def muted_signals(signals=SIGNALS):
+    """Временное отключение всех обработчиков сигналов signals."""
+    saved = [(signal, signal.receivers) for signal in signals]
+    for signal in signals:
+        signal.receivers = []
+        signal.sender_receivers_cache.clear()
+    try:
+        yield
+    finally:
+        for signal, receivers in saved:
+            signal.receivers = receivers
+            signal.sender_receivers_cache.clear()
+
+
+def _next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def _datetime(value):
+    return connection.ops.adapt_datetimefield_value(value)
+
+
+def _insert(model, fields, rows, chunk_size):
+    """
+    Вставка строк rows - кортежей значений полей fields, уже в виде для
+    базы, - пачками по chunk_size. Возвращает количество строк.
+    """
+    quote = connection.ops.quote_name
+    columns = [model._meta.get_field(name).column for name in fields]
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(column) for column in columns),
+        ', '.join(['%s'] * len(columns)),
+    )
+    count = 0
+    rows = iter(rows)
+    with connection.cursor() as cursor:
+        while chunk := list(islice(rows, chunk_size)):
+            cursor.executemany(sql, chunk)
+            count += len(chunk)
+    return count
+
+
+def _group_sizes(students):
+    """Размеры групп курса при распределении студентов по кругу."""
+    return [students // GROUPS_PER_COURSE
+            + (number < students % GROUPS_PER_COURSE)
+            for number in range(GROUPS_PER_COURSE)]
+
+
+def seed_data(users, courses, lessons=5, enrollments=3, authors=None,
+              seed=0, password='password', chunk_size=CHUNK_SIZE):
+    """
+    Создание users пользователей (первые authors из них - администраторы
+    и авторы курсов) и courses курсов по lessons уроков и
+    GROUPS_PER_COURSE групп. Каждый студент подписан в среднем на
+    enrollments случайных курсов, пока на них есть места, и распределён
+    по группам курса по кругу. Возвращает SeedResult.
+    """
+    rng = random.Random(seed)
+    if authors is None:
+        authors = max(1, courses // 20) if courses else 0
+    authors = min(authors, users)
+    if courses and not authors:
+        raise ValueError('Для курсов нужен хотя бы один автор.')
+
+    salt = ''.join(rng.choices(string.ascii_letters + string.digits, k=22))
+    password = make_password(password, salt)
+    now = _datetime(datetime.now(timezone.utc))
+
+    with muted_signals(), transaction.atomic():
+        first_user = _next_id(User)
+        first_course = _next_id(Course)
+        first_group = _next_id(Group)
+
+        # Количество студентов каждого курса по мере зачисления.
+        fill = [0] * courses
+        counts = dict.fromkeys(SeedResult._fields, 0)
+
+        for start in range(0, users, chunk_size):
+            pks = range(first_user + start,
+                        first_user + min(start + chunk_size, users))
+            counts['users'] += _insert(User, (
+                'id', 'username', 'email', 'password', 'first_name',
+                'last_name', 'is_staff', 'is_superuser', 'is_active',
+                'date_joined'
+            ), (
+                (pk, f'user{pk}', f'user{pk}@example.com', password,
+                 rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+                 pk - first_user < authors, False, True,
+                 _datetime(DATE_JOINED + timedelta(minutes=pk - first_user)))
+                for pk in pks
+            ), chunk_size)
+            counts['balances'] += _insert(Balance, ('user', 'bonuses'), (
+                (pk, rng.randrange(0, 5001, 10)) for pk in pks
+            ), chunk_size)
+
+            subscriptions, course_links, group_links = [], [], []
+            for pk in pks:
+                if pk - first_user < authors or not courses:
+                    continue
+                chosen = set()
+                for _ in range(rng.randint(0, 2 * enrollments)):
+                    course = rng.randrange(courses)
+                    if (course in chosen
+                            or fill[course] >= Course.MAX_STUDENTS_QUANTITY):
+                        continue
+                    chosen.add(course)
+                    group = (first_group + course * GROUPS_PER_COURSE
+                             + fill[course] % GROUPS_PER_COURSE)
+                    fill[course] += 1
+                    subscriptions.append((pk, first_course + course, now))
+                    course_links.append((first_course + course, pk))
+                    group_links.append((group, pk))
+            counts['subscriptions'] += _insert(
+                Subscription, ('user', 'course', 'created'), subscriptions,
+                chunk_size
+            )
+            counts['course_students'] += _insert(
+                Course.students.through, ('course', 'customuser'),
+                course_links, chunk_size
+            )
+            counts['group_students'] += _insert(
+                Group.students.through, ('group', 'customuser'),
+                group_links, chunk_size
+            )
+
+        counts['courses'] = _insert(Course, (
+            'id', 'author', 'title', 'price', 'is_available', 'start_date',
+            'students_count', 'lessons_count'
+        ), (
+            (first_course + num, first_user + rng.randrange(authors),
+             f'Курс {first_course + num}', rng.randrange(100, 5001, 100),
+             students < Course.MAX_STUDENTS_QUANTITY, now, students, lessons)
+            for num, students in enumerate(fill)
+        ), chunk_size)
+        # Номера групп и уроков заданы явно - счётчики порядка (OrderField)
+        # создадутся от наибольшего номера при первом резервировании.
+        counts['groups'] = _insert(Group, (
+            'id', 'course', 'title', 'number', 'member_count'
+        ), (
+            (first_group + num * GROUPS_PER_COURSE + index,
+             first_course + num, f'Группа {name}', index + 1, size)
+            for num, students in enumerate(fill)
+            for index, (name, size) in enumerate(
+                zip(GROUP_NAMES, _group_sizes(students))
+            )
+        ), chunk_size)
+        counts['lessons'] = _insert(Lesson, (
+            'course', 'title', 'link', 'number'
+        ), (
+            (first_course + num, f'Урок {number}',
+             f'https://example.com/{first_course + num}/{number}', number)
+            for num in range(courses)
+            for number in range(1, lessons + 1)
+        ), chunk_size)
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [User, Course, Group]):
+                cursor.execute(sql)
+        # Изменилось количество клиентов - процент приобретаемости курсов.
+        invalidate_courses()
+
+    return SeedResult(**counts)
@@ -1,25 +1,30 @@
-from django.db.models import Count
-from django.db.models.signals import post_save, m2m_changed
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
 from django.dispatch import receiver
 from django.utils import timezone
 
 from users.models import Subscription
-from .models import Course, Group
+from . import counters, entitlements, jobs, outbox
+from .cache import GROUPS, LESSONS, bump_versions, invalidate_courses
+from .models import Course, Group, Lesson
+from .tasks import ASSIGN_GROUPS
+
+User = get_user_model()
 
 
 @receiver(post_save, sender=Subscription)
 def post_save_subscription(sender, instance: Subscription, created, **kwargs):
     """
-    Распределение нового студента в группу курса.
+    Распределение нового студента в группу курса - задачей очереди
+    (courses.tasks), вне запроса оплаты.
     """
 
     if created:
-        course = instance.course
-        user = instance.user
-        group = course.groups.annotate(
-            summary_students=Count('students')
-        ).order_by('summary_students').first()
-        group.students.add(user)
+        jobs.enqueue(ASSIGN_GROUPS, {'course_id': instance.course_id,
+                                     'user_id': instance.user_id})
+        # Оплата добавляет студента в курс без m2m_changed.
+        entitlements.forget([instance.user_id])
 
 
 @receiver(post_save, sender=Course)
@@ -31,29 +36,158 @@ def create_groups_for_course(sender, instance: Course, created, **kwargs):
 
     if created:
         names = ('А', 'Б', 'В', 'Г', 'Д', 'Е', 'Ж', 'З', 'И', 'К')
-        for name in names:
-            Group.objects.create(course=instance, title=f'Группа {name}')
+        groups = [Group(course=instance, title=f'Группа {name}')
+                  for name in names]
+        Group._meta.get_field('number').assign_bulk(groups)
+        Group.objects.bulk_create(groups)
+
+
+@receiver(pre_delete, sender=User)
+def forget_deleted_user(sender, instance, **kwargs):
+    """
+    Связи удаляемого пользователя удаляются каскадно, без m2m_changed:
+    счётчики, доступность курсов и кэш обновляются до удаления.
+    """
+    bump_versions((GROUPS,), Group.objects.filter(
+        students=instance
+    ).values_list('course_id', flat=True).distinct())
+    course_ids = counters.forget_member(instance)[Course]
+    if course_ids:
+        Course.objects.filter(pk__in=course_ids).update_availability()
+        invalidate_courses(course_ids)
+    entitlements.forget([instance.pk])
+
+
+@receiver(post_save, sender=Lesson)
+def increase_lessons_count(sender, instance: Lesson, created, **kwargs):
+    if created:
+        counters.update_lessons_counter(instance.course_id, 1)
+    invalidate_courses([instance.course_id])
+    bump_versions((LESSONS,), [instance.course_id])
+
+
+@receiver(post_delete, sender=Lesson)
+def decrease_lessons_count(sender, instance: Lesson, **kwargs):
+    counters.update_lessons_counter(instance.course_id, -1)
+    invalidate_courses([instance.course_id])
+    bump_versions((LESSONS,), [instance.course_id])
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course_cache(sender, instance: Course, **kwargs):
+    """
+    Сброс закэшированных ответов каталога при изменении курса. Название
+    курса выводится также в уроках и группах.
+    """
+    invalidate_courses([instance.pk])
+    bump_versions((LESSONS, GROUPS), [instance.pk])
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_groups_cache(sender, instance: Group, **kwargs):
+    bump_versions((GROUPS,), [instance.course_id])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_catalogue_cache(sender, instance, created=False,
+                               update_fields=None, **kwargs):
+    """
+    От пользователей зависят процент приобретаемости курсов (количество
+    клиентов), имя автора и состав групп. Сохранение только last_login
+    при входе каталог не затрагивает.
+    """
+    if update_fields is not None and 'is_staff' not in update_fields:
+        return
+    if created:
+        invalidate_courses()
+        return
+    invalidate_courses(
+        Course.objects.filter(author_id=instance.pk).values_list('pk',
+                                                                 flat=True)
+    )
+    # Имя и почта студента выводятся в составе групп.
+    bump_versions((GROUPS,), Group.objects.filter(
+        students=instance
+    ).values_list('course_id', flat=True).distinct())
+
+
+def _removed_links(model, instance, action, reverse, pk_set):
+    """
+    Пары (pk объекта model, pk студента) связей model.students, которые
+    удаляют remove/clear. Какие связи будут удалены, известно только до
+    удаления, поэтому в pre_* они читаются одним запросом и запоминаются
+    на самом объекте, а в post_* возвращаются.
+    """
+    field = model._meta.get_field('students')
+    through = field.remote_field.through
+    owner_attname = f'{field.m2m_field_name()}_id'
+    member_attname = f'{field.m2m_reverse_field_name()}_id'
+    pending = instance.__dict__.setdefault('_removed_links', {})
+
+    if action in ('pre_remove', 'pre_clear'):
+        links = through.objects.filter(**{
+            member_attname if reverse else owner_attname: instance.pk
+        })
+        if action == 'pre_remove':
+            links = links.filter(**{
+                f'{owner_attname if reverse else member_attname}__in': pk_set
+            })
+        pending[through] = list(
+            links.values_list(owner_attname, member_attname)
+        )
+    elif action in ('post_remove', 'post_clear'):
+        return pending.pop(through, [])
+    return []
 
 
 @receiver(m2m_changed, sender=Course.students.through)
-def check_course_availability(sender, instance, action, **kwargs):
+@receiver(m2m_changed, sender=Group.students.through)
+def update_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Изменение студентов курса или группы через add/remove/clear с любой
+    стороны: счётчики (courses.counters), для курса - доступность и
+    права студентов, для группы - версия кэша групп, и события журнала
+    (courses.outbox). Удаляемые связи читаются один раз и передаются
+    и счётчикам, и журналу.
+    """
+    model = Course if sender is Course.students.through else Group
+    removed = _removed_links(model, instance, action, reverse, pk_set)
+    changed = counters.update_members_counter(model, instance, action,
+                                              reverse, pk_set, removed)
+    if model is Course:
+        _course_students_changed(instance, action, reverse, pk_set,
+                                 changed, removed)
+    elif changed:
+        bump_versions((GROUPS,), Group.objects.filter(
+            pk__in=changed
+        ).values_list('course_id', flat=True).distinct())
+    outbox.record_membership(model, instance, action, reverse, pk_set,
+                             removed)
+
+
+def _course_students_changed(instance, action, reverse, pk_set, changed,
+                             removed):
     """
-    Используется для проверки, не равно ли количество студентов,
-    зачисленных на курс, максимально допустимому количеству.
-    Если равно, то курс становится недоступным для приобретения с
-    помощью is_available = False.
+    Доступность курса: когда количество студентов достигает максимально
+    допустимого, курс становится недоступным для приобретения
+    (is_available = False), а когда освобождается место - снова
+    доступным. Сброс закэшированных прав студентов, чей состав курсов
+    изменился.
     """
+    if changed:
+        invalidate_courses(changed)
+        # Один условный UPDATE только столбца is_available, без save().
+        Course.objects.filter(pk__in=changed).update_availability()
+        if not reverse:
+            # instance - курс, его счётчик уже обновлён в памяти.
+            instance.is_available = (
+                instance.students_count < Course.MAX_STUDENTS_QUANTITY
+            )
 
     if action == 'post_add':
-        if instance.students.count() == Course.MAX_STUDENTS_QUANTITY:
-            instance.is_available = False
-            instance.save()
-
-    elif action == 'post_remove':
-        if instance.students.count() < Course.MAX_STUDENTS_QUANTITY:
-            instance.is_available = True
-            instance.save()
-
-    elif action == 'post_clear':
-        instance.is_available = True
-        instance.save()
\ No newline at end of file
+        entitlements.forget([instance.pk] if reverse else pk_set)
+    elif action in ('post_remove', 'post_clear'):
+        entitlements.forget({user_id for _, user_id in removed})
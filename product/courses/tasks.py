@@ -0,0 +1,47 @@
+"""
+Обработчики задач очереди courses.jobs. Задача может выполниться
+повторно (at-least-once), поэтому обработчики идемпотентны.
+"""
+
+from collections import defaultdict
+
+from users.models import Subscription
+from .allocation import GroupsAreFull, assign_to_groups
+from .jobs import BatchFailed, handler
+
+ASSIGN_GROUPS = 'assign_groups'
+
+
+@handler(ASSIGN_GROUPS)
+def assign_groups(payloads):
+    """
+    Распределение по группам студентов, купивших курс
+    ({'course_id': ..., 'user_id': ...}): один assign_to_groups на курс.
+    Уже распределённые студенты и студенты без подписки на курс
+    (удалённые) пропускаются.
+
+    Если кому-то не хватило мест, после обработки всех курсов
+    выбрасывается BatchFailed с задачами только этих студентов (причина -
+    GroupsAreFull): они повторяются с задержкой (места могли
+    освободиться), а после JOBS_MAX_ATTEMPTS попыток остаются в очереди с
+    failed=True. Задачи распределённых студентов удаляются.
+    """
+    by_course = defaultdict(list)
+    for payload in payloads:
+        by_course[payload['course_id']].append(payload['user_id'])
+    full = []
+    unassigned = set()
+    for course_id, user_ids in by_course.items():
+        students = Subscription.objects.filter(
+            course_id=course_id, user_id__in=user_ids
+        ).values_list('user_id', flat=True)
+        _, left = assign_to_groups(course_id, list(students))
+        if left:
+            full.append(f'курс {course_id}, студенты {left}')
+            unassigned.update((course_id, user_id) for user_id in left)
+    if full:
+        raise BatchFailed(
+            [index for index, payload in enumerate(payloads)
+             if (payload['course_id'], payload['user_id']) in unassigned],
+            GroupsAreFull(f'В группах нет мест: {"; ".join(full)}.')
+        )
@@ -1,9 +1,30 @@
-from django.test import TestCase
+import threading
+from collections import Counter
+from io import StringIO
+from unittest import mock
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.db.models import Count
 from django.contrib.auth import get_user_model
-
-from .models import Course, Lesson, Group
-from users.models import Subscription
+from django.utils import timezone
+
+from . import entitlements, jobs, outbox
+from .cache import COURSE, get_version
+from .counters import rebuild_counters
+from .enrollment import enroll_students
+from .jobs import work
+from .allocation import (GroupsAreFull, assign_to_group, assign_to_groups,
+                         balanced_sizes, rebalance_groups)
+from .models import Course, Event, Lesson, Group, Job
+from .seeding import seed_data
+from users.models import Balance, Subscription
 
 User = get_user_model()
 
@@ -70,6 +91,47 @@ class CoursesModelsTest(TestCase):
             self.assertEqual(group.title, f'Группа {names[num]}')
             self.assertEqual(group.number, num + 1)
 
+    def test_course_create_queries(self):
+        # INSERT курса; UPDATE счётчика номеров групп, MAX(number) и INSERT
+        # счётчика (новый курс); один INSERT всех групп.
+        with CaptureQueriesContext(connection) as queries:
+            course = course_create(author=self.user, title='Course 2')
+        statements = [query['sql'] for query in queries
+                      if not query['sql'].startswith(('SAVEPOINT',
+                                                      'RELEASE'))]
+        self.assertEqual(len(statements), 5)
+        self.assertEqual(
+            list(course.groups.values_list('number', flat=True)),
+            list(range(1, 11))
+        )
+
+    def test_order_field_assign_bulk(self):
+        course2 = course_create(author=self.user, title='Course 2')
+        # Номера удалённых групп повторно не выдаются.
+        Group.objects.filter(course=course2, number__gt=3).delete()
+
+        groups = [Group(course=course, title='Group')
+                  for course in (self.course, course2, self.course)]
+        groups.append(Group(course=course2, title='Group', number=50))
+        # UPDATE и SELECT счётчика на каждый курс.
+        with self.assertNumQueries(4):
+            Group._meta.get_field('number').assign_bulk(groups)
+        self.assertEqual([group.number for group in groups], [11, 11, 12, 50])
+
+    def test_order_field_save_existing(self):
+        group = Group.objects.get(course=self.course, number=1)
+        group.title = 'Group'
+        # Только UPDATE группы - номер прежний, счётчик не трогается.
+        with self.assertNumQueries(1):
+            group.save()
+
+        group.number = 50
+        group.save()
+        new_group = Group.objects.create(course=self.course, title='Group')
+        self.assertEqual(new_group.number, 51)
+        with self.assertNumQueries(1):
+            new_group.save()
+
     def test_course_not_available_m2m_changed(self):
         Course.MAX_STUDENTS_QUANTITY = 1
         course = Course.objects.first()
@@ -98,6 +160,9 @@ class CoursesModelsTest(TestCase):
         user2 = user_create(username='user2', email='testuser2@test.com')
         subscription = subscription_create(user=user2,
                                            course=self.course)
+        # Распределение в группу - задача очереди.
+        self.assertEqual(Group.students.through.objects.count(), 0)
+        work(burst=True)
 
         self.assertEqual(self.course.subscriptions.count(), 1)
         group = self.course.groups.annotate(
@@ -122,6 +187,7 @@ class CoursesModelsTest(TestCase):
                             first_name='User5')
         subscription5 = subscription_create(user=user5,
                                            course=self.course)
+        work(burst=True)
 
         groups = self.course.groups.annotate(
             summary_students=Count('students')
@@ -131,4 +197,821 @@ class CoursesModelsTest(TestCase):
         for num in range(groups.count()):
             group = groups[num]
             self.assertEqual(group.number, num + 1)
-            self.assertEqual(group.students.count(), 1)
\ No newline at end of file
+            self.assertEqual(group.students.count(), 1)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = user_create()
+        cls.course = course_create(author=cls.user)
+        cls.students = [
+            user_create(username=f'user{num}', email=f'user{num}@test.com')
+            for num in range(3)
+        ]
+
+    def assertCounters(self, students_count, lessons_count=0):
+        course = Course.objects.get(pk=self.course.pk)
+        self.assertEqual(course.students_count, students_count)
+        self.assertEqual(course.students_count, course.students.count())
+        self.assertEqual(course.lessons_count, lessons_count)
+        self.assertEqual(course.lessons_count, course.lessons.count())
+
+    def test_students_count(self):
+        course = self.course
+        course.students.add(*self.students)
+        self.assertEqual(course.students_count, 3)
+        self.assertCounters(3)
+
+        # Повторное добавление не меняет счётчик.
+        course.students.add(self.students[0])
+        self.assertCounters(3)
+
+        course.students.remove(self.students[0], self.user)
+        self.assertEqual(course.students_count, 2)
+        self.assertCounters(2)
+
+        course.students.clear()
+        self.assertEqual(course.students_count, 0)
+        self.assertCounters(0)
+
+    def test_students_count_reverse(self):
+        course2 = course_create(author=self.user, title='Course 2')
+        student = self.students[0]
+
+        student.joined_courses.add(self.course, course2)
+        self.assertCounters(1)
+        self.assertEqual(Course.objects.get(pk=course2.pk).students_count, 1)
+
+        student.joined_courses.remove(self.course)
+        self.assertCounters(0)
+
+        student.joined_courses.clear()
+        self.assertEqual(Course.objects.get(pk=course2.pk).students_count, 0)
+
+    def assertAvailable(self, course, available):
+        self.assertEqual(course.is_available, available)
+        self.assertEqual(Course.objects.get(pk=course.pk).is_available,
+                         available)
+
+    @mock.patch.object(Course, 'MAX_STUDENTS_QUANTITY', 2)
+    def test_availability_batch(self):
+        course = self.course
+        # Пакет перешагивает порог: 0 -> 3 при максимуме 2.
+        with CaptureQueriesContext(connection) as queries:
+            course.students.add(*self.students)
+        self.assertAvailable(course, False)
+        updates = [query['sql'] for query in queries
+                   if 'is_available' in query['sql']]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('"title"', updates[0])
+
+        # 3 -> 2: мест по-прежнему нет.
+        course.students.remove(self.students[0])
+        self.assertAvailable(course, False)
+
+        # 3 -> 1 одним вызовом.
+        course.students.add(self.students[0])
+        course.students.remove(*self.students[:2])
+        self.assertAvailable(course, True)
+
+        course.students.add(self.user)
+        self.assertAvailable(course, False)
+        course.students.clear()
+        self.assertAvailable(course, True)
+
+    @mock.patch.object(Course, 'MAX_STUDENTS_QUANTITY', 2)
+    def test_availability_batch_reverse(self):
+        course2 = course_create(author=self.user, title='Course 2')
+        course2.students.add(self.students[0])
+
+        def available(course):
+            return Course.objects.get(pk=course.pk).is_available
+
+        student = self.students[1]
+        student.joined_courses.add(self.course, course2)
+        self.assertTrue(available(self.course))
+        self.assertFalse(available(course2))
+
+        student.joined_courses.remove(self.course, course2)
+        self.assertTrue(available(self.course))
+        self.assertTrue(available(course2))
+
+        student.joined_courses.add(course2)
+        student.joined_courses.clear()
+        self.assertTrue(available(course2))
+
+    def test_member_count(self):
+        group = self.course.groups.get(number=1)
+        group.students.add(*self.students)
+        self.assertEqual(Group.objects.get(pk=group.pk).member_count, 3)
+
+        self.students[0].joined_groups.remove(group)
+        self.assertEqual(Group.objects.get(pk=group.pk).member_count, 2)
+
+    def test_user_delete(self):
+        group = self.course.groups.get(number=1)
+        self.course.students.add(*self.students)
+        group.students.add(*self.students)
+
+        self.students[0].delete()
+        self.assertCounters(2)
+        self.assertEqual(Group.objects.get(pk=group.pk).member_count, 2)
+
+    @mock.patch.object(Course, 'MAX_STUDENTS_QUANTITY', 2)
+    def test_user_delete_availability(self):
+        course = self.course
+        course.students.add(*self.students[:2])
+        self.assertAvailable(course, False)
+        version = get_version(COURSE, course.pk)
+
+        self.students[0].delete()
+        self.assertCounters(1)
+        self.assertTrue(Course.objects.get(pk=course.pk).is_available)
+        self.assertNotEqual(get_version(COURSE, course.pk), version)
+
+    def test_lessons_count(self):
+        lesson = lesson_create(course=self.course)
+        lesson_create(course=self.course)
+        self.assertCounters(0, lessons_count=2)
+
+        lesson.delete()
+        self.assertCounters(0, lessons_count=1)
+
+    def test_save_does_not_overwrite_counters(self):
+        stale = Course.objects.get(pk=self.course.pk)
+        self.course.students.add(*self.students)
+
+        stale.title = 'New title'
+        stale.save()
+        self.assertCounters(3)
+
+    def test_rebuild_counters(self):
+        self.course.students.add(*self.students)
+        lesson_create(course=self.course)
+        Course.objects.update(students_count=100, lessons_count=100)
+        Group.objects.update(member_count=100)
+
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertCounters(3, lessons_count=1)
+        self.assertFalse(Group.objects.exclude(member_count=0).exists())
+
+
+class EntitlementsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = user_create()
+        cls.course = course_create(author=author)
+        cls.course2 = course_create(author=author, title='Course 2')
+        cls.student = user_create(username='student',
+                                  email='student@test.com')
+
+    def setUp(self):
+        cache.clear()
+
+    def is_entitled(self, course):
+        # Новый объект пользователя - как в следующем запросе.
+        user = User.objects.get(pk=self.student.pk)
+        return entitlements.is_entitled(user, course.pk)
+
+    def test_cached_between_requests(self):
+        self.course.students.add(self.student)
+        self.assertTrue(self.is_entitled(self.course))
+
+        user = User.objects.get(pk=self.student.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(entitlements.is_entitled(user, self.course.pk))
+            self.assertTrue(entitlements.is_entitled(user,
+                                                     str(self.course.pk)))
+
+    def test_invalidated_by_signals(self):
+        self.assertFalse(self.is_entitled(self.course))
+
+        self.course.students.add(self.student)
+        self.assertTrue(self.is_entitled(self.course))
+        self.course.students.remove(self.student)
+        self.assertFalse(self.is_entitled(self.course))
+
+        self.student.joined_courses.add(self.course, self.course2)
+        self.assertTrue(self.is_entitled(self.course2))
+        self.course2.students.clear()
+        self.assertFalse(self.is_entitled(self.course2))
+        self.student.joined_courses.clear()
+        self.assertFalse(self.is_entitled(self.course))
+
+    def test_negative_result_rechecked(self):
+        self.assertFalse(self.is_entitled(self.course))
+        # Связь добавлена в обход сигналов, например другим процессом.
+        Course.students.through.objects.create(course=self.course,
+                                               customuser=self.student)
+        self.assertTrue(self.is_entitled(self.course))
+
+
+class AllocationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = user_create()
+        cls.course = course_create(author=cls.user)
+        cls.students = [
+            User.objects.create_user(username=f'user{num}',
+                                     email=f'user{num}@test.com')
+            for num in range(25)
+        ]
+
+    def group_sizes(self):
+        groups = self.course.groups.order_by('number')
+        for group in groups:
+            self.assertEqual(group.member_count, group.students.count())
+        return [group.member_count for group in groups]
+
+    def test_assign_to_least_filled_group(self):
+        first = self.course.groups.get(number=1)
+        first.students.add(self.students[0])
+
+        group_id = assign_to_group(self.course.pk, self.students[1].pk)
+        self.assertEqual(group_id, self.course.groups.get(number=2).pk)
+        self.assertEqual(self.group_sizes(), [1, 1] + [0] * 8)
+
+    @mock.patch.object(Group, 'MAX_STUDENTS_QUANTITY', 2)
+    def test_groups_are_full(self):
+        for student in self.students[:20]:
+            assign_to_group(self.course.pk, student.pk)
+        self.assertEqual(self.group_sizes(), [2] * 10)
+
+        with self.assertRaises(GroupsAreFull):
+            assign_to_group(self.course.pk, self.students[20].pk)
+
+        # В одном пакете со студентом другого курса: задача
+        # распределённого студента удаляется, а задача студента без места
+        # повторяется и после JOBS_MAX_ATTEMPTS попыток остаётся с
+        # failed=True.
+        other = course_create(author=self.user, title='Other')
+        subscription_create(user=self.students[20], course=self.course)
+        subscription_create(user=self.students[21], course=other)
+        with self.assertLogs('courses.jobs', 'ERROR'), \
+                override_settings(JOBS_MAX_ATTEMPTS=2):
+            work(burst=True)
+            job = Job.objects.get()
+            self.assertEqual(job.payload, {'course_id': self.course.pk,
+                                           'user_id': self.students[20].pk})
+            self.assertEqual(job.attempts, 1)
+            self.assertFalse(job.failed)
+            jobs.run_batch(now=timezone.now() + timedelta(days=1))
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+        self.assertTrue(job.failed)
+        self.assertIn('GroupsAreFull', job.last_error)
+        self.assertEqual(self.group_sizes(), [2] * 10)
+        self.assertTrue(other.groups.filter(
+            students=self.students[21]
+        ).exists())
+
+    def test_assign_to_groups(self):
+        self.course.groups.get(number=1).students.add(*self.students[:3])
+        user_ids = [student.pk for student in self.students]
+
+        # 2 SELECT, 2 INSERT (связи и события), UPDATE + SAVEPOINT/RELEASE
+        with self.assertNumQueries(7):
+            assigned, unassigned = assign_to_groups(self.course.pk, user_ids)
+        self.assertEqual(len(assigned), 22)
+        self.assertEqual(unassigned, [])
+        self.assertEqual(self.group_sizes(), [3] * 5 + [2] * 5)
+
+    @mock.patch.object(Group, 'MAX_STUDENTS_QUANTITY', 2)
+    def test_assign_to_groups_capacity(self):
+        user_ids = [student.pk for student in self.students]
+        assigned, unassigned = assign_to_groups(self.course.pk, user_ids)
+        self.assertEqual(len(assigned), 20)
+        self.assertEqual(unassigned, user_ids[20:])
+        self.assertEqual(self.group_sizes(), [2] * 10)
+
+
+class RebalanceTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = user_create()
+        cls.course = course_create(author=cls.author)
+        cls.users = list(User.objects.bulk_create(
+            User(username=f'user{num}', email=f'user{num}@test.com')
+            for num in range(25)
+        ))
+
+    def sizes(self, course):
+        return list(course.groups.order_by('number').annotate(
+            total=Count('students')
+        ).values_list('total', flat=True))
+
+    def test_balanced_sizes(self):
+        self.assertEqual(balanced_sizes({1: 10, 2: 0, 3: 5}),
+                         {1: 5, 2: 5, 3: 5})
+        # Лишнее место остаётся у самой заполненной группы.
+        self.assertEqual(balanced_sizes({1: 0, 2: 7, 3: 0}),
+                         {1: 2, 2: 3, 3: 2})
+        self.assertEqual(balanced_sizes({1: 2, 2: 3, 3: 2}),
+                         {1: 2, 2: 3, 3: 2})
+        # Не больше capacity; не поместившиеся остаются в самой
+        # переполненной группе.
+        self.assertEqual(balanced_sizes({1: 8, 2: 1, 3: 0}, capacity=3),
+                         {1: 3, 2: 3, 3: 3})
+        self.assertEqual(balanced_sizes({1: 9, 2: 4, 3: 0}, capacity=3),
+                         {1: 7, 2: 3, 3: 3})
+
+    def test_rebalance_groups(self):
+        first, second = self.course.groups.all()[:2]
+        first.students.add(*self.users[:20])
+        second.students.add(*self.users[20:])
+
+        moves = rebalance_groups(dry_run=True)
+        self.assertEqual(len(moves), 17 + 2)
+        self.assertEqual(self.sizes(self.course), [20, 5] + [0] * 8)
+
+        with CaptureQueriesContext(connection) as queries:
+            rebalance_groups([self.course.pk])
+        # Размеры групп, связи переводимых студентов, DELETE, INSERT
+        # связей и событий и UPDATE счётчиков.
+        statements = [query for query in queries
+                      if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(len(statements), 6)
+        self.assertEqual(self.sizes(self.course),
+                         [3, 3, 3, 3, 3, 2, 2, 2, 2, 2])
+        # Студенты первой группы, вступившие первыми, остались в ней.
+        self.assertEqual(set(first.students.all()), set(self.users[:3]))
+        for group in self.course.groups.annotate(total=Count('students')):
+            self.assertEqual(group.member_count, group.total)
+
+        self.assertEqual(rebalance_groups(), [])
+
+    @mock.patch.object(Group, 'MAX_STUDENTS_QUANTITY', 2)
+    def test_rebalance_groups_over_capacity(self):
+        first, second, third = self.course.groups.order_by('number')[:3]
+        first.students.add(*self.users[:20])
+        second.students.add(*self.users[20:])
+        # Счётчик разошёлся с данными - после перераспределения верный.
+        Group.objects.filter(pk=third.pk).update(member_count=99)
+
+        moves = rebalance_groups()
+        self.assertEqual(len(moves), 13 + 3)
+        # 25 студентов на 20 мест: лишние 5 остаются в первой группе.
+        self.assertEqual(self.sizes(self.course), [7] + [2] * 9)
+        for group in self.course.groups.annotate(total=Count('students')):
+            self.assertEqual(group.member_count, group.total)
+
+    def test_rebalance_groups_command(self):
+        self.course.groups.first().students.add(*self.users[:4])
+        out = StringIO()
+        call_command('rebalance_groups', '--dry-run', stdout=out)
+        self.assertIn('Будет перемещено студентов: 3, курсов: 1',
+                      out.getvalue())
+        call_command('rebalance_groups', '--course', self.course.pk,
+                     stdout=out)
+        self.assertEqual(sorted(self.sizes(self.course)), [0] * 6 + [1] * 4)
+
+    def test_rebalance_groups_many_courses(self):
+        courses = Course.objects.bulk_create(
+            Course(author=self.author, title=f'Course {num}')
+            for num in range(1000)
+        )
+        groups = [Group(course=course, title='Group', number=num,
+                        member_count=10 if num == 1 else 0)
+                  for course in courses for num in (1, 2)]
+        # Номера заданы явно; счётчики порядка не нужны.
+        Group._meta.get_field('number').mark_reserved(groups)
+        groups = Group.objects.bulk_create(groups)
+        Group.students.through.objects.bulk_create(
+            Group.students.through(group_id=group.pk, customuser=user)
+            for group in groups[::2] for user in self.users[:10]
+        )
+
+        moves = rebalance_groups()
+        self.assertEqual(len(moves), 1000 * 5)
+        self.assertEqual(
+            Group.objects.filter(course__in=courses).annotate(
+                total=Count('students')
+            ).filter(total=5).count(),
+            2000
+        )
+
+
+class EnrollmentTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = user_create()
+        cls.course = course_create(author=cls.author)
+
+    def users_create(self, quantity):
+        # bulk_create без сигналов и хэширования паролей.
+        return list(User.objects.bulk_create(
+            User(username=f'user{num}', email=f'user{num}@test.com')
+            for num in range(quantity)
+        ))
+
+    def assertConsistent(self, course, students_count):
+        course.refresh_from_db()
+        self.assertEqual(course.students_count, students_count)
+        self.assertEqual(course.students.count(), students_count)
+        self.assertEqual(
+            Subscription.objects.filter(course=course).count(),
+            students_count
+        )
+        groups = course.groups.annotate(total=Count('students'))
+        self.assertEqual(sum(group.total for group in groups),
+                         students_count)
+        for group in groups:
+            self.assertEqual(group.member_count, group.total)
+
+    @mock.patch.object(Course, 'MAX_STUDENTS_QUANTITY', 12)
+    def test_enroll_students(self):
+        users = self.users_create(15)
+        enroll_students(self.course.pk, [users[0].pk])
+
+        result = enroll_students(
+            self.course.pk,
+            user_ids=[user.pk for user in users[:10]] + [0],
+            emails=[user.email for user in users[8:]] + ['none@test.com']
+        )
+        self.assertEqual(result.enrolled, [user.pk for user in users[1:12]])
+        self.assertEqual(result.already_enrolled, [users[0].pk])
+        self.assertEqual(result.no_seats, [user.pk for user in users[12:]])
+        self.assertEqual(result.not_found, [0, 'none@test.com'])
+
+        self.assertConsistent(self.course, 12)
+        self.assertFalse(self.course.is_available)
+        # Распределение по группам равномерное.
+        self.assertEqual(
+            sorted(self.course.groups.values_list('member_count', flat=True)),
+            [1] * 8 + [2] * 2
+        )
+
+    def test_enroll_students_queries(self):
+        users = self.users_create(300)
+        small, big = users[:5], users[5:]
+        course2 = course_create(author=self.author, title='Course 2')
+        with CaptureQueriesContext(connection) as small_queries:
+            enroll_students(self.course.pk, [user.pk for user in small])
+        with CaptureQueriesContext(connection) as big_queries:
+            enroll_students(course2.pk, [user.pk for user in big])
+        # События журнала (6 столбцов) вставляются пакетами по
+        # 999 // 6 = 166 строк - ограничение SQLite на количество
+        # параметров: по лишнему INSERT событий зачисления и групп.
+        self.assertEqual(len(small_queries) + 2, len(big_queries))
+        self.assertConsistent(course2, 295)
+
+    @mock.patch.object(Course, 'MAX_STUDENTS_QUANTITY', 10000)
+    @mock.patch.object(Group, 'MAX_STUDENTS_QUANTITY', 1000)
+    def test_enroll_students_many(self):
+        users = self.users_create(10000)
+        result = enroll_students(self.course.pk,
+                                 [user.pk for user in users])
+        self.assertEqual(len(result.enrolled), 10000)
+        self.assertConsistent(self.course, 10000)
+
+    def test_enroll_students_command(self):
+        users = self.users_create(3)
+        out = StringIO()
+        call_command('enroll_students', self.course.pk,
+                     str(users[0].pk), users[1].email, 'none@test.com',
+                     stdout=out)
+        self.assertIn('Зачислено: 2', out.getvalue())
+        self.assertIn('none@test.com', out.getvalue())
+        self.assertConsistent(self.course, 2)
+
+
+class SeedDataTest(TestCase):
+    def snapshot(self):
+        return (
+            list(User.objects.order_by('pk').values_list(
+                'pk', 'username', 'last_name', 'is_staff', 'password'
+            )),
+            list(Balance.objects.order_by('user').values_list(
+                'user', 'bonuses'
+            )),
+            list(Course.objects.order_by('pk').values_list(
+                'pk', 'author', 'price', 'students_count', 'is_available'
+            )),
+            list(Group.students.through.objects.order_by(
+                'group', 'customuser'
+            ).values_list('group', 'customuser')),
+        )
+
+    def seed(self, **kwargs):
+        with mock.patch.object(Course, 'MAX_STUDENTS_QUANTITY', 50):
+            return seed_data(200, 5, lessons=3, seed=1, **kwargs)
+
+    def test_seed_data(self):
+        result = self.seed()
+        self.assertEqual(result.users, 200)
+        self.assertEqual(result.balances, 200)
+        # Сигналы отключены - групп ровно по 10 на курс.
+        self.assertEqual(Group.objects.count(), result.groups)
+        self.assertEqual(result.groups, 50)
+        self.assertEqual(Lesson.objects.count(), 15)
+        self.assertEqual(Subscription.objects.count(),
+                         result.subscriptions)
+        # Курсы заполнены до предела и недоступны.
+        self.assertFalse(Course.objects.filter(is_available=True).exists())
+
+        counters = self.snapshot()
+        members = list(Group.objects.values_list('member_count',
+                                                 flat=True))
+        rebuild_counters()
+        self.assertEqual(self.snapshot(), counters)
+        self.assertEqual(
+            list(Group.objects.values_list('member_count', flat=True)),
+            members
+        )
+
+        user = User.objects.filter(is_staff=False).first()
+        self.assertTrue(user.check_password('password'))
+        # Счётчик порядка продолжает номера созданных уроков.
+        lesson = Lesson.objects.create(course=Course.objects.first(),
+                                       title='Lesson',
+                                       link='https://example.com')
+        self.assertEqual(lesson.number, 4)
+
+    def test_deterministic(self):
+        with transaction.atomic():
+            self.seed()
+            first = self.snapshot()
+            transaction.set_rollback(True)
+        self.seed()
+        self.assertEqual(self.snapshot(), first)
+        self.assertNotEqual(first, ([], [], [], []))
+
+    def test_seed_data_command(self):
+        out = StringIO()
+        call_command('seed_data', '--users', '50', '--courses', '2',
+                     stdout=out)
+        self.assertIn('users: 50', out.getvalue())
+        self.assertIn('Создано строк', out.getvalue())
+        self.assertEqual(Course.objects.count(), 2)
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        handlers = mock.patch.dict(jobs._handlers)
+        handlers.start()
+        self.addCleanup(handlers.stop)
+        self.calls = []
+        self.failures = 0
+
+        @jobs.handler('test', batch_size=3)
+        def handle(payloads):
+            self.calls.append([payload['n'] for payload in payloads])
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError('boom')
+
+    def enqueue(self, *numbers):
+        return [jobs.enqueue('test', {'n': n}) for n in numbers]
+
+    def test_batches(self):
+        self.enqueue(*range(5))
+        with self.assertRaises(ValueError):
+            jobs.enqueue('missing')
+
+        self.assertEqual(jobs.work(burst=True), 2)
+        self.assertEqual(self.calls, [[0, 1, 2], [3, 4]])
+        self.assertFalse(Job.objects.exists())
+
+    def test_retry(self):
+        self.failures = 1
+        job, = self.enqueue(1)
+        now = timezone.now()
+        with self.assertLogs('courses.jobs', 'ERROR'):
+            result = jobs.run_batch(now)
+        self.assertIsInstance(result.error, RuntimeError)
+
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.last_error, 'RuntimeError: boom')
+        self.assertGreaterEqual(
+            job.run_at, now + timedelta(seconds=settings.JOBS_RETRY_SECONDS)
+        )
+        self.assertIsNone(jobs.run_batch(now))
+
+        result = jobs.run_batch(job.run_at)
+        self.assertIsNone(result.error)
+        self.assertEqual(self.calls, [[1], [1]])
+        self.assertFalse(Job.objects.exists())
+
+    def test_partial_failure(self):
+        # Обработчик не выполнил задачу с n = 2 - повторяется только она.
+        @jobs.handler('test', batch_size=3)
+        def handle(payloads):
+            self.calls.append([payload['n'] for payload in payloads])
+            failed = [index for index, payload in enumerate(payloads)
+                      if payload['n'] == 2 and len(self.calls) == 1]
+            if failed:
+                raise jobs.BatchFailed(failed, RuntimeError('boom'))
+
+        self.enqueue(1, 2, 3)
+        now = timezone.now()
+        with self.assertLogs('courses.jobs', 'ERROR'):
+            result = jobs.run_batch(now)
+        self.assertIsInstance(result.error, RuntimeError)
+        self.assertEqual(result.jobs, 3)
+
+        job = Job.objects.get()
+        self.assertEqual(job.payload, {'n': 2})
+        self.assertEqual(job.last_error, 'RuntimeError: boom')
+        self.assertFalse(job.failed)
+
+        result = jobs.run_batch(job.run_at)
+        self.assertIsNone(result.error)
+        self.assertEqual(self.calls, [[1, 2, 3], [2]])
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(JOBS_MAX_ATTEMPTS=2)
+    def test_failed(self):
+        self.failures = 10
+        job, = self.enqueue(1)
+        now = timezone.now()
+        with self.assertLogs('courses.jobs', 'ERROR'):
+            jobs.run_batch(now)
+            jobs.run_batch(now + timedelta(hours=1))
+
+        job.refresh_from_db()
+        self.assertTrue(job.failed)
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNone(jobs.run_batch(now + timedelta(days=1)))
+
+    def test_lease(self):
+        # Воркер взял задачу и не выполнил её (упал) - после аренды её
+        # возьмёт другой.
+        job, = self.enqueue(1)
+        self.assertEqual(jobs.claim(), [job])
+        self.assertEqual(jobs.claim(), [])
+
+        later = timezone.now() + timedelta(
+            seconds=settings.JOBS_LEASE_SECONDS + 1
+        )
+        jobs.run_batch(later)
+        self.assertEqual(self.calls, [[1]])
+        self.assertFalse(Job.objects.exists())
+
+    def test_run_worker_command(self):
+        self.enqueue(1, 2)
+        out = StringIO()
+        call_command('run_worker', '--burst', stdout=out)
+        self.assertIn('test: 2', out.getvalue())
+        self.assertEqual(self.calls, [[1, 2]])
+
+
+class OutboxTest(TestCase):
+    def setUp(self):
+        self.author = user_create()
+        self.course = course_create(author=self.author)
+        self.users = [user_create(username=f'user{num}',
+                                  email=f'user{num}@test.com')
+                      for num in range(4)]
+        self.after = Event.objects.order_by('pk').last().pk
+
+    def events(self):
+        events = outbox.read(self.after)
+        if events:
+            self.after = events[-1].pk
+        return [(event.kind, event.user_id, event.course_id, event.group_id)
+                for event in events]
+
+    def test_balance_created(self):
+        self.assertEqual(
+            [(event.kind, event.data) for event in Event.objects.filter(
+                user_id=self.users[0].pk
+            )],
+            [(outbox.BALANCE, {'delta': 1000, 'reason': 'initial'})]
+        )
+
+    def test_course_students(self):
+        first, second = self.users[:2]
+        self.course.students.add(first, second)
+        self.assertEqual(self.events(), [
+            (outbox.ENROLL, first.pk, self.course.pk, None),
+            (outbox.ENROLL, second.pk, self.course.pk, None),
+        ])
+        # Повторное добавление ничего не меняет.
+        self.course.students.add(first)
+        first.joined_courses.remove(self.course)
+        self.course.students.clear()
+        self.assertEqual(self.events(), [
+            (outbox.UNENROLL, first.pk, self.course.pk, None),
+            (outbox.UNENROLL, second.pk, self.course.pk, None),
+        ])
+
+    def test_removed_links_read_once(self):
+        self.course.students.add(*self.users)
+        self.events()
+        # SELECT удаляемых связей - один на счётчики, права и журнал;
+        # DELETE связей, UPDATE счётчика, UPDATE доступности, INSERT
+        # событий.
+        with self.assertNumQueries(5):
+            self.course.students.remove(*self.users[:2])
+        with self.assertNumQueries(5):
+            self.course.students.clear()
+        self.assertEqual(Counter(kind for kind, *_ in self.events()),
+                         {outbox.UNENROLL: 4})
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.students_count, 0)
+
+    def test_group_students(self):
+        first, second = self.course.groups.order_by('number')[:2]
+        user = self.users[0]
+        first.students.add(user)
+        user.joined_groups.add(second)
+        user.joined_groups.clear()
+        self.assertEqual(self.events(), [
+            (outbox.GROUP_JOIN, user.pk, self.course.pk, first.pk),
+            (outbox.GROUP_JOIN, user.pk, self.course.pk, second.pk),
+            (outbox.GROUP_LEAVE, user.pk, self.course.pk, first.pk),
+            (outbox.GROUP_LEAVE, user.pk, self.course.pk, second.pk),
+        ])
+
+    def test_rollback(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.course.students.add(self.users[0])
+            raise RuntimeError()
+        self.assertEqual(self.events(), [])
+
+    def test_enroll_and_rebalance(self):
+        user_ids = [user.pk for user in self.users]
+        enroll_students(self.course.pk, user_ids)
+        events = self.events()
+        self.assertEqual(Counter(kind for kind, *_ in events),
+                         {outbox.GROUP_JOIN: 4, outbox.ENROLL: 4})
+
+        # Второй студент переходит в группу первого.
+        first = self.course.groups.get(students=self.users[0])
+        self.users[1].joined_groups.clear()
+        first.students.add(self.users[1])
+        self.events()
+        moves = rebalance_groups()
+        self.assertEqual(len(moves), 1)
+        event, = outbox.read(self.after)
+        self.assertEqual(
+            (event.kind, event.user_id, event.group_id, event.data),
+            (outbox.GROUP_MOVE, moves[0].user_id, moves[0].to_group,
+             {'from_group': first.pk})
+        )
+
+    def test_read_and_stream(self):
+        outbox.record_many(outbox.event(outbox.ENROLL, num, 1)
+                           for num in range(7))
+        events = outbox.read(self.after, 3)
+        self.assertEqual([event.user_id for event in events], [0, 1, 2])
+        self.assertEqual(
+            [event.user_id for event in outbox.read(events[-1].pk)],
+            [3, 4, 5, 6]
+        )
+
+        with self.assertNumQueries(3):
+            batches = list(outbox.stream(self.after, batch_size=3))
+        self.assertEqual([[event.user_id for event in batch]
+                          for batch in batches], [[0, 1, 2], [3, 4, 5], [6]])
+        self.assertEqual(list(outbox.stream(batches[-1][-1].pk)), [])
+
+
+class OrderFieldConcurrencyTest(TransactionTestCase):
+    """Параллельная выдача номеров групп из нескольких потоков."""
+
+    threads = 8
+    per_thread = 20
+
+    def setUp(self):
+        author = User.objects.create_user(username='author',
+                                          email='author@test.com')
+        self.course = course_create(author=author)
+
+    def create_concurrently(self, get_number):
+        errors = Counter()
+        lock = threading.Lock()
+        start = threading.Barrier(self.threads)
+
+        def worker():
+            start.wait()
+            try:
+                for _ in range(self.per_thread):
+                    try:
+                        Group.objects.create(
+                            course_id=self.course.pk, title='Group',
+                            number=get_number()
+                        )
+                    except Exception as error:
+                        with lock:
+                            errors[type(error).__name__] += 1
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=worker)
+                   for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return errors
+
+    def test_no_duplicates(self):
+        errors = self.create_concurrently(lambda: None)
+
+        self.assertEqual(errors, {})
+        numbers = list(self.course.groups.values_list('number', flat=True))
+        self.assertEqual(sorted(numbers),
+                         list(range(1, 11 + self.threads * self.per_thread)))
@@ -10,7 +10,24 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
+from django.core.handlers.asgi import ASGIHandler
+from django.core.signals import request_finished
+from django.db import connections
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'product.settings')
 
 application = get_asgi_application()
+
+
+def close_connections(**kwargs):
+    """
+    В Django 4.2 под ASGI у каждого запроса свой поток и своё соединение
+    с базой, поэтому CONN_MAX_AGE соединения не переиспользует, а только
+    оставляет открытыми. Соединения закрываются в конце запроса - как
+    при CONN_MAX_AGE = 0; request_finished отправляется в потоке запроса.
+    Запросы WSGI (sender - WSGIHandler) это не затрагивает.
+    """
+    connections.close_all()
+
+
+request_finished.connect(close_connections, sender=ASGIHandler)
@@ -0,0 +1,29 @@
+"""
+SQLite для работы под нагрузкой: настройки соединения (PRAGMA) из
+DATABASES[...]['PRAGMAS'] применяются к каждому новому соединению, а
+транзакции product.db.write_atomic начинаются с BEGIN IMMEDIATE.
+"""
+
+from django.db.backends.signals import connection_created
+from django.db.backends.sqlite3 import base
+from django.dispatch import receiver
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # Выставляется product.db.write_atomic перед началом внешней
+    # транзакции и сбрасывается сразу после BEGIN.
+    begin_immediate = False
+
+    def _start_transaction_under_autocommit(self):
+        if self.begin_immediate:
+            self.cursor().execute('BEGIN IMMEDIATE')
+        else:
+            super()._start_transaction_under_autocommit()
+
+
+@receiver(connection_created, sender=DatabaseWrapper)
+def apply_pragmas(sender, connection, **kwargs):
+    with connection.cursor() as cursor:
+        for name, value in connection.settings_dict.get('PRAGMAS',
+                                                        {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
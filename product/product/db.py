@@ -0,0 +1,120 @@
+"""
+Помощники работы с базой: пишущие транзакции и чтение с реплики.
+
+Реплика объявляется настройкой DATABASE_REPLICA_NAME, чтение с неё
+включается настройкой DATABASE_READ_ALIAS - псевдоним базы для чтения
+('default' - реплики нет). ReplicaRouter отправляет на неё чтение
+только внутри read_from(): например, безопасные запросы API
+(api.v1.replica.ReplicaReadMixin). Запись и чтение внутри транзакции -
+всегда в основную базу.
+
+Чтобы пользователь сразу видел свои изменения (read-your-writes), после
+его записи чтение для него на DATABASE_PRIMARY_PIN_SECONDS закрепляется
+за основной базой: pin_primary() / is_pinned(). Отметки хранятся в кэше
+Django, поэтому между процессами работают только с общим кэшем.
+Ответы, которые кэшируются под версией данных (courses.cache) или
+получают ETag, читаются из основной базы
+(api.v1.replica.ReplicaReadMixin.primary_actions): версия, увеличенная
+записью, не должна достаться данным отстающей реплики.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+@contextmanager
+def write_atomic(using=None):
+    """
+    transaction.atomic() для транзакций, которые сначала читают, а потом
+    пишут. На SQLite (product.backends.sqlite3) внешняя транзакция
+    начинается с BEGIN IMMEDIATE: блокировка записи берётся сразу, и
+    параллельные пишущие транзакции ждут её (busy_timeout), а не падают
+    с "database is locked", когда не удаётся повысить блокировку чтения
+    до записи. Это замена select_for_update, который SQLite игнорирует.
+    Вложенный блок - обычная точка сохранения, на других базах - обычный
+    atomic().
+    """
+    connection = transaction.get_connection(using)
+    connection.begin_immediate = not connection.in_atomic_block
+    try:
+        with transaction.atomic(using=using):
+            connection.begin_immediate = False
+            yield
+    finally:
+        connection.begin_immediate = False
+
+
+def _pin_key(user_id):
+    return f'db:pin-primary:{user_id}'
+
+
+def pin_primary(user_id):
+    """Закрепление чтения пользователя за основной базой после записи."""
+    cache.set(_pin_key(user_id), True,
+              timeout=settings.DATABASE_PRIMARY_PIN_SECONDS)
+
+
+def is_pinned(user_id):
+    return cache.get(_pin_key(user_id), False)
+
+
+async def ais_pinned(user_id):
+    return await cache.aget(_pin_key(user_id), False)
+
+
+@contextmanager
+def read_from(alias=None):
+    """
+    Чтение внутри блока - из базы alias (по умолчанию
+    DATABASE_READ_ALIAS).
+    """
+    token = _read_alias.set(alias or settings.DATABASE_READ_ALIAS)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Чтение внутри read_from() вне транзакции - из выбранной там базы,
+    остальное - из основной.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика - копия основной базы.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема реплики приходит вместе с данными из основной базы.
+        return db == DEFAULT_DB_ALIAS
+
+
+def sync_replica(alias=None):
+    """
+    Копирование основной базы SQLite в локальную реплику alias (по
+    умолчанию DATABASE_READ_ALIAS) - замена репликации для разработки и
+    тестов.
+    """
+    alias = alias or settings.DATABASE_READ_ALIAS
+    if alias == DEFAULT_DB_ALIAS:
+        return
+    source, target = connections[DEFAULT_DB_ALIAS], connections[alias]
+    source.ensure_connection()
+    target.ensure_connection()
+    source.connection.backup(target.connection)
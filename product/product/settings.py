@@ -35,6 +35,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -70,11 +71,100 @@ WSGI_APPLICATION = 'product.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # SQLite с PRAGMAS и BEGIN IMMEDIATE (product.db.write_atomic).
+        'ENGINE': 'product.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        # Соединение переиспользуется между запросами одного потока
+        # WSGI; под ASGI закрывается в конце запроса (product.asgi).
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'PRAGMAS': {
+            # Читатели не блокируют писателя и наоборот.
+            'journal_mode': 'WAL',
+            # В режиме WAL - без fsync на каждую фиксацию, база остаётся
+            # целостной при сбое.
+            'synchronous': 'NORMAL',
+            # Ожидание блокировки, мс, вместо "database is locked".
+            'busy_timeout': 5000,
+            'mmap_size': 256 * 1024 * 1024,
+            # Отрицательное значение - в КиБ: 64 МиБ.
+            'cache_size': -64 * 1024,
+        },
+    }
+}
+
+# Локальная реплика для чтения - копия основной базы, обновляется
+# product.db.sync_replica (команда sync_replica). Путь к файлу реплики,
+# None - реплики нет, псевдоним 'replica' не объявляется.
+DATABASE_REPLICA_NAME = None
+
+if DATABASE_REPLICA_NAME:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': DATABASE_REPLICA_NAME,
+        'TEST': {'NAME': BASE_DIR / 'test_db_replica.sqlite3'},
+    }
+
+DATABASE_ROUTERS = ['product.db.ReplicaRouter']
+
+# База для чтения безопасных запросов API: 'default' - без реплики,
+# 'replica' - с реплики (нужен DATABASE_REPLICA_NAME).
+DATABASE_READ_ALIAS = 'default'
+
+# Сколько секунд после записи пользователь читает из основной базы.
+DATABASE_PRIMARY_PIN_SECONDS = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# Время жизни закэшированных ответов каталога курсов (courses.cache), сек.
+COURSES_CACHE_TIMEOUT = 60 * 10
+
+# Время жизни закэшированных прав доступа к курсам (courses.entitlements).
+COURSES_ENTITLEMENTS_TIMEOUT = 60 * 5
+
+
+# Очередь задач (courses.jobs, команда run_worker).
+# Размер пакета задач одного вида по умолчанию.
+JOBS_BATCH_SIZE = 100
+# Через сколько секунд взятую, но не выполненную задачу возьмёт другой
+# воркер.
+JOBS_LEASE_SECONDS = 60
+# Задержка первого повтора после ошибки, сек; каждый следующий - вдвое
+# дольше.
+JOBS_RETRY_SECONDS = 10
+JOBS_MAX_ATTEMPTS = 5
+# Пауза воркера, когда готовых задач нет, сек.
+JOBS_POLL_SECONDS = 1
+
+# Журнал событий для аналитики (courses.outbox, api/v1/events/).
+# Сколько событий отдавать за одно чтение по умолчанию.
+OUTBOX_BATCH_SIZE = 500
+
+
+# Замеры времени запросов (api.middleware): доля замеряемых запросов,
+# 0 - замеры отключены.
+API_TIMING_SAMPLE_RATE = 0
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.middleware': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -1,7 +1,26 @@
 from django.contrib import admin
+
+from courses import outbox
 from .models import CustomUser, Balance, Subscription
 
 
+def save_balance(balance):
+    """
+    Сохранение баланса из админки и событие BALANCE (courses.outbox) с
+    изменением - в одной транзакции: форма админки сохраняется в
+    transaction.atomic. Изменение - от значения в базе, а не от
+    прочитанного формой.
+    """
+    saved = Balance.objects.select_for_update().filter(
+        pk=balance.pk
+    ).values_list('bonuses', flat=True).first()
+    balance.save()
+    delta = balance.bonuses - (saved or 0)
+    if delta:
+        outbox.record(outbox.BALANCE, balance.user_id, delta=delta,
+                      reason='admin')
+
+
 class BalanceInline(admin.StackedInline):
     model = Balance
     can_delete = False
@@ -21,5 +40,18 @@ class CustomUserAdmin(admin.ModelAdmin):
     ordering = ('-id',)
     filter_horizontal = ()
 
-admin.site.register(Balance)
+    def save_formset(self, request, form, formset, change):
+        if formset.model is not Balance:
+            return super().save_formset(request, form, formset, change)
+        # Баланс удалять нельзя (can_delete), связей many-to-many нет.
+        for balance in formset.save(commit=False):
+            save_balance(balance)
+
+
+@admin.register(Balance)
+class BalanceAdmin(admin.ModelAdmin):
+    def save_model(self, request, obj, form, change):
+        save_balance(obj)
+
+
 admin.site.register(Subscription)
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.10 on 2026-10-18 05:00
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_subscriptions(apps, schema_editor):
+    """Из повторных подписок на один курс оставляем самую раннюю."""
+    Subscription = apps.get_model('users', 'Subscription')
+    first_ids = Subscription.objects.values('user', 'course').annotate(
+        first_id=Min('id')
+    ).values('first_id')
+    Subscription.objects.exclude(id__in=first_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_subscriptions,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(fields=('user', 'course'), name='unique_user_course_subscription'),
+        ),
+    ]
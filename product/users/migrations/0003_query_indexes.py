@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-18 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_subscription_unique_user_course'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['is_staff'], name='user_is_staff_idx'),
+        ),
+    ]
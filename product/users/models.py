@@ -38,6 +38,11 @@ class Subscription(models.Model):
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
         ordering = ('-id',)
+        # Повторная покупка курса отсекается на уровне базы (make_payment).
+        constraints = [
+            models.UniqueConstraint(fields=('user', 'course'),
+                                    name='unique_user_course_subscription'),
+        ]
 
     def __str__(self):
         return f'subscription of {self.user.id} to {self.course.id}'
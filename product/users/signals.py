@@ -2,6 +2,8 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 from django.contrib.auth import get_user_model
+from courses import outbox
+from product.db import write_atomic
 from .models import Balance
 
 User = get_user_model()
@@ -9,4 +11,7 @@ User = get_user_model()
 @receiver(post_save, sender=User)
 def create_balance(sender, instance, created, **kwargs):
     if created:
-        Balance.objects.create(user=instance, bonuses=1000)
+        with write_atomic():
+            balance = Balance.objects.create(user=instance, bonuses=1000)
+            outbox.record(outbox.BALANCE, instance.pk, delta=balance.bonuses,
+                          reason='initial')
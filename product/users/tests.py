@@ -1,6 +1,11 @@
-from django.test import TestCase
+from django.contrib import admin
+from django.db import transaction
+from django.test import RequestFactory, TestCase
 from django.contrib.auth import get_user_model
+from django.urls import reverse
 
+from courses.models import Event
+from .admin import BalanceInline
 from .models import Balance
 
 User = get_user_model()
@@ -35,3 +40,54 @@ class UsersModelsTest(TestCase):
         self.assertIsNotNone(balance)
         self.assertEqual(balance.user, user)
         self.assertEqual(balance.bonuses, 1000)
+
+
+class BalanceAdminTest(TestCase):
+    """Изменение баланса в админке пишет событие BALANCE."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin',
+                                                  email='admin@test.com',
+                                                  password='password123')
+        cls.user = user_create()
+        cls.balance = cls.user.balance
+
+    def balance_events(self):
+        return list(Event.objects.filter(
+            kind=Event.BALANCE, user_id=self.user.pk, data__reason='admin'
+        ).values_list('data__delta', flat=True))
+
+    def test_balance_admin(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:users_balance_change', args=(self.balance.pk,))
+        for bonuses in (1500, 1500, 1200):
+            response = self.client.post(url, {'user': self.user.pk,
+                                              'bonuses': bonuses})
+            self.assertEqual(response.status_code, 302)
+
+        self.balance.refresh_from_db()
+        self.assertEqual(self.balance.bonuses, 1200)
+        self.assertEqual(self.balance_events(), [500, -300])
+
+    def test_user_admin_inline(self):
+        request = RequestFactory().post('/')
+        request.user = self.admin
+        user_admin = admin.site._registry[User]
+        formset_class = BalanceInline(User, admin.site).get_formset(
+            request, self.user
+        )
+        formset = formset_class({
+            'balance-TOTAL_FORMS': 1,
+            'balance-INITIAL_FORMS': 1,
+            'balance-0-id': self.balance.pk,
+            'balance-0-user': self.user.pk,
+            'balance-0-bonuses': 700,
+        }, instance=self.user, prefix='balance')
+        self.assertTrue(formset.is_valid(), formset.errors)
+        with transaction.atomic():
+            user_admin.save_formset(request, None, formset, change=True)
+
+        self.balance.refresh_from_db()
+        self.assertEqual(self.balance.bonuses, 700)
+        self.assertEqual(self.balance_events(), [-300])
@@ -28,6 +28,11 @@ class CustomUser(AbstractUser):
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
         ordering = ('-id',)
+        indexes = [
+            # Количество клиентов (is_staff=False) для процента
+            # приобретаемости курсов считается на каждый список курсов.
+            models.Index(fields=('is_staff',), name='user_is_staff_idx'),
+        ]
 
     def __str__(self):
         return self.get_full_name()
\ No newline at end of file